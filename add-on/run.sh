@@ -19,7 +19,7 @@ fi
 # Start the hexaservice with the MQTT configuration and the debug environment variable
 cd /app/Hexascroller/hexaservice
 
-exec nice -10 python3 service.py $debug_env \
+exec nice -10 python3 service.py --realtime $debug_env \
     --mqtt-host="$(bashio::services mqtt 'host')" \
     --mqtt-user="$(bashio::services mqtt 'username')" \
     --mqtt-password="$(bashio::services mqtt 'password')"
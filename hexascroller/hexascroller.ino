@@ -64,6 +64,12 @@
 //        Payload:
 //        V - 1 byte indicating on (non-zero) or off (zero)
 //        Response payload: None
+// 0xA7 - Echo
+//        Payload:
+//        b... - up to 6 bytes, typically a sequence number
+//        Response payload: the payload, unchanged. The host uses
+//        this to find its place in the response stream after a
+//        garbled or missing response.
 // 
 // Commands from 0xB0+ operate on the offscreen buffer level
 // 0xB0 - Clear offscreen buffer
@@ -393,6 +399,9 @@ void loop() {
             setRelay(pl[0] != 0);
             succeed();
             break;
+          case 0xA7: // echo
+            succeed((const uint8_t*)pl, pl_sz < MAX_RSP - 2 ? pl_sz : MAX_RSP - 2);
+            break;
           default:
             fail((const uint8_t*)&cmd_code,1);
             break;
@@ -518,9 +518,9 @@ const uint8_t charData[] PROGMEM = {
     0b10111010,
     0b10101010,
     0b01110010,
-    0b00000100,
     0b00000001,
     0b00000000,
+    0b00000000,
     0b01111110,
     0b10010000,
     0b10010000,
@@ -1009,14 +1009,14 @@ const uint8_t charData[] PROGMEM = {
     0b00000000,
     0b00000000,
     0b00000000,
-    0b00000000,
-    0b00000000,
-    0b00000000,
-    0b00000000,
-    0b00000000,
-    0b00000000,
-    0b00000000,
-    0b00000000,
+    0b00111000,
+    0b01010100,
+    0b10100010,
+    0b10010010,
+    0b10001010,
+    0b01010100,
+    0b00111000,
+    0b00000001,
     0b00000000,
     0b00000000,
     0b00000000,
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Streaming data of any length to a panel's accessory UART, between frames.
+
+The firmware copies a WRITE_UART payload into the accessory UART's 64-byte
+transmit buffer and acks once it is all in. The accessory link runs at 9600 baud,
+about 960 bytes a second, so a payload that doesn't fit in the free part of the
+buffer stalls the firmware, and every panel command behind it, until enough has
+gone out: a full 120-byte command can hold up the frame loop for 60 ms.
+
+`AccessoryStream` queues the data and models the transmit buffer: it assumes the
+buffer drains at the baud rate from the moment each chunk is acked. Each frame the
+loop calls `pump`, which sends at most one chunk, no bigger than the space the
+buffer has left, so the firmware never blocks and the frame traffic keeps its
+place. Chunks are sent once they are at least MIN_CHUNK bytes, or hold the end of
+the data, to avoid one command per byte.
+
+The queue holds at most `depth` bytes. `write` accepts what fits and returns how
+many bytes it took, so a caller producing faster than the link can wait and offer
+the rest again; the MQTT topic drops the rest and counts it. A chunk the panel
+doesn't ack is lost, as WRITE_UART is never retried, and counted as failed.
+
+Example usage:
+
+```python
+from accessory import AccessoryStream
+
+stream = AccessoryStream(panel)
+stream.write(b"long data for the accessory...")
+while stream.pending:
+    stream.pump(time.monotonic())
+    time.sleep(0.01)
+```
+"""
+
+import logging
+import threading
+import time
+from typing import Dict
+
+from led_panel import UART_MAX_PAYLOAD, Panel
+
+logger = logging.getLogger(__name__)
+
+ACCESSORY_BAUD = 9600
+# The firmware's accessory UART transmit buffer, in bytes
+TX_BUFFER = 64
+# Fewer bytes than this are only sent when they end the queued data: half the
+# buffer, so a steady stream takes a command every 33 ms rather than every frame
+MIN_CHUNK = 32
+DEFAULT_DEPTH = 4096
+
+
+class AccessoryStream:
+    """Data waiting for one panel's accessory UART, sent a chunk per frame."""
+
+    def __init__(
+        self,
+        panel: Panel,
+        baud: int = ACCESSORY_BAUD,
+        depth: int = DEFAULT_DEPTH,
+    ) -> None:
+        """
+        Initialise the stream.
+
+        Args:
+            panel (Panel): The panel whose accessory port the data goes to.
+            baud (int, optional): The accessory link's baud rate.
+            depth (int, optional): Most bytes waiting to be sent.
+        """
+        self.panel = panel
+        # Ten bits a byte, with the start and stop bits
+        self.drain_rate = baud / 10
+        self.depth = depth
+        self.queue = bytearray()
+        self.lock = threading.Lock()
+        # Bytes the model says are still in the transmit buffer, as of `drained_at`
+        self.buffered = 0.0
+        self.drained_at = 0.0
+        self.counters: Dict[str, int] = dict.fromkeys(
+            ("queued", "sent", "chunks", "dropped", "failed"), 0
+        )
+
+    @property
+    def pending(self) -> int:
+        """The number of bytes waiting to be sent."""
+        return len(self.queue)
+
+    def write(self, data: bytes) -> int:
+        """
+        Queue data for the accessory UART. Safe to call from any thread.
+
+        Args:
+            data (bytes): The data.
+
+        Returns:
+            int: How many bytes were queued, from the start of `data`; the rest
+            didn't fit.
+        """
+        with self.lock:
+            accepted = min(len(data), self.depth - len(self.queue))
+            self.queue += data[:accepted]
+        self.counters["queued"] += accepted
+        return accepted
+
+    def pump(self, now: float) -> int:
+        """
+        Send the next chunk, if there is one and the transmit buffer has room for
+        it. Called once per frame from the frame loop.
+
+        Args:
+            now (float): The current `time.monotonic()` value.
+
+        Returns:
+            int: The number of bytes sent, or 0 if the panel didn't ack them.
+        """
+        if not self.queue:
+            return 0
+        buffered = max(0.0, self.buffered - (now - self.drained_at) * self.drain_rate)
+        room = min(int(TX_BUFFER - buffered), UART_MAX_PAYLOAD)
+        with self.lock:
+            size = min(room, len(self.queue))
+            if size <= 0 or (size < MIN_CHUNK and size < len(self.queue)):
+                return 0
+            chunk = bytes(self.queue[:size])
+            del self.queue[:size]
+        if not self.panel.write_uart(chunk):
+            # Lost: the firmware may or may not have taken it, so leave the model
+            self.counters["failed"] += size
+            return 0
+        # Only count the buffer as draining once the firmware has taken the chunk
+        self.buffered = buffered + size
+        self.drained_at = time.monotonic()
+        self.counters["sent"] += size
+        self.counters["chunks"] += 1
+        return size
+
+    def drop(self, count: int) -> None:
+        """Count bytes that were refused because the queue was full."""
+        self.counters["dropped"] += count
+
+    def format(self) -> str:
+        """Format the counters and backlog for a log line."""
+        backlog = len(self.queue) / self.drain_rate
+        return (
+            " ".join(f"{name}={value}" for name, value in self.counters.items())
+            + f" backlog={backlog:.1f}s"
+        )
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Measures what the panel links can sustain and saves a link profile for the service.
+
+The calibration opens the panels like the service does and measures, per panel:
+
+- ack latency: the round trip of a short command (ECHO, or GET_ID on firmware
+  without it), a half-buffer write and a flip, as p50, p99 and maximum.
+- sustained cycles: how many back-buffer loads and flips a second the panel keeps
+  up when it has the link to itself.
+
+It then measures the whole frame the way the service sends it, to every panel one
+after another, and with all panels written at once from their own threads, which
+shows how much the panels slow each other down on the shared USB hub.
+
+From those it recommends the frame interval (the p99 time to send a whole frame,
+with some headroom, and never below 10 ms) and the response timeout (a few times
+the slowest p99 ack), and saves everything as JSON. The service reads the profile
+at startup, if there is one and it was measured on the service's transport, to
+pace its frames and set its panels' timeouts.
+
+Example usage:
+
+```bash
+python3 calibrate.py --seconds 5
+python3 calibrate.py --transport pty --profile /tmp/link-profile.json
+```
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from led_panel import (
+    PANEL_COUNT,
+    PANEL_WIDTH,
+    TRANSPORTS,
+    CommandCode,
+    Panel,
+    discover_panels,
+)
+from metrics import percentile
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILE = os.path.join(os.path.dirname(__file__), "link-profile.json")
+DEFAULT_SAMPLES = 200
+DEFAULT_SECONDS = 3.0
+# The recommended frame interval is this much longer than the p99 frame time
+HEADROOM = 1.25
+MIN_FRAME_INTERVAL = 0.01
+# The recommended timeout is this many times the slowest p99 ack
+TIMEOUT_FACTOR = 5.0
+MIN_TIMEOUT = 0.05
+MAX_TIMEOUT = 0.5
+
+
+def distribution(samples: List[float]) -> Dict[str, float]:
+    """Summarise timings in seconds as their p50, p99 and maximum."""
+    ordered = sorted(samples)
+    return {
+        "n": len(ordered),
+        "p50": percentile(ordered, 0.5),
+        "p99": percentile(ordered, 0.99),
+        "max": ordered[-1] if ordered else 0.0,
+    }
+
+
+def time_calls(call: Callable[[], Any], samples: int) -> List[float]:
+    """Time `samples` calls of `call`, in seconds each."""
+    timings = []
+    clock = time.perf_counter
+    for _ in range(samples):
+        start = clock()
+        call()
+        timings.append(clock() - start)
+    return timings
+
+
+def test_frame(step: int) -> bytes:
+    """A panel-wide frame that differs from step to step, so nothing is skipped."""
+    return bytes(((column + step) * 0x25) & 0xFE for column in range(PANEL_WIDTH))
+
+
+def measure_panel(panel: Panel, samples: int, seconds: float) -> Dict[str, Any]:
+    """
+    Measure one panel's ack latencies and sustained load-and-flip rate.
+
+    Args:
+        panel (Panel): The panel, which should have the link to itself.
+        samples (int): Round trips timed for each kind of command.
+        seconds (float): How long to run load-and-flip cycles for.
+
+    Returns:
+        Dict[str, Any]: The panel's measurements.
+    """
+    if panel.echo:
+        ping = (CommandCode.ECHO, b"\1\2\3\4", 4)
+    else:
+        ping = (CommandCode.GET_ID, b"", 1)
+    half = test_frame(0)[: PANEL_WIDTH // 2]
+    result: Dict[str, Any] = {
+        "ping": distribution(time_calls(lambda: panel.command(*ping), samples)),
+        "half_buffer": distribution(
+            time_calls(
+                lambda: panel.command(CommandCode.BITMAP_BACK_HALF_ONE, half, 0),
+                samples,
+            )
+        ),
+        "flip": distribution(time_calls(panel.flip, samples)),
+    }
+    frames = [test_frame(step) for step in range(16)]
+    cycles = 0
+    start = time.perf_counter()
+    end = start + seconds
+    while time.perf_counter() < end:
+        panel.set_compiled_image(frames[cycles % len(frames)])
+        cycles += 1
+    result["cycles_per_second"] = cycles / (time.perf_counter() - start)
+    return result
+
+
+def measure_frames(panels: List[Panel], seconds: float) -> Dict[str, Any]:
+    """
+    Measure whole frames sent to every panel, one after another as the service
+    does, and to all panels at once from a thread each.
+
+    Returns:
+        Dict[str, Any]: The sequential frame times and rates.
+    """
+    frames = [test_frame(step) for step in range(16)]
+    timings = []
+    start = time.perf_counter()
+    end = start + seconds
+    while time.perf_counter() < end:
+        frame = frames[len(timings) % len(frames)]
+        began = time.perf_counter()
+        for panel in panels:
+            panel.set_compiled_image(frame)
+        timings.append(time.perf_counter() - began)
+    sequential_fps = len(timings) / (time.perf_counter() - start)
+
+    counts = [0] * len(panels)
+
+    def cycle(index: int) -> None:
+        panel = panels[index]
+        while time.perf_counter() < stop:
+            panel.set_compiled_image(frames[counts[index] % len(frames)])
+            counts[index] += 1
+
+    threads = [
+        threading.Thread(target=cycle, args=(index,)) for index in range(len(panels))
+    ]
+    start = time.perf_counter()
+    stop = start + seconds
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {
+        "sequential": distribution(timings),
+        "sequential_fps": sequential_fps,
+        "concurrent_cycles_per_second": [count / elapsed for count in counts],
+    }
+
+
+def recommend(panels: Dict[str, Any], frames: Dict[str, Any]) -> Dict[str, float]:
+    """Work out the frame interval and timeout the service should use."""
+    frame_interval = max(MIN_FRAME_INTERVAL, HEADROOM * frames["sequential"]["p99"])
+    worst_ack = max(
+        stats[kind]["p99"]
+        for stats in panels.values()
+        for kind in ("ping", "half_buffer", "flip")
+    )
+    timeout = min(MAX_TIMEOUT, max(MIN_TIMEOUT, TIMEOUT_FACTOR * worst_ack))
+    return {"frame_interval": frame_interval, "timeout": timeout}
+
+
+def load_profile(path: str, transport: str) -> Optional[Dict[str, Any]]:
+    """
+    Read a link profile, if it was measured on the transport in use.
+
+    Args:
+        path (str): The profile saved by calibrate.py.
+        transport (str): The service's transport; a profile measured on another,
+            such as the emulator, is ignored.
+
+    Returns:
+        Optional[Dict[str, Any]]: The recommended settings, with frame_interval
+        and timeout in seconds, or None if there is no usable profile.
+    """
+    try:
+        with open(path, encoding="utf-8") as profile_file:
+            profile = json.load(profile_file)
+        if profile.get("transport") != transport:
+            logger.warning(
+                "Ignoring link profile %s, measured on the %s transport, not %s",
+                path,
+                profile.get("transport"),
+                transport,
+            )
+            return None
+        settings = profile["recommended"]
+        return {
+            "frame_interval": float(settings["frame_interval"]),
+            "timeout": float(settings["timeout"]),
+        }
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError, AttributeError) as error:
+        logger.warning("Ignoring link profile %s: %s", path, error)
+        return None
+
+
+def main():
+    """Main function."""
+    parser = argparse.ArgumentParser(description="Hexascroller link calibration")
+    parser.add_argument(
+        "--transport",
+        choices=[transport for transport in TRANSPORTS if transport != "udp"],
+        default="serial",
+        help="How to talk to the panels, as for service.py (default: serial)",
+    )
+    parser.add_argument(
+        "--samples",
+        type=int,
+        default=DEFAULT_SAMPLES,
+        help=f"Round trips timed per command and panel (default: {DEFAULT_SAMPLES})",
+    )
+    parser.add_argument(
+        "--seconds",
+        type=float,
+        default=DEFAULT_SECONDS,
+        help=f"Length of each throughput run (default: {DEFAULT_SECONDS})",
+    )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        default=DEFAULT_PROFILE,
+        help=f"Where to save the link profile (default: {DEFAULT_PROFILE})",
+    )
+    parser.add_argument("--debug", action="store_true", help="Enable debug logging")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.WARNING)
+
+    found = discover_panels(range(PANEL_COUNT), transport=args.transport)
+    if not found:
+        parser.exit(1, "No panels found.\n")
+    panels = [found[panel_id] for panel_id in sorted(found)]
+
+    results: Dict[str, Any] = {}
+    for panel in panels:
+        print(f"Measuring panel {panel.id} on {panel.transport.name}...")
+        results[str(panel.id)] = measure_panel(panel, args.samples, args.seconds)
+    print(f"Measuring whole frames to {len(panels)} panels...")
+    frames = measure_frames(panels, args.seconds)
+    recommended = recommend(results, frames)
+    for panel in panels:
+        panel.close()
+
+    for panel_id, stats in results.items():
+        print(
+            f"Panel {panel_id}: "
+            + " ".join(
+                f"{kind} p50={stats[kind]['p50'] * 1000:.2f}ms"
+                f" p99={stats[kind]['p99'] * 1000:.2f}ms"
+                for kind in ("ping", "half_buffer", "flip")
+            )
+            + f", {stats['cycles_per_second']:.0f} frames/s alone"
+        )
+    print(
+        f"All panels: {frames['sequential_fps']:.0f} frames/s one after another,"
+        f" p99 frame {frames['sequential']['p99'] * 1000:.2f}ms; at once: "
+        + ", ".join(f"{rate:.0f}" for rate in frames["concurrent_cycles_per_second"])
+        + " frames/s per panel"
+    )
+    print(
+        f"Recommended frame interval {recommended['frame_interval'] * 1000:.1f}ms,"
+        f" timeout {recommended['timeout'] * 1000:.0f}ms"
+    )
+
+    profile = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "transport": args.transport,
+        "panels": results,
+        "frames": frames,
+        "recommended": recommended,
+    }
+    with open(args.profile, "w", encoding="utf-8") as profile_file:
+        json.dump(profile, profile_file, indent=2)
+    print(f"Saved link profile to {args.profile}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Wire-level capture of the traffic between the service and the panels.
+
+A capture file starts with an 8-byte header, the magic b"HXCAP" followed by a
+version byte and two reserved bytes. It then holds one record per packet:
+
+    offset  size  field
+    0       8     seconds since the capture started, little-endian double
+    8       1     panel ID
+    9       1     direction, 0 for a command sent to the panel, 1 for its response
+    10      2     packet length, little-endian
+    12      n     the packet bytes
+
+Recording a packet is one `struct.pack` and one buffered write, so capture can be
+left on while measuring. `replay.py` sends a capture back to panels or to the
+`debug.py` simulator.
+"""
+
+import struct
+import threading
+import time
+from typing import BinaryIO, Iterator, NamedTuple
+
+CAPTURE_MAGIC = b"HXCAP"
+CAPTURE_VERSION = 1
+CAPTURE_HEADER = struct.Struct("<5sBxx")
+RECORD_HEADER = struct.Struct("<dBBH")
+
+OUTGOING = 0
+INCOMING = 1
+
+
+class Record(NamedTuple):
+    """One captured packet."""
+
+    timestamp: float
+    panel_id: int
+    direction: int
+    data: bytes
+
+
+class CaptureWriter:
+    """Appends timestamped packets to a capture file. Safe to share between panels."""
+
+    def __init__(self, path: str) -> None:
+        """
+        Create the capture file and write its header.
+
+        Args:
+            path (str): The capture file to create.
+        """
+        self.path = path
+        self.file: BinaryIO = open(path, "wb")  # pylint: disable=consider-using-with
+        self.file.write(CAPTURE_HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION))
+        self.start = time.perf_counter()
+        self.lock = threading.Lock()
+        self.records = 0
+
+    def record(self, panel_id: int, direction: int, data: bytes) -> None:
+        """
+        Append one packet to the capture.
+
+        Args:
+            panel_id (int): The ID of the panel the packet went to or came from.
+            direction (int): OUTGOING or INCOMING.
+            data (bytes): The packet bytes.
+        """
+        header = RECORD_HEADER.pack(
+            time.perf_counter() - self.start, panel_id & 0xFF, direction, len(data)
+        )
+        with self.lock:
+            self.file.write(header)
+            self.file.write(data)
+            self.records += 1
+
+    def close(self) -> None:
+        """Flush and close the capture file."""
+        with self.lock:
+            self.file.close()
+
+
+def read_capture(path: str) -> Iterator[Record]:
+    """
+    Read the packets from a capture file.
+
+    Args:
+        path (str): The capture file.
+
+    Yields:
+        Record: Each captured packet, in the order it was recorded.
+    """
+    with open(path, "rb") as capture_file:
+        data = capture_file.read()
+    magic, version = CAPTURE_HEADER.unpack_from(data)
+    if magic != CAPTURE_MAGIC or version != CAPTURE_VERSION:
+        raise ValueError(f"{path} is not a version {CAPTURE_VERSION} capture file")
+    offset = CAPTURE_HEADER.size
+    # A capture cut short by a crash may end in a partial record; ignore it
+    while offset + RECORD_HEADER.size <= len(data):
+        timestamp, panel_id, direction, length = RECORD_HEADER.unpack_from(data, offset)
+        offset += RECORD_HEADER.size
+        if offset + length > len(data):
+            break
+        yield Record(timestamp, panel_id, direction, data[offset : offset + length])
+        offset += length
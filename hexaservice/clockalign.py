@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Showing the clock on the second, by preloading each frame and flipping on time.
+
+Uploading a frame takes three commands per panel, each waiting for its ack, so a
+clock frame rendered when the frame loop notices the second has changed reaches
+the panels a varying 10 to 40 ms late, one panel after another. `AlignedClock`
+works out when the clock frame will next change (the next second, or the next
+time the beats change), renders that frame ahead of time and loads it into every
+panel's back buffer. Just before the change it flips all the panels.
+
+The flip is sent early by the measured flip latency: each panel is assumed to
+show its new frame half way through the flip's round trip, and the average
+error against the boundary is fed back into the lead for the next flip. The
+absolute errors are kept for the service's report, along with the current lead.
+How early frames are loaded also follows the measured load time.
+"""
+
+import logging
+import math
+import time
+from typing import Callable, List, Optional
+
+from led_panel import Panel
+from metrics import IntervalStats
+
+logger = logging.getLogger(__name__)
+
+# Seconds in one hundredth of a beat, the resolution the clock shows
+CENTIBEAT = 0.864
+# How close to a flip the loop waits for it, rather than the next frame
+FLIP_WINDOW = 0.015
+# Smoothing for the measured load time and the flip lead correction
+SMOOTHING = 0.25
+
+
+def next_change(now: float) -> float:
+    """
+    Return when the clock frame next changes after `now`.
+
+    The frame shows whole seconds, which change on the second, and beats rounded
+    to two decimals, which change half way through each hundredth of a beat.
+    """
+    second = math.floor(now) + 1.0
+    position = (now + 3600) / CENTIBEAT
+    beat = now + ((0.5 - position) % 1.0 or 1.0) * CENTIBEAT
+    return min(second, beat)
+
+
+class AlignedClock:
+    """Preloads the next clock frame into the panels and flips them on time."""
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(
+        self,
+        panels: List[Panel],
+        render: Callable[[float], bytes],
+        split: Callable[[bytes, int], memoryview],
+    ) -> None:
+        """
+        Initialise the aligner.
+
+        Args:
+            panels (List[Panel]): The sign's panels, left to right.
+            render (Callable[[float], bytes]): Renders the clock frame at a Unix
+                time, with effects applied.
+            split (Callable[[bytes, int], memoryview]): Returns the part of a frame
+                shown by the panel at an index.
+        """
+        self.panels = panels
+        self.render = render
+        self.split = split
+        self.pending: Optional[bytes] = None
+        self.pending_key: object = None
+        self.due = 0.0
+        self.loaded = False
+        self.shown_due = 0.0
+        self.load_time = 0.02
+        self.flip_lead = 0.0
+        self.errors = IntervalStats()
+        self.late = 0
+
+    def update(self, current: bytes, shown: bytes, key: object) -> Optional[bytes]:
+        """
+        Bring the clock on the panels up to date. Call every frame while the clock
+        is showing.
+
+        Args:
+            current (bytes): The clock frame for the current time.
+            shown (bytes): The frame on the panels.
+            key (object): The effects the frames were rendered with; a change
+                discards the preloaded frame.
+
+        Returns:
+            Optional[bytes]: The frame now on the panels, if it changed.
+        """
+        now = time.time()
+        if self.pending is not None and key != self.pending_key:
+            self.pending = None
+        if self.pending is None:
+            written = None
+            if now >= self.shown_due and current != shown:
+                # Not a change we saw coming, e.g. the end of a message; catch up
+                for index, panel in enumerate(self.panels):
+                    panel.set_compiled_image(self.split(current, index))
+                written = current
+            self.due = next_change(now)
+            self.pending = self.render(self.due + 1e-4)
+            self.pending_key = key
+            self.loaded = False
+            return written
+        if not self.loaded and now >= self.due - 2 * self.load_time - FLIP_WINDOW:
+            start = time.perf_counter()
+            for index, panel in enumerate(self.panels):
+                panel.load_compiled_image(self.split(self.pending, index))
+            elapsed = time.perf_counter() - start
+            self.load_time += SMOOTHING * (elapsed - self.load_time)
+            self.loaded = True
+        if self.loaded:
+            wait = self.due - self.flip_lead - time.time()
+            if wait > FLIP_WINDOW:
+                return None
+            if wait > 0:
+                time.sleep(wait)
+            elif wait < -FLIP_WINDOW:
+                self.late += 1
+            return self.flip(self.pending)
+        return None
+
+    def reset(self) -> None:
+        """Forget the preloaded frame, when something other than the clock shows."""
+        self.pending = None
+        self.shown_due = 0.0
+
+    def flip(self, frame: bytes) -> bytes:
+        """Flip every panel to the preloaded frame, measuring when each changed."""
+        shown_at = 0.0
+        for panel in self.panels:
+            sent = time.time()
+            panel.flip()
+            # The panel flips when it gets the command, before it acks
+            shown_at += (sent + time.time()) / 2
+        error = shown_at / len(self.panels) - self.due
+        self.flip_lead += SMOOTHING * error
+        self.errors.add(abs(error))
+        self.shown_due = self.due
+        self.pending = None
+        return frame
+
+    def format(self) -> str:
+        """Format the flip errors and lead for a log line."""
+        return (
+            f"error {self.errors.format()} lead={self.flip_lead * 1000:.1f}ms"
+            f" load={self.load_time * 1000:.1f}ms late={self.late}"
+        )
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+A compositor for independent zones on the 120-column panel.
+
+A layout divides the panel into zones, each a range of columns with its own content
+source and update rate, for example a clock on the left and a ticker on the right.
+Each zone's source returns packed columns, as `Font.string_columns` and
+`Template.render` produce. Content narrower than its zone is shown left-aligned;
+wider content scrolls through the zone as a ticker, one column per update.
+
+When a zone is due it renders its window and compares it with what it last showed.
+Only zones whose window changed are copied into the output buffer, and the output
+frame is only rebuilt when some zone changed, so a ticker next to a clock costs one
+zone's work per frame and a still display costs nothing.
+
+Zones are given on the command line as `START+WIDTH[@FPS]:CONTENT`. CONTENT is
+`message`, for the current message as a ticker, or a message template such as
+`{time:%H:%M}` (see template.py). FPS defaults to 10.
+
+Example usage:
+
+```bash
+python3 service.py --zone "0+34@2:{time:%H:%M}" --zone "35+85@25:message"
+```
+"""
+
+import re
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+DEFAULT_FPS = 10.0
+# Blank columns between the end of a ticker and its next repeat
+TICKER_GAP = 12
+
+ZONE_PATTERN = re.compile(r"(\d+)\+(\d+)(?:@([\d.]+))?:(.*)", re.DOTALL)
+
+
+class ZoneSpec(NamedTuple):
+    """A zone as given on the command line."""
+
+    start: int
+    width: int
+    fps: float
+    content: str
+
+
+def parse_zone(spec: str) -> ZoneSpec:
+    """
+    Parse a zone given as START+WIDTH[@FPS]:CONTENT.
+
+    Raises:
+        ValueError: If the zone can't be parsed.
+    """
+    match = ZONE_PATTERN.fullmatch(spec)
+    if not match:
+        raise ValueError(f"Zone '{spec}' is not of the form START+WIDTH[@FPS]:CONTENT")
+    start, width, fps, content = match.groups()
+    if int(width) == 0 or (fps is not None and float(fps) <= 0):
+        raise ValueError(f"Zone '{spec}' needs a width and rate above zero")
+    return ZoneSpec(int(start), int(width), float(fps or DEFAULT_FPS), content)
+
+
+class Zone:
+    """A range of output columns, showing one content source at its own rate."""
+
+    def __init__(
+        self,
+        start: int,
+        width: int,
+        source: Callable[[float], bytes],
+        fps: float = DEFAULT_FPS,
+    ) -> None:
+        """
+        Initialise the zone.
+
+        Args:
+            start (int): The first output column of the zone.
+            width (int): The number of columns in the zone.
+            source (Callable[[float], bytes]): Returns the content's packed columns
+                at a given Unix time.
+            fps (float, optional): Updates per second. Defaults to 10.
+        """
+        self.start = start
+        self.width = width
+        self.source = source
+        self.interval = 1.0 / fps
+        self.next_update = 0.0
+        self.offset = 0
+        self.shown: Optional[bytes] = None
+
+    def window(self, now: float) -> bytes:
+        """Render the columns the zone shows now, advancing a ticker by one."""
+        columns = self.source(now)
+        width = self.width
+        if len(columns) <= width:
+            self.offset = 0
+            return bytes(columns).ljust(width, b"\0")
+        loop = bytes(columns) + bytes(TICKER_GAP)
+        offset = self.offset % len(loop)
+        self.offset = offset + 1
+        window = loop[offset : offset + width]
+        if len(window) < width:
+            window += loop[: width - len(window)]
+        return window
+
+
+class Compositor:
+    """Composes zones into one output frame, re-composing only zones that changed."""
+
+    def __init__(self, zones: List[Zone], width: int) -> None:
+        """
+        Initialise the compositor.
+
+        Args:
+            zones (List[Zone]): The zones, which must fit in the output.
+            width (int): The number of columns in the output frame.
+
+        Raises:
+            ValueError: If a zone extends past the output or overlaps another zone.
+        """
+        taken = bytearray(width)
+        for zone in zones:
+            if zone.start + zone.width > width:
+                raise ValueError(
+                    f"Zone at {zone.start}+{zone.width} extends past column {width}"
+                )
+            if any(taken[zone.start : zone.start + zone.width]):
+                raise ValueError(f"Zone at {zone.start}+{zone.width} overlaps another")
+            taken[zone.start : zone.start + zone.width] = b"\1" * zone.width
+        self.zones = zones
+        self.buffer = bytearray(width)
+        self.frame = bytes(width)
+        self.dirty: List[Tuple[int, int]] = []
+        self.composed = 0
+
+    def compose(self, now: float, wall: float) -> bytes:
+        """
+        Update the zones that are due and return the output frame.
+
+        Args:
+            now (float): The monotonic time, for the zones' update rates.
+            wall (float): The Unix time, for the zones' content.
+
+        Returns:
+            bytes: The output frame. It is the same object as last time if no zone
+            changed, so callers can skip uploading it.
+        """
+        dirty = self.dirty
+        dirty.clear()
+        for zone in self.zones:
+            if now < zone.next_update:
+                continue
+            # Keep the zone's cadence, but don't try to catch up after a stall
+            zone.next_update = max(zone.next_update + zone.interval, now)
+            window = zone.window(wall)
+            if window == zone.shown:
+                continue
+            zone.shown = window
+            self.buffer[zone.start : zone.start + zone.width] = window
+            dirty.append((zone.start, zone.start + zone.width))
+        if dirty:
+            self.frame = bytes(self.buffer)
+            self.composed += 1
+        return self.frame
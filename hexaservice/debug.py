@@ -1,122 +1,197 @@
 #!/usr/bin/env python3
-import os
+"""
+A terminal simulator for the three hexascroller panels.
+
+Run `service.py --debug` in one terminal and this script in another on the same
+machine. The service sends each panel's commands to its own UDP port, starting at
+DEBUG_PORT for panel 0, and the simulator feeds them into one `PanelEmulator` per
+panel, so the half-buffer writes and flips behave as on the real firmware.
+
+The screen is drawn once and then updated in place with ANSI cursor moves, only
+rewriting the rows that changed, at most `--fps` times a second. A status line shows
+the frames received per second by each panel and the frames dropped because they
+were replaced before the next redraw.
+"""
+
+import argparse
+import selectors
 import socket
-from typing import List
-from led_panel import CommandCode, PANEL_HEIGHT
+import sys
+import time
+from typing import List, Optional
 
-UDP_IP = "0.0.0.0"
-UDP_PORT = 9990
-ID = 0
-
-RELAY_ON = 1
-RELAY_OFF = 0
+from emulator import PanelEmulator
+from led_panel import DEBUG_PORT, PANEL_COUNT, PANEL_HEIGHT, PANEL_WIDTH
 
+UDP_IP = "0.0.0.0"
 
-def display_text(x: int, y: int, text: str):
-    """Display text at the specified coordinates."""
-    print(f"Display text ({x}, {y}): {text}")
+LIT = "🔴"  # Red circle
+UNLIT = "⚫"  # Black circle
 
+# Screen lines (1-based): two ruler lines, then a label and the rows for each panel
+FIRST_PANEL_LINE = 3
+PANEL_LINES = PANEL_HEIGHT + 1
+STATUS_LINE = FIRST_PANEL_LINE + PANEL_COUNT * PANEL_LINES
 
-def display_ascii_art(bitmap: List[List[int]]):
-    """Display the bitmap as ASCII art."""
-    os.system("clear")
-    print(
-        "".join([f"{i}                   " for i in range(6)])
-        + " | "
-        + "".join([f"{i}                   " for i in range(6, 12)]).replace(
-            "10 ", "10"
-        )
+# For each display row, a table turning a column byte into "#" (lit) or "." (unlit)
+ROW_TABLES = [
+    bytes(
+        ord("#") if value & (1 << (PANEL_HEIGHT - row)) else ord(".")
+        for value in range(256)
     )
-    print("0 1 2 3 4 5 6 7 8 9 " * 6 + " | " + "0 1 2 3 4 5 6 7 8 9 " * 6)
-    for row in bitmap:
-        line = []
-        for i, pixel in enumerate(row):
-            if i == 60:
-                line.append(" | ")
-            if pixel:
-                line.append("🔴")  # Red circle
-            else:
-                line.append("⚫")  # Black circle
-        print("".join(line))
-    print(" ")
-
-
-def set_id(new_id: int):
-    """Set the panel ID."""
-    global ID
-    ID = new_id
-    print(f"Set ID: {ID}")
-
-
-def query_id():
-    """Query the panel ID."""
-    global ID
-    print(f"Query ID: {ID}")
-    sock.sendto(bytes([ID]), addr)
-
-
-def write_to_uart(data: bytes):
-    """Write data to the UART."""
-    print(f"Write to UART: {data}")
-
-
-def set_relay(value: int):
-    """Set the relay value."""
-    print(f"Set relay: {'ON' if value == RELAY_ON else 'OFF'}")
-
-
-def process_command(data: bytes):
-    """Process the received command."""
-    if len(data) < 1:
-        print("No data received.")
+    for row in range(PANEL_HEIGHT)
+]
+
+
+def ruler(ascii_cells: bool) -> List[str]:
+    """Return the two column ruler lines shown above the panels."""
+    half = PANEL_WIDTH // 2
+    if ascii_cells:
+        tens = "".join(f"{i:<10}" for i in range(half // 10))
+        units = "0123456789" * (half // 10)
+        return [tens + " | " + tens, units + " | " + units]
+    tens = "".join(f"{i:<20}" for i in range(half // 10))
+    units = "0 1 2 3 4 5 6 7 8 9 " * (half // 10)
+    return [tens + " | " + tens, units + " | " + units]
+
+
+class Simulator:
+    """Draws emulated panels in the terminal, redrawing only rows that changed."""
+
+    def __init__(self, emulators: List[PanelEmulator], ascii_cells: bool = False):
+        """
+        Initialise the simulator.
+
+        Args:
+            emulators (List[PanelEmulator]): The emulated panels, in panel ID order.
+            ascii_cells (bool, optional): Draw pixels as "#" and "." instead of emoji.
+        """
+        self.emulators = emulators
+        self.ascii_cells = ascii_cells
+        self.drawn: List[List[Optional[str]]] = [
+            [None] * PANEL_HEIGHT for _ in emulators
+        ]
+        self.drawn_labels: List[Optional[str]] = [None] * len(emulators)
+        self.drawn_frames = [0] * len(emulators)
+        self.received = [0] * len(emulators)
+        self.dropped = [0] * len(emulators)
+        self.rate_start = time.monotonic()
+
+    def row_string(self, bitmap: bytes, row: int) -> str:
+        """Format one display row of a panel bitmap."""
+        half = PANEL_WIDTH // 2
+        cells = bytes(bitmap).translate(ROW_TABLES[row]).decode("ascii")
+        line = cells[:half] + " | " + cells[half:]
+        if self.ascii_cells:
+            return line
+        return line.replace("#", LIT).replace(".", UNLIT)
+
+    def start(self) -> None:
+        """Clear the screen and draw the column ruler."""
+        lines = "\n".join(ruler(self.ascii_cells))
+        sys.stdout.write("\x1b[?25l\x1b[2J\x1b[H" + lines)
+        sys.stdout.flush()
+
+    def stop(self) -> None:
+        """Restore the cursor below the simulator."""
+        sys.stdout.write(f"\x1b[{STATUS_LINE + 2};1H\x1b[?25h\n")
+        sys.stdout.flush()
+
+    def draw(self) -> None:
+        """Rewrite the rows that changed since the last draw, and the status line."""
+        out = []
+        for index, emulator in enumerate(self.emulators):
+            top = FIRST_PANEL_LINE + index * PANEL_LINES
+            label = f"Panel {emulator.id}  relay {'on' if emulator.relay else 'off'}"
+            if label != self.drawn_labels[index]:
+                self.drawn_labels[index] = label
+                out.append(f"\x1b[{top};1H\x1b[2K{label}")
+            new_frames = emulator.frames - self.drawn_frames[index]
+            if new_frames == 0:
+                continue
+            self.drawn_frames[index] = emulator.frames
+            self.received[index] += new_frames
+            self.dropped[index] += new_frames - 1
+            for row in range(PANEL_HEIGHT):
+                line = self.row_string(emulator.front, row)
+                if line != self.drawn[index][row]:
+                    self.drawn[index][row] = line
+                    out.append(f"\x1b[{top + 1 + row};1H{line}")
+        now = time.monotonic()
+        elapsed = now - self.rate_start
+        if elapsed >= 1.0:
+            status = "  ".join(
+                f"panel {index}: {received / elapsed:5.1f} fps rx,"
+                f" {dropped / elapsed:5.1f} dropped"
+                for index, (received, dropped) in enumerate(
+                    zip(self.received, self.dropped)
+                )
+            )
+            uart = b"".join(emulator.uart[-20:] for emulator in self.emulators)
+            out.append(f"\x1b[{STATUS_LINE};1H\x1b[2K{status}")
+            if uart:
+                out.append(f"\x1b[{STATUS_LINE + 1};1H\x1b[2KUART: {uart!r}")
+            self.received = [0] * len(self.emulators)
+            self.dropped = [0] * len(self.emulators)
+            self.rate_start = now
+        if out:
+            sys.stdout.write("".join(out))
+            sys.stdout.flush()
+
+
+def process_command(emulator: PanelEmulator, data: bytes) -> None:
+    """Process a received command packet."""
+    if len(data) < 2:
         return
-
     command_code, payload_length = data[0], data[1]
     if len(data) != payload_length + 2:
-        print(
-            f"Error: Received data length ({len(data)}) does not match expected length ({payload_length + 2})"
-        )
         return
-    payload = data[2 : 2 + payload_length]
-
-    if command_code == CommandCode.TEXT.value:
-        x, y = payload[0], payload[1]
-        text = payload[2:].decode("utf-8")
-        display_text(x, y, text)
-
-    elif command_code == CommandCode.BITMAP.value:
-        bitmap = [[] for _ in range(PANEL_HEIGHT)]
-        for i, byte in enumerate(payload):
-            for j in range(PANEL_HEIGHT):
-                bit = (byte >> (PANEL_HEIGHT - j)) & 1
-                bitmap[j].append(bit)
-
-        display_ascii_art(bitmap)
-
-    elif command_code == CommandCode.SET_ID.value:
-        set_id(payload)
-
-    elif command_code == CommandCode.GET_ID.value:
-        query_id()
-
-    elif command_code == CommandCode.WRITE_UART.value:
-        write_to_uart(payload)
-
-    elif command_code == CommandCode.RELAY.value:
-        set_relay(payload)
-
-    else:
-        print(f"Unknown command code: {command_code}, payload: {payload}")
+    emulator.handle(command_code, data[2:])
 
 
 def main():
-    """Main function that initializes the socket and processes commands."""
-    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
-        sock.bind((UDP_IP, UDP_PORT))
-        global addr
+    """Main function that binds a socket per panel and runs the simulator."""
+    parser = argparse.ArgumentParser(description="Hexascroller terminal simulator")
+    parser.add_argument(
+        "--fps", type=float, default=30.0, help="Maximum redraws per second"
+    )
+    parser.add_argument(
+        "--ascii", action="store_true", help="Draw pixels as '#' and '.' characters"
+    )
+    args = parser.parse_args()
+
+    selector = selectors.DefaultSelector()
+    emulators = []
+    for panel_id in range(PANEL_COUNT):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind((UDP_IP, DEBUG_PORT + panel_id))
+        sock.setblocking(False)
+        emulator = PanelEmulator(panel_id)
+        emulators.append(emulator)
+        selector.register(sock, selectors.EVENT_READ, emulator)
+
+    simulator = Simulator(emulators, ascii_cells=args.ascii)
+    simulator.start()
+    interval = 1.0 / args.fps
+    next_draw = time.monotonic()
+    try:
         while True:
-            data, addr = sock.recvfrom(1024)
-            process_command(data)
+            for key, _ in selector.select(max(0.0, next_draw - time.monotonic())):
+                # Drain the socket so a burst of commands doesn't lag the display
+                while True:
+                    try:
+                        data = key.fileobj.recv(1024)
+                    except BlockingIOError:
+                        break
+                    process_command(key.data, data)
+            now = time.monotonic()
+            if now >= next_draw:
+                simulator.draw()
+                next_draw = max(next_draw + interval, now)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+A software model of the hexascroller panel firmware.
+
+`PanelEmulator` keeps the same state as a Teensy running `hexascroller.ino`: a
+front buffer that is on display, a back buffer that the 0xB3/0xB4 commands write
+into, the panel ID and the relay. `handle` applies one command and returns the
+response bytes the firmware would send back.
+
+The emulator is used by the terminal simulator in `debug.py`, and by
+`transport.PtyTransport`, which feeds it the byte stream from a pseudo-terminal.
+"""
+
+import struct
+
+from led_panel import CommandCode, PANEL_WIDTH, Frame
+
+RSP_OK = 0
+RSP_ERROR = 1
+
+# Commands the firmware implements beyond the ones in CommandCode
+CLEAR_BACK_BUFFER = 0xB0
+ADD_BACK_TEXT = 0xB1
+
+# Minimum payload sizes of the commands that take arguments
+MIN_PAYLOAD = {
+    CommandCode.TEXT.value: 2,
+    ADD_BACK_TEXT: 2,
+    CommandCode.SET_ID.value: 1,
+    CommandCode.RELAY.value: 1,
+}
+# How much of the accessory UART output is kept for display
+UART_TAIL = 256
+# Longest echo the firmware sends back; its response buffer is 8 bytes
+ECHO_MAX = 6
+
+
+def response(code: int, payload: bytes = b"") -> bytes:
+    """Build a firmware response: status code, payload length and payload."""
+    return struct.pack("BB", code, len(payload)) + payload
+
+
+class PanelEmulator:
+    # pylint: disable=too-many-instance-attributes
+    """
+    The state of one emulated panel.
+
+    `frames` counts the times the front buffer changed, so a viewer can tell how
+    many frames it missed between two looks at the panel.
+    """
+
+    def __init__(self, panel_id: int = 0) -> None:
+        """
+        Initialise an emulated panel showing a blank display.
+
+        Args:
+            panel_id (int, optional): The ID stored in the panel's EEPROM.
+        """
+        self.id = panel_id  # pylint: disable=invalid-name
+        self.front = bytearray(PANEL_WIDTH)
+        self.back = bytearray(PANEL_WIDTH)
+        self.relay = False
+        self.frames = 0
+        self.uart = b""
+        self.pending = bytearray()
+
+    def flip(self) -> None:
+        """Swap the front and back buffers, as the firmware's 0xB2 command does."""
+        self.front, self.back = self.back, self.front
+        self.frames += 1
+
+    def render_text(self, text: bytes, x_pos: int, y_pos: int) -> bytes:
+        """Render text with the service font, approximating the firmware font."""
+        # pylint: disable=import-outside-toplevel
+        from fontutil import base_font
+
+        columns = base_font.string_columns(text.decode("ascii", "replace"))
+        frame = Frame()
+        frame.blit(Frame(columns).shift_y(y_pos), x_pos)
+        return bytes(frame)
+
+    def handle(self, command: int, payload: bytes) -> bytes:
+        # pylint: disable=too-many-branches
+        """
+        Apply one command to the panel.
+
+        Args:
+            command (int): The command code.
+            payload (bytes): The command payload.
+
+        Returns:
+            bytes: The response the firmware would send.
+        """
+        half = PANEL_WIDTH // 2
+        if len(payload) < MIN_PAYLOAD.get(command, 0):
+            return response(RSP_ERROR, bytes([command]))
+        if command == CommandCode.BITMAP_BACK_HALF_ONE.value:
+            self.back[:half] = payload[:half].ljust(half, b"\0")
+        elif command == CommandCode.BITMAP_BACK_HALF_TWO.value:
+            self.back[half:] = payload[:half].ljust(half, b"\0")
+        elif command == CommandCode.FLIP_BUFFERS.value:
+            self.flip()
+        elif command == CommandCode.BITMAP.value:
+            self.back[:] = payload[:PANEL_WIDTH].ljust(PANEL_WIDTH, b"\0")
+            self.flip()
+        elif command == CommandCode.TEXT.value:
+            x_pos, y_pos = struct.unpack_from("bb", payload)
+            self.back[:] = self.render_text(payload[2:], x_pos, y_pos)
+            self.flip()
+        elif command == CLEAR_BACK_BUFFER:
+            self.back[:] = bytes(PANEL_WIDTH)
+        elif command == ADD_BACK_TEXT:
+            x_pos, y_pos = struct.unpack_from("bb", payload)
+            text = self.render_text(payload[2:], x_pos, y_pos)
+            self.back[:] = bytes(a | b for a, b in zip(self.back, text))
+        elif command == CommandCode.SET_ID.value:
+            self.id = payload[0]
+        elif command == CommandCode.GET_ID.value:
+            return response(RSP_OK, bytes([self.id]))
+        elif command == CommandCode.WRITE_UART.value:
+            self.uart = (self.uart + payload)[-UART_TAIL:]
+        elif command == CommandCode.RELAY.value:
+            self.relay = payload[0] != 0
+        elif command == CommandCode.ECHO.value:
+            return response(RSP_OK, payload[:ECHO_MAX])
+        else:
+            return response(RSP_ERROR, bytes([command]))
+        return response(RSP_OK)
+
+    def feed(self, data: bytes) -> bytes:
+        """
+        Apply the complete commands in a stream of bytes from the serial link.
+
+        Incomplete commands are kept until the rest of their bytes arrive.
+
+        Args:
+            data (bytes): Bytes received from the host.
+
+        Returns:
+            bytes: The responses to the commands completed by `data`.
+        """
+        pending = self.pending
+        pending += data
+        out = []
+        while len(pending) >= 2 and len(pending) >= 2 + pending[1]:
+            end = 2 + pending[1]
+            out.append(self.handle(pending[0], bytes(pending[2:end])))
+            del pending[:end]
+        return b"".join(out)
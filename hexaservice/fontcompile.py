@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Compile the hexascroller bitmap font for both the firmware and the service.
+
+The font source is a PNG strip of glyphs, seven pixels high, in the order given by
+INVENTORY. Dark pixels are lit, and a red (255, 0, 0) pixel in the top row marks
+the column after each glyph.
+
+Each glyph is compiled to packed columns: one byte per column, with row 0 in bit 7
+and row 6 in bit 1, the same layout `led_panel.compile_image` produces and the
+firmware displays. The compiler emits two things:
+
+- the firmware table `hexascroller/hfont.c`: eight bytes per character code, the
+  glyph's columns followed by a 0x01 end marker.
+- a binary glyph cache next to the PNG, which `fontutil.Font` loads with a single
+  read. The cache records the size and modification time of the PNG and the
+  inventory, and is rebuilt whenever they change.
+
+The sprite atlas `sprites.png` is a strip of icons in the same format, in the order
+given by SPRITES. It is compiled and cached the same way, with each icon stored
+under a Private Use Area character (SPRITE_BASE onwards), so icons are glyphs like
+any other; `fontutil.Font` maps `:name:` tokens in messages to those characters.
+The firmware table only holds ASCII, so it has no sprites.
+
+Cache layout (little-endian):
+
+    offset  size  field
+    0       4     magic, b"HXFC"
+    4       1     version
+    5       1     glyph height
+    6       2     inventory length in bytes (UTF-8)
+    8       8     source PNG size
+    16      8     source PNG modification time, in nanoseconds
+    24      n     inventory, UTF-8
+    ...           per glyph, in inventory order: width (1 byte), then the columns
+
+Example usage:
+
+```bash
+python3 fontcompile.py                  # refresh the cache and hfont.c
+python3 fontcompile.py --c-out -        # print the firmware table
+```
+"""
+
+import argparse
+import logging
+import os
+import struct
+import sys
+from typing import Dict, Optional, Tuple
+
+from PIL import Image
+
+CHAR_HEIGHT = 7
+RED_MARKER = (255, 0, 0)
+LIT = (0, 0, 0)
+
+# The characters in the font source, in the order they appear
+INVENTORY = (
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789.!?@/:;()#"
+    "abcdefghijklmnopqrstuvwxyz,=^|-_+'\"~"
+)
+
+# The icons in the sprite atlas, in the order they appear
+SPRITES = (
+    "bell",
+    "door",
+    "sun",
+    "cloud",
+    "rain",
+    "snow",
+    "thermometer",
+    "heart",
+    "mail",
+    "check",
+    "cross",
+    "warning",
+)
+# The character of the first sprite, at the start of the Private Use Area
+SPRITE_BASE = 0xE000
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SOURCE = os.path.join(HERE, "basic-font.png")
+DEFAULT_SPRITES = os.path.join(HERE, "sprites.png")
+DEFAULT_C_OUT = os.path.join(HERE, "..", "hexascroller", "hfont.c")
+
+CACHE_MAGIC = b"HXFC"
+CACHE_VERSION = 1
+CACHE_HEADER = struct.Struct("<4sBBHQQ")
+
+# Firmware table: 128 character codes of 8 bytes each
+FIRMWARE_CHARS = 128
+FIRMWARE_STRIDE = 8
+END_MARKER = 0x01
+
+logger = logging.getLogger(__name__)
+
+
+def compile_glyphs(path: str, inventory: str = INVENTORY) -> Dict[str, bytes]:
+    """
+    Compile the glyphs in a font source PNG into packed columns.
+
+    Args:
+        path (str): The font source PNG.
+        inventory (str): The characters in the PNG, in order.
+
+    Returns:
+        Dict[str, bytes]: The packed columns of each character.
+    """
+    with Image.open(path) as src:
+        img = src.convert("RGB")
+    width = img.size[0]
+    pixels = img.load()
+    glyphs: Dict[str, bytes] = {}
+    x_pos = 0
+    for char in inventory:
+        if x_pos >= width:
+            logger.error(
+                "Character not found in font image at position %i: '%s'", x_pos, char
+            )
+            continue
+        columns = bytearray()
+        while x_pos < width and pixels[x_pos, 0] != RED_MARKER:
+            column = 0
+            for row in range(CHAR_HEIGHT):
+                if pixels[x_pos, row] == LIT:
+                    column |= 1 << (CHAR_HEIGHT - row)
+            columns.append(column)
+            x_pos += 1
+        glyphs[char] = bytes(columns)
+        x_pos += 1  # skip the marker column
+    return glyphs
+
+
+def source_stamp(path: str) -> Tuple[int, int]:
+    """Return the size and modification time of the font source."""
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def cache_path(path: str) -> str:
+    """Return the glyph cache path for a font source PNG."""
+    return os.path.splitext(path)[0] + ".hfc"
+
+
+def write_cache(path: str, inventory: str, glyphs: Dict[str, bytes]) -> None:
+    """
+    Write a glyph cache for the font source at `path`.
+
+    Args:
+        path (str): The font source PNG the glyphs were compiled from.
+        inventory (str): The characters in the font, in order.
+        glyphs (Dict[str, bytes]): The packed columns of each character.
+    """
+    encoded = inventory.encode()
+    size, mtime = source_stamp(path)
+    parts = [
+        CACHE_HEADER.pack(
+            CACHE_MAGIC, CACHE_VERSION, CHAR_HEIGHT, len(encoded), size, mtime
+        ),
+        encoded,
+    ]
+    for char in inventory:
+        columns = glyphs.get(char, b"")
+        parts.append(bytes([len(columns)]))
+        parts.append(columns)
+    tmp = cache_path(path) + ".tmp"
+    with open(tmp, "wb") as cache_file:
+        cache_file.write(b"".join(parts))
+    os.replace(tmp, cache_path(path))
+
+
+def read_cache(path: str, inventory: str) -> Optional[Dict[str, bytes]]:
+    """
+    Load the glyph cache for the font source at `path`, if it is up to date.
+
+    Args:
+        path (str): The font source PNG.
+        inventory (str): The characters expected in the font, in order.
+
+    Returns:
+        Optional[Dict[str, bytes]]: The packed columns of each character, or None
+        if there is no cache or it is stale.
+    """
+    try:
+        with open(cache_path(path), "rb") as cache_file:
+            data = cache_file.read()
+        stamp = source_stamp(path)
+    except OSError:
+        return None
+    if len(data) < CACHE_HEADER.size:
+        return None
+    magic, version, height, inventory_len, size, mtime = CACHE_HEADER.unpack_from(data)
+    offset = CACHE_HEADER.size
+    if (
+        magic != CACHE_MAGIC
+        or version != CACHE_VERSION
+        or height != CHAR_HEIGHT
+        or (size, mtime) != stamp
+        or data[offset : offset + inventory_len] != inventory.encode()
+    ):
+        return None
+    offset += inventory_len
+    glyphs: Dict[str, bytes] = {}
+    for char in inventory:
+        width = data[offset]
+        glyphs[char] = data[offset + 1 : offset + 1 + width]
+        offset += 1 + width
+    return glyphs
+
+
+def load_glyphs(path: str, inventory: str = INVENTORY) -> Dict[str, bytes]:
+    """
+    Load the packed glyphs for a font source, from the cache when it is fresh.
+
+    A stale or missing cache is rebuilt from the PNG. If the cache can't be written
+    the freshly compiled glyphs are still returned.
+
+    Args:
+        path (str): The font source PNG.
+        inventory (str): The characters in the PNG, in order.
+
+    Returns:
+        Dict[str, bytes]: The packed columns of each character.
+    """
+    glyphs = read_cache(path, inventory)
+    if glyphs is not None:
+        return glyphs
+    logger.info("Compiling font %s", path)
+    glyphs = compile_glyphs(path, inventory)
+    try:
+        write_cache(path, inventory, glyphs)
+    except OSError as error:
+        logger.warning("Could not write font cache for %s: %s", path, error)
+    return glyphs
+
+
+def sprite_chars(names: Tuple[str, ...] = SPRITES) -> Dict[str, str]:
+    """
+    Return the character each sprite is stored under.
+
+    Args:
+        names (Tuple[str, ...]): The sprites in the atlas, in order.
+
+    Returns:
+        Dict[str, str]: The Private Use Area character of each sprite name.
+    """
+    return {name: chr(SPRITE_BASE + index) for index, name in enumerate(names)}
+
+
+def firmware_table(glyphs: Dict[str, bytes]) -> str:
+    """
+    Format the glyphs as the firmware's `charData` table.
+
+    Args:
+        glyphs (Dict[str, bytes]): The packed columns of each character.
+
+    Returns:
+        str: The contents of hfont.c.
+    """
+    table = bytearray(FIRMWARE_CHARS * FIRMWARE_STRIDE)
+    for char, columns in glyphs.items():
+        code = ord(char)
+        if code >= FIRMWARE_CHARS:
+            continue
+        # As in the original table, a glyph wider than seven columns runs into the
+        # next character code's slot
+        entry = columns + bytes([END_MARKER])
+        offset = code * FIRMWARE_STRIDE
+        table[offset : offset + len(entry)] = entry[: len(table) - offset]
+    lines = ["", '#include "hfont.h"', "const uint8_t charData[] PROGMEM = {"]
+    lines.extend(f"    0b{value:08b}," for value in table)
+    lines.append("};")
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    """Main function."""
+    parser = argparse.ArgumentParser(description="Compile the hexascroller font")
+    parser.add_argument(
+        "--source", default=DEFAULT_SOURCE, help="Font source PNG (basic-font.png)"
+    )
+    parser.add_argument(
+        "--sprites", default=DEFAULT_SPRITES, help="Sprite atlas PNG (sprites.png)"
+    )
+    parser.add_argument(
+        "--c-out",
+        default=DEFAULT_C_OUT,
+        help="Where to write the firmware table, '-' for stdout (hexascroller/hfont.c)",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    glyphs = compile_glyphs(args.source)
+    write_cache(args.source, INVENTORY, glyphs)
+    logger.info("Wrote %s", cache_path(args.source))
+    if os.path.exists(args.sprites):
+        inventory = "".join(sprite_chars().values())
+        write_cache(args.sprites, inventory, compile_glyphs(args.sprites, inventory))
+        logger.info("Wrote %s", cache_path(args.sprites))
+    table = firmware_table(glyphs)
+    if args.c_out == "-":
+        sys.stdout.write(table)
+    else:
+        with open(args.c_out, "w", encoding="utf-8") as c_file:
+            c_file.write(table)
+        logger.info("Wrote %s", args.c_out)
+
+
+if __name__ == "__main__":
+    main()
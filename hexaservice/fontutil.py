@@ -9,19 +9,33 @@ a single image representing the input string using the loaded font.
 
 The bitmap font image should have the characters separated by a red marker (255, 0, 0)
 at the top of each character. The height of each character should be consistent, and
-the width can vary depending on the character.
+the width can vary depending on the character. The image is compiled by
+`fontcompile.py` into packed glyph columns, which are cached next to the image and
+loaded with a single read; the image is only parsed again when it changes.
 
 The `Font` class constructor accepts two parameters:
 - `path`: A string representing the path to the font image file.
 - `inventory`: A string containing the characters included in the font image in the
    same order as they appear in the image.
 
-The `Font` class provides two methods:
+The `Font` class provides five methods:
+- `add_sprites(path: str, names: Tuple[str, ...]) -> None`: Loads a sprite atlas,
+  compiled and cached like the font, and adds each icon as a glyph.
+- `normalize(text: str) -> Tuple[str, Dict[str, int]]`: Folds arbitrary text onto the
+  font's inventory, once, when a message arrives. Sprite tokens such as `:bell:`
+  become the sprite's glyph, accented letters lose their accents, typographic
+  punctuation is transliterated, and anything else becomes the replacement glyph.
+  Returns the folded text and a count of each missing character.
 - `string_width(chars: str) -> int`: Accepts a string `chars` and returns the total
-   width of the string using the loaded font.
+  width of the string using the loaded font.
+- `string_columns(chars: str) -> bytes`: Accepts a string `chars` and returns it
+  rendered as packed columns, in the byte layout the LED panels display.
 - `string_image(chars: str) -> Image.Image`: Accepts a string `chars` and returns an
   `Image.Image` object representing the input string using the loaded font.
 
+`string_width`, `string_columns` and `string_image` expect normalized text; they run
+every frame and do no fallback work or logging.
+
 Example usage:
 
 ```python
@@ -32,45 +46,101 @@ base_font = Font(
     "ABCDEFGHIJKLMNOPQRSTUVWXYZ",
 )
 
-test_string = "Hello world!"
+test_string, missing = base_font.normalize("Héllo wörld!")
 text_width = base_font.string_width(test_string)
 print(f"Width of '{test_string}' is {text_width} pixels.")
 text_image = base_font.string_image(test_string)
 text_image.show()
 """
 
+import collections
 import logging
-from typing import Tuple, Dict
-from PIL import Image, ImageChops
+import re
+import unicodedata
+from typing import Dict, Optional, Pattern, Tuple
+from PIL import Image
+
+from fontcompile import (
+    CHAR_HEIGHT,
+    DEFAULT_SPRITES,
+    INVENTORY,
+    SPRITES,
+    load_glyphs,
+    sprite_chars,
+)
 
-RED_MARKER = (255, 0, 0)
-CHAR_HEIGHT = 7
+SPACE_WIDTH = 2
+REPLACEMENT_CHAR = "?"
+
+# Characters that Unicode decomposition doesn't fold onto ASCII
+TRANSLITERATIONS: Dict[str, str] = {
+    "\u2018": "'",
+    "\u2019": "'",
+    "\u201a": "'",
+    "\u2032": "'",
+    "`": "'",
+    "\u201c": '"',
+    "\u201d": '"',
+    "\u201e": '"',
+    "\u2033": '"',
+    "\u00ab": '"',
+    "\u00bb": '"',
+    "\u2010": "-",
+    "\u2011": "-",
+    "\u2012": "-",
+    "\u2013": "-",
+    "\u2014": "-",
+    "\u2015": "-",
+    "\u2212": "-",
+    "\u2022": "-",
+    "\u00b7": "-",
+    "\u2026": "...",
+    "\u00d7": "x",
+    "\u00df": "ss",
+    "\u00e6": "ae",
+    "\u00c6": "AE",
+    "\u0153": "oe",
+    "\u0152": "OE",
+    "\u00f8": "o",
+    "\u00d8": "O",
+    "\u0111": "d",
+    "\u0110": "D",
+    "\u0142": "l",
+    "\u0141": "L",
+    "\u00fe": "th",
+    "\u00de": "Th",
+    "\u20ac": "EUR",
+    "\u00a3": "GBP",
+    "\u00b0": "o",
+    "[": "(",
+    "]": ")",
+    "{": "(",
+    "}": ")",
+    "\t": " ",
+    "\n": " ",
+    "\r": " ",
+    "\u00a0": " ",
+}
 
 logger = logging.getLogger(__name__)
 
 
-def get_char(img: Image.Image, x_pos: int) -> Tuple[Image.Image, int]:
+def columns_image(columns: bytes) -> Image.Image:
     """
-    Extract the character starting at x in img.
-
-    Uses a pixel of value RED_MARKER as the limit marker.
+    Turn packed glyph columns into a 1-bit image.
 
     Args:
-        img (Image.Image): Source image containing the character.
-        x_pos (int): Starting x position of the character in the image.
+        columns (bytes): One byte per column, row 0 in bit 7.
 
     Returns:
-        Tuple[Image.Image, int]: A tuple containing the extracted character image and
-        the next x position after the marker.
-
+        Image.Image: The image, CHAR_HEIGHT pixels high.
     """
-    next_x = x_pos
-    logger.debug("Extracting character at x %d", x_pos)
-    while img.getpixel((next_x, 0)) != RED_MARKER:
-        next_x += 1
-        logger.debug("Next x: %d", next_x)
-    char_img = img.crop((x_pos, 0, next_x, CHAR_HEIGHT))
-    return (char_img, next_x + 1)
+    if not columns:
+        return Image.new("1", (0, CHAR_HEIGHT))
+    # Each column byte becomes an image row; transposing turns rows into columns
+    img = Image.frombytes("1", (8, len(columns)), bytes(columns))
+    img = img.transpose(Image.Transpose.TRANSPOSE)
+    return img.crop((0, 0, len(columns), CHAR_HEIGHT))
 
 
 class Font:
@@ -80,32 +150,107 @@ class Font:
     Has methods to calculate string widths and generate images of strings.
     """
 
-    def __init__(self, path: str, inventory: str):
+    def __init__(self, path: str, inventory: str, replacement: str = REPLACEMENT_CHAR):
         """
         Initialize a Font object.
 
         Args:
             path (str): Path to the font image file.
             inventory (str): String containing all characters supported by the font.
+            replacement (str, optional): Character shown in place of characters the
+                font can't represent. Defaults to "?".
         """
-        x_pos = 0
-        self.fontmap: Dict[str, Image.Image] = {}
+        self.replacement = replacement
+        # Folded form of each character seen by normalize(), or None if missing
+        self.folds: Dict[str, Optional[str]] = {}
         try:
-            self.base_img = Image.open(path)
+            self.glyphs: Dict[str, bytes] = load_glyphs(path, inventory)
         except FileNotFoundError:
             logger.error("Font file not found: %s", path)
             raise
-        for char in inventory:
-            logger.debug("Loading character: %s at x %d", char, x_pos)
-            if x_pos >= self.base_img.size[0]:
-                logger.error(
-                    "Character not found in font image at position %i: '%s'",
-                    x_pos,
-                    char,
-                )
-                continue
-            (char_img, x_pos) = get_char(self.base_img, x_pos)
-            self.fontmap[char] = ImageChops.invert(char_img)
+        self.glyphs[" "] = bytes(SPACE_WIDTH)
+        if self.replacement not in self.glyphs:
+            self.replacement = " "
+        # The glyph character of each sprite name, and the tokens that name them
+        self.sprites: Dict[str, str] = {}
+        self.sprite_tokens: Optional[Pattern[str]] = None
+
+    def add_sprites(self, path: str, names: Tuple[str, ...] = SPRITES) -> None:
+        """
+        Load a sprite atlas and add its icons as glyphs, shown for `:name:` tokens.
+
+        The atlas is compiled and cached like the font, so this is a single read
+        once the cache is fresh.
+
+        Args:
+            path (str): Path to the sprite atlas image.
+            names (Tuple[str, ...], optional): The sprites in the atlas, in order.
+        """
+        chars = sprite_chars(names)
+        glyphs = load_glyphs(path, "".join(chars.values()))
+        for name, char in chars.items():
+            if glyphs.get(char):
+                self.glyphs[char] = glyphs[char]
+                self.sprites[name] = char
+        if self.sprites:
+            self.sprite_tokens = re.compile(
+                ":(" + "|".join(re.escape(name) for name in self.sprites) + "):"
+            )
+
+    def fold_char(self, char: str) -> Optional[str]:
+        """
+        Fold one character onto the font inventory.
+
+        Args:
+            char (str): The character to fold.
+
+        Returns:
+            Optional[str]: The folded string, or None if the character can't be
+            represented.
+        """
+        if char in self.glyphs:
+            return char
+        folded = TRANSLITERATIONS.get(char)
+        if folded is None:
+            # Decompose, then drop the combining marks: "é" becomes "e"
+            folded = "".join(
+                c
+                for c in unicodedata.normalize("NFKD", char)
+                if not unicodedata.combining(c)
+            )
+        if folded and all(c in self.glyphs for c in folded):
+            return folded
+        return None
+
+    def normalize(self, text: str) -> Tuple[str, Dict[str, int]]:
+        """
+        Fold text onto the font inventory, so that every character can be rendered.
+
+        This is meant to run once per message, not per frame.
+
+        Args:
+            text (str): The text to fold.
+
+        Returns:
+            Tuple[str, Dict[str, int]]: The folded text, and how many times each
+            character the font can't represent occurred in the text.
+        """
+        missing: Dict[str, int] = collections.Counter()
+        out = []
+        folds = self.folds
+        if self.sprite_tokens and ":" in text:
+            sprites = self.sprites
+            text = self.sprite_tokens.sub(lambda match: sprites[match[1]], text)
+        for char in text:
+            if char not in folds:
+                folds[char] = self.fold_char(char)
+            folded = folds[char]
+            if folded is None:
+                missing[char] += 1
+                out.append(self.replacement)
+            else:
+                out.append(folded)
+        return "".join(out), dict(missing)
 
     def string_width(self, chars: str) -> int:
         """
@@ -117,11 +262,34 @@ class Font:
         Returns:
             int: The width of the rendered string in pixels.
         """
-        width = sum(self.fontmap[c].size[0] if c in self.fontmap else 2 for c in chars)
+        glyphs = self.glyphs
+        try:
+            width = sum(len(glyphs[c]) for c in chars)
+        except KeyError:
+            return self.string_width(self.normalize(chars)[0])
         # plus one pixel between each character
         width += len(chars) - 1
         return width
 
+    def string_columns(self, chars: str) -> bytes:
+        """
+        Render a string in the font as packed columns, ready for the LED panel.
+
+        Args:
+            chars (str): The string to render.
+
+        Returns:
+            bytes: One byte per column, in the layout `led_panel.compile_image` uses.
+        """
+        glyphs = self.glyphs
+        try:
+            # add a blank column between each character
+            return b"\0".join([glyphs[c] for c in chars])
+        except KeyError:
+            # Not normalized; this only happens for text that didn't come in
+            # through a message, so the extra work is acceptable
+            return b"\0".join([glyphs[c] for c in self.normalize(chars)[0]])
+
     def string_image(self, chars: str) -> Image.Image:
         """
         Generate an image of a string rendered in the font.
@@ -132,27 +300,15 @@ class Font:
         Returns:
             Image.Image: The rendered string as an image.
         """
-        img = Image.new("1", (self.string_width(chars), CHAR_HEIGHT))
-        x_pos = 0
-        for char in chars:
-            if char in self.fontmap:
-                img.paste(self.fontmap[char], (x_pos, 0))
-                x_pos += self.fontmap[char].size[0]
-            else:
-                # if the character is not in the fontmap, use a space
-                if char != " ":  # don't log a warning for spaces
-                    logger.warning("Character not found in font: %s", char)
-                x_pos += 2
-            # add a pixel between each character
-            x_pos += 1
-        return img
+        return columns_image(self.string_columns(chars))
 
 
 # Initialize the base_font instance
-base_font = Font(
-    "basic-font.png",
-    "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789.!?@/:;()#abcdefghijklmnopqrstuvwxyz,=^|-_+'\"~",
-)
+base_font = Font("basic-font.png", INVENTORY)
+try:
+    base_font.add_sprites(DEFAULT_SPRITES)
+except FileNotFoundError:
+    logger.warning("Sprite atlas not found: %s", DEFAULT_SPRITES)
 
 if __name__ == "__main__":
-    base_font.string_image("Hello world!").show()
+    base_font.string_image(base_font.normalize("Hello world! :bell:")[0]).show()
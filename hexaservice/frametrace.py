@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Lightweight per-frame span tracing for the hexascroller service.
+
+The tracer records timestamped spans for the phases of a frame (render, compile,
+effects, per-panel write, ack wait, flip) into a fixed-size ring buffer. Recording
+a span costs two `time.perf_counter_ns` calls and one `deque.append`, so it is
+cheap enough to leave enabled on the Pi for short windows. When the tracer is
+disabled, `span()` hands back a shared no-op context manager.
+
+The buffer can be dumped on demand as Chrome trace-event JSON, which can be loaded
+into `chrome://tracing` or https://ui.perfetto.dev.
+
+Example usage:
+
+```python
+from frametrace import tracer
+
+tracer.enable(10000)
+with tracer.span("render"):
+    ...
+tracer.dump("hexascroller-trace.json")
+```
+"""
+
+import collections
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from realtime import set_normal
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CAPACITY = 20000
+
+# (name, category, start_ns, duration_ns, thread id, args)
+Event = Tuple[str, str, int, int, int, Optional[Dict[str, Any]]]
+
+
+class _NullSpan:
+    """A do-nothing context manager returned while tracing is disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """A context manager recording one complete span into the tracer's buffer."""
+
+    __slots__ = ("events", "name", "cat", "args", "start")
+
+    def __init__(self, events: Deque[Event], name: str, cat: str, args) -> None:
+        self.events = events
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        self.events.append(
+            (
+                self.name,
+                self.cat,
+                self.start,
+                end - self.start,
+                threading.get_ident(),
+                self.args,
+            )
+        )
+        return False
+
+
+class Tracer:
+    """
+    A ring buffer of timestamped spans.
+
+    Spans are appended from any thread; `deque.append` is atomic, so no lock is
+    taken on the recording path.
+    """
+
+    def __init__(self) -> None:
+        """Initialise a disabled tracer."""
+        self.enabled: bool = False
+        self.events: Deque[Event] = collections.deque(maxlen=DEFAULT_CAPACITY)
+
+    def enable(self, capacity: Optional[int] = None) -> None:
+        """
+        Start recording spans.
+
+        Args:
+            capacity (int, optional): Ring buffer size in spans. Keeps the current
+                size if not given.
+        """
+        if capacity and capacity != self.events.maxlen:
+            self.events = collections.deque(self.events, maxlen=capacity)
+        self.enabled = True
+        logger.info("Frame tracing enabled, buffer of %d spans", self.events.maxlen)
+
+    def disable(self) -> None:
+        """Stop recording spans. Recorded spans are kept until the next dump."""
+        self.enabled = False
+        logger.info("Frame tracing disabled")
+
+    def span(self, name: str, cat: str = "frame", **args: Any):
+        """
+        Return a context manager that records a span named `name` around its body.
+
+        Args:
+            name (str): The span name, e.g. "render" or "ack".
+            cat (str, optional): The span category. Defaults to "frame".
+            **args: Extra values stored with the span, e.g. the panel id.
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self.events, name, cat, args or None)
+
+    def instant(self, name: str, cat: str = "frame", **args: Any) -> None:
+        """Record a zero-length marker event."""
+        if self.enabled:
+            self.events.append(
+                (name, cat, time.perf_counter_ns(), -1, threading.get_ident(), args)
+            )
+
+    def chrome_trace(self, events: Optional[List[Event]] = None) -> Dict[str, Any]:
+        """
+        Convert recorded spans into a Chrome trace-event document.
+
+        Args:
+            events (list, optional): The spans to convert. Defaults to a snapshot
+                of the ring buffer.
+
+        Returns:
+            dict: A JSON-serialisable trace-event document.
+        """
+        if events is None:
+            events = list(self.events)
+        pid = os.getpid()
+        trace_events: List[Dict[str, Any]] = []
+        for thread in threading.enumerate():
+            trace_events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": pid,
+                    "tid": thread.ident,
+                    "args": {"name": thread.name},
+                }
+            )
+        for name, cat, start, duration, tid, args in events:
+            event: Dict[str, Any] = {
+                "name": name,
+                "cat": cat,
+                "ts": start / 1000.0,
+                "pid": pid,
+                "tid": tid,
+            }
+            if duration < 0:
+                event["ph"] = "i"
+                event["s"] = "t"
+            else:
+                event["ph"] = "X"
+                event["dur"] = duration / 1000.0
+            if args:
+                event["args"] = args
+            trace_events.append(event)
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+    def dump(self, path: str) -> int:
+        """
+        Write the ring buffer to `path` as Chrome trace-event JSON and clear it.
+
+        Args:
+            path (str): The file to write.
+
+        Returns:
+            int: The number of spans written.
+        """
+        events = list(self.events)
+        self.events.clear()
+        with open(path, "w", encoding="utf-8") as trace_file:
+            json.dump(self.chrome_trace(events), trace_file)
+        logger.info("Wrote %d trace spans to %s", len(events), path)
+        return len(events)
+
+    def dump_async(self, directory: str = ".") -> str:
+        """
+        Dump the ring buffer from a background thread, so the caller never blocks.
+
+        The buffer is snapshotted immediately; serialisation happens off-thread.
+
+        Args:
+            directory (str, optional): Directory for the trace file.
+
+        Returns:
+            str: The path the trace will be written to.
+        """
+        path = os.path.join(
+            directory, time.strftime("hexascroller-trace-%Y%m%dT%H%M%S.json")
+        )
+        events = list(self.events)
+        self.events.clear()
+
+        def write():
+            # Started from the frame loop's thread on SIGUSR1, so it inherits
+            # SCHED_FIFO under --realtime
+            set_normal()
+            try:
+                with open(path, "w", encoding="utf-8") as trace_file:
+                    json.dump(self.chrome_trace(events), trace_file)
+                logger.info("Wrote %d trace spans to %s", len(events), path)
+            except OSError as error:
+                logger.error("Could not write trace to %s: %s", path, error)
+
+        threading.Thread(target=write, name="trace-dump", daemon=True).start()
+        return path
+
+
+# The process-wide tracer shared by the service and the panel driver
+tracer = Tracer()
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+hexactl: drive the hexascroller panels from the command line, without the service.
+
+It replaces the Python 2 scripts in scripts/ and is built on led_panel, so it finds
+the panels by ID, renders with the service's font and goes through the same link
+recovery. Stop the service first; the panels only talk to one program at a time.
+
+Subcommands:
+
+- `list`: show the panels found, with their ports and IDs.
+- `text MESSAGE`: show text across the panels, rendered with the service's font.
+- `image FILE [--x X] [--y Y]`: show an image across the panels.
+- `scroll (--text MESSAGE | FILE) [--speed COLUMNS] [--times N]`: scroll text or an
+  image across the panels from right to left.
+- `frame (HEX | --file FILE)`: show a raw 120- or 360-byte frame.
+- `relay on|off`: switch the power relay.
+- `uart [--panel N] (DATA | --hex HEX | --file FILE)`: send data of any length to a
+  panel's accessory UART, paced for the 9600 baud link.
+- `id --port DEVICE [NEW_ID]`: show, or set, the ID of the panel on one port.
+- `sleep SECONDS`: wait, between other subcommands in a batch.
+- `batch [FILE]`: run subcommands from a file, or standard input, one per line,
+  in one session. Blank lines and lines starting with # are skipped.
+
+The panels are found and opened once per run, so a batch of subcommands only pays
+for discovery and opening the ports once.
+
+Example usage:
+
+```bash
+python3 hexactl.py text "Hello, Resistor"
+python3 hexactl.py --transport pty scroll --text "A long message" --speed 60
+printf 'relay on\\ntext Ready\\nsleep 2\\nimage logo.png\\n' | python3 hexactl.py batch
+```
+"""
+
+import argparse
+import logging
+import shlex
+import sys
+import time
+from typing import Dict, List, Optional, TextIO
+
+from PIL import Image
+
+from accessory import AccessoryStream
+from fontutil import base_font
+from led_panel import (
+    PANEL_COUNT,
+    PANEL_WIDTH,
+    TRANSPORTS,
+    Frame,
+    Panel,
+    RawSerialTransport,
+    SerialTransport,
+    discover_panels,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SPEED = 30.0
+
+
+class Session:
+    """The panels, found and opened on first use and shared by every subcommand."""
+
+    def __init__(self, transport: str = "serial") -> None:
+        """
+        Initialise the session.
+
+        Args:
+            transport (str, optional): One of led_panel.TRANSPORTS.
+        """
+        self.transport = transport
+        self.found: Optional[Dict[int, Panel]] = None
+
+    @property
+    def panels(self) -> List[Panel]:
+        """The panels, in ID order, opened the first time they are needed."""
+        if self.found is None:
+            self.found = discover_panels(range(PANEL_COUNT), transport=self.transport)
+            if not self.found:
+                raise IOError("No panels found")
+            missing = sorted(set(range(PANEL_COUNT)) - set(self.found))
+            if missing:
+                logger.warning("Panels %s not found", missing)
+        return [self.found[panel_id] for panel_id in sorted(self.found)]
+
+    def show(self, columns: bytes, start: int = 0) -> None:
+        """Show packed columns across the panels, from column `start` on."""
+        for index, panel in enumerate(self.panels):
+            first = start + index * PANEL_WIDTH
+            window = columns[max(first, 0) : max(first + PANEL_WIDTH, 0)]
+            if first < 0:
+                window = bytes(min(-first, PANEL_WIDTH)) + window
+            panel.set_compiled_image(
+                bytes(window[:PANEL_WIDTH]).ljust(PANEL_WIDTH, b"\0")
+            )
+
+    def close(self) -> None:
+        """Close the panels, if they were opened."""
+        for panel in (self.found or {}).values():
+            panel.close()
+        self.found = None
+
+
+def text_columns(text: str) -> bytes:
+    """Render text to packed columns with the service's font."""
+    return base_font.string_columns(base_font.normalize(text)[0])
+
+
+def image_columns(path: str, y_pos: int = 0) -> bytes:
+    """Compile an image file to packed columns, rows y_pos to y_pos + 6."""
+    with Image.open(path) as img:
+        return bytes(Frame.from_image(img, 0, y_pos, img.size[0]))
+
+
+def cmd_list(session: Session, args: argparse.Namespace) -> None:
+    """Show the panels found."""
+    # pylint: disable=unused-argument
+    for panel in session.panels:
+        echo = "echo" if panel.echo else "no echo"
+        print(f"Panel {panel.id}: {panel.transport.name} ({echo})")
+
+
+def cmd_text(session: Session, args: argparse.Namespace) -> None:
+    """Show text across the panels."""
+    session.show(text_columns(" ".join(args.message)), -args.x)
+
+
+def cmd_image(session: Session, args: argparse.Namespace) -> None:
+    """Show an image across the panels."""
+    session.show(image_columns(args.file, args.y), args.x)
+
+
+def cmd_scroll(session: Session, args: argparse.Namespace) -> None:
+    """Scroll text or an image across the panels, right to left."""
+    if args.text is not None:
+        columns = text_columns(args.text)
+    elif args.file:
+        columns = image_columns(args.file, args.y)
+    else:
+        raise ValueError("scroll needs --text or an image file")
+    width = len(session.panels) * PANEL_WIDTH
+    steps = len(columns) + width
+    interval = 1.0 / args.speed
+    for _ in range(args.times):
+        start = time.monotonic()
+        for step in range(steps):
+            session.show(columns, step - width)
+            time.sleep(max(0.0, start + (step + 1) * interval - time.monotonic()))
+
+
+def cmd_frame(session: Session, args: argparse.Namespace) -> None:
+    """Show a raw frame."""
+    if args.file:
+        with open(args.file, "rb") as frame_file:
+            frame = frame_file.read()
+    elif args.hex:
+        frame = bytes.fromhex(args.hex)
+    else:
+        raise ValueError("frame needs hex bytes or --file")
+    if len(frame) == PANEL_WIDTH:
+        frame *= len(session.panels)
+    elif len(frame) != PANEL_COUNT * PANEL_WIDTH:
+        raise ValueError(
+            f"A frame is {PANEL_WIDTH} or {PANEL_COUNT * PANEL_WIDTH} bytes"
+        )
+    session.show(frame)
+
+
+def cmd_relay(session: Session, args: argparse.Namespace) -> None:
+    """Switch the power relay, which is on the first panel."""
+    session.panels[0].set_relay(args.state == "on")
+
+
+def cmd_uart(session: Session, args: argparse.Namespace) -> None:
+    """Send data to a panel's accessory UART, waiting until it has all gone."""
+    if args.file:
+        with open(args.file, "rb") as data_file:
+            data = data_file.read()
+    elif args.hex:
+        data = bytes.fromhex(args.hex)
+    elif args.data is not None:
+        data = args.data.encode()
+    else:
+        raise ValueError("uart needs data, --hex or --file")
+    panels = {panel.id: panel for panel in session.panels}
+    if args.panel not in panels:
+        raise ValueError(f"Panel {args.panel} not found")
+    stream = AccessoryStream(panels[args.panel], depth=len(data))
+    stream.write(data)
+    while stream.pending:
+        stream.pump(time.monotonic())
+        time.sleep(0.01)
+
+
+def cmd_id(session: Session, args: argparse.Namespace) -> None:
+    """Show or set the ID of the panel on one port."""
+    if session.transport not in ("serial", "raw"):
+        raise ValueError("id needs the serial or raw transport")
+    link_class = RawSerialTransport if session.transport == "raw" else SerialTransport
+    panel = Panel(link_class(args.port))
+    try:
+        panel.open()
+        if args.new_id is not None:
+            panel.set_id(args.new_id)
+        print(f"{args.port}: panel {panel.get_id()}")
+    finally:
+        panel.close()
+
+
+def cmd_sleep(session: Session, args: argparse.Namespace) -> None:
+    """Wait."""
+    # pylint: disable=unused-argument
+    time.sleep(args.seconds)
+
+
+def cmd_batch(session: Session, args: argparse.Namespace) -> None:
+    """Run subcommands from a file or standard input."""
+    if args.file in (None, "-"):
+        run_batch(session, sys.stdin, "<stdin>")
+    else:
+        with open(args.file, encoding="utf-8") as batch_file:
+            run_batch(session, batch_file, args.file)
+
+
+def run_batch(session: Session, lines: TextIO, name: str) -> None:
+    """
+    Run one subcommand per line in the session.
+
+    Raises:
+        ValueError: If a line can't be parsed or its subcommand fails.
+    """
+    parser = build_parser(batch=True)
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            args = parser.parse_args(shlex.split(line))
+        except SystemExit as error:
+            # argparse has printed what was wrong
+            raise ValueError(f"{name}:{number}: invalid command: {line}") from error
+        try:
+            args.run(session, args)
+        except (ValueError, OSError) as error:
+            raise ValueError(f"{name}:{number}: {line}: {error}") from error
+
+
+def build_parser(batch: bool = False) -> argparse.ArgumentParser:
+    """Build the argument parser, without the options and batch in a batch."""
+    parser = argparse.ArgumentParser(
+        prog="hexactl", description="Drive the hexascroller panels"
+    )
+    if not batch:
+        parser.add_argument(
+            "--transport",
+            choices=TRANSPORTS,
+            default="serial",
+            help="How to talk to the panels, as for service.py (default: serial)",
+        )
+        parser.add_argument("--debug", action="store_true", help="Log the traffic")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("list", help="Show the panels found")
+    command.set_defaults(run=cmd_list)
+
+    command = commands.add_parser("text", help="Show text across the panels")
+    command.add_argument("message", nargs="+")
+    command.add_argument("--x", type=int, default=0, help="First column of the text")
+    command.set_defaults(run=cmd_text)
+
+    command = commands.add_parser("image", help="Show an image across the panels")
+    command.add_argument("file")
+    command.add_argument("--x", type=int, default=0, help="First image column shown")
+    command.add_argument("--y", type=int, default=0, help="First image row shown")
+    command.set_defaults(run=cmd_image)
+
+    command = commands.add_parser("scroll", help="Scroll text or an image")
+    command.add_argument("file", nargs="?", help="The image to scroll")
+    command.add_argument("--text", help="The text to scroll, instead of an image")
+    command.add_argument("--y", type=int, default=0, help="First image row shown")
+    command.add_argument(
+        "--speed",
+        type=float,
+        default=DEFAULT_SPEED,
+        help=f"Columns per second (default: {DEFAULT_SPEED})",
+    )
+    command.add_argument("--times", type=int, default=1, help="Times to scroll")
+    command.set_defaults(run=cmd_scroll)
+
+    command = commands.add_parser("frame", help="Show a raw 120- or 360-byte frame")
+    command.add_argument("hex", nargs="?", help="The frame as hex digits")
+    command.add_argument("--file", help="A file holding the frame bytes")
+    command.set_defaults(run=cmd_frame)
+
+    command = commands.add_parser("relay", help="Switch the power relay")
+    command.add_argument("state", choices=("on", "off"))
+    command.set_defaults(run=cmd_relay)
+
+    command = commands.add_parser("uart", help="Send data to the accessory UART")
+    command.add_argument("data", nargs="?", help="The data, as text")
+    command.add_argument("--hex", help="The data as hex digits")
+    command.add_argument("--file", help="A file holding the data")
+    command.add_argument("--panel", type=int, default=0, help="The panel's ID")
+    command.set_defaults(run=cmd_uart)
+
+    command = commands.add_parser("id", help="Show or set a panel's ID")
+    command.add_argument("--port", required=True, help="The panel's serial device")
+    command.add_argument("new_id", type=int, nargs="?", help="The ID to store")
+    command.set_defaults(run=cmd_id)
+
+    command = commands.add_parser("sleep", help="Wait, in a batch")
+    command.add_argument("seconds", type=float)
+    command.set_defaults(run=cmd_sleep)
+
+    if not batch:
+        command = commands.add_parser("batch", help="Run subcommands from a file")
+        command.add_argument("file", nargs="?", help="The file, or - for stdin")
+        command.set_defaults(run=cmd_batch)
+    return parser
+
+
+def main():
+    """Main function."""
+    args = build_parser().parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.WARNING)
+    session = Session(args.transport)
+    try:
+        args.run(session, args)
+    except (ValueError, OSError) as error:
+        sys.exit(f"hexactl: {error}")
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Images for the hexascroller display, decoded off the display thread.
+
+The service accepts images on the hexascroller/image MQTT topic, either as the raw
+bytes of a PNG, GIF or any other format Pillow reads, or as a JSON object:
+
+    {"data": "<base64 image>", "x": 0, "y": 0, "scroll": 0, "duration": 30}
+
+- x: the first image column shown, for images wider than the panel.
+- y: the first image row shown, for images taller than seven rows.
+- scroll: columns per second to scroll the image by, 0 to hold it still.
+- duration: seconds to show the image for. Defaults to the message duration.
+
+Every frame of an animated GIF is compiled and played with the GIF's frame timing.
+
+`ImageWorker` decodes and compiles payloads on its own thread and hands the result
+to a callback, so the display loop never waits for Pillow. Compiled images are kept
+in a small LRU cache keyed by a hash of the payload bytes and the row offset, so an
+image that is sent again, such as a doorbell icon, is shown without decoding it.
+`ImagePlayer` is the frame source that shows the current image.
+"""
+
+import base64
+import collections
+import hashlib
+import io
+import json
+import logging
+import queue
+import threading
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from PIL import Image, ImageSequence
+
+from led_panel import PANEL_WIDTH, Frame
+
+logger = logging.getLogger(__name__)
+
+CACHE_SIZE = 32
+DEFAULT_GIF_FRAME = 0.1
+
+
+class CompiledImage(NamedTuple):
+    """An image compiled to packed columns, one entry per animation frame."""
+
+    frames: List[bytes]
+    durations: List[float]
+
+
+class ImageRequest(NamedTuple):
+    """A decoded image payload and how to show it."""
+
+    data: bytes
+    x: int
+    y: int
+    scroll: float
+    duration: Optional[float]
+
+
+def parse_payload(payload: bytes) -> ImageRequest:
+    """
+    Split an image payload into the image bytes and display parameters.
+
+    Raises:
+        ValueError: If a JSON payload is malformed.
+    """
+    if not payload.lstrip().startswith(b"{"):
+        return ImageRequest(payload, 0, 0, 0.0, None)
+    try:
+        request: Dict[str, Any] = json.loads(payload)
+        data = base64.b64decode(request["data"], validate=True)
+    except (ValueError, KeyError, TypeError) as error:
+        raise ValueError(f"Bad image request: {error}") from error
+    x_pos, y_pos = request.get("x", 0), request.get("y", 0)
+    scroll, duration = request.get("scroll", 0), request.get("duration")
+    if not isinstance(x_pos, int) or not isinstance(y_pos, int) or y_pos < 0:
+        raise ValueError("'x' and 'y' must be integers, and 'y' not negative")
+    if not isinstance(scroll, (int, float)):
+        raise ValueError("'scroll' must be a number")
+    if duration is not None and (
+        not isinstance(duration, (int, float)) or duration <= 0
+    ):
+        raise ValueError("'duration' must be a positive number")
+    return ImageRequest(data, x_pos, y_pos, float(scroll), duration)
+
+
+def image_columns(img: Image.Image, y_pos: int = 0) -> bytes:
+    """
+    Compile an image to packed columns, one byte per column of the whole image.
+
+    Rows y_pos to y_pos + 6 are used, in the layout `led_panel.compile_image` makes.
+    """
+    return bytes(Frame.from_image(img.convert("1"), 0, y_pos, img.size[0]))
+
+
+def compile_payload(data: bytes, y_pos: int) -> CompiledImage:
+    """
+    Decode an image and compile each of its frames.
+
+    Raises:
+        OSError: If Pillow can't decode the image.
+    """
+    frames = []
+    durations = []
+    with Image.open(io.BytesIO(data)) as img:
+        for frame in ImageSequence.Iterator(img):
+            frames.append(image_columns(frame, y_pos))
+            durations.append(frame.info.get("duration", 0) / 1000 or DEFAULT_GIF_FRAME)
+    return CompiledImage(frames, durations)
+
+
+class ImageWorker(threading.Thread):
+    """Compiles image payloads in the background, with a cache of recent images."""
+
+    def __init__(
+        self,
+        on_ready: Callable[[CompiledImage, ImageRequest], None],
+        cache_size: int = CACHE_SIZE,
+    ) -> None:
+        """
+        Initialise the worker. Call `start` to run it.
+
+        Args:
+            on_ready (Callable): Called with each compiled image and its request,
+                from the worker thread, or from the submitting thread on a cache hit.
+            cache_size (int, optional): The number of compiled images kept.
+        """
+        threading.Thread.__init__(self, name="imageworker", daemon=True)
+        self.on_ready = on_ready
+        self.cache: "collections.OrderedDict[Tuple[bytes, int], CompiledImage]" = (
+            collections.OrderedDict()
+        )
+        self.cache_size = cache_size
+        self.lock = threading.Lock()
+        self.requests: (
+            "queue.Queue[Tuple[Tuple[bytes, int], ImageRequest, Callable]]"
+        ) = queue.Queue()
+        self.hits = 0
+        self.misses = 0
+
+    def submit(
+        self,
+        payload: bytes,
+        on_ready: Optional[Callable[[CompiledImage, ImageRequest], None]] = None,
+    ) -> None:
+        """
+        Queue an image payload for display, showing it at once if it is cached.
+
+        Args:
+            payload (bytes): The image payload, as parse_payload accepts.
+            on_ready (Callable, optional): Called with the compiled image instead of
+                the worker's callback, so several signs can share one cache.
+
+        Raises:
+            ValueError: If the payload is malformed.
+        """
+        request = parse_payload(payload)
+        on_ready = on_ready or self.on_ready
+        key = (hashlib.blake2b(request.data, digest_size=16).digest(), request.y)
+        with self.lock:
+            compiled = self.cache.get(key)
+            if compiled is not None:
+                self.cache.move_to_end(key)
+                self.hits += 1
+        if compiled is not None:
+            logger.debug("Image cache hit")
+            on_ready(compiled, request)
+        else:
+            self.requests.put((key, request, on_ready))
+
+    def run(self) -> None:
+        while True:
+            key, request, on_ready = self.requests.get()
+            try:
+                compiled = compile_payload(request.data, request.y)
+            except (OSError, ValueError, Image.DecompressionBombError) as error:
+                logger.warning("Could not decode image: %s", error)
+                continue
+            with self.lock:
+                self.misses += 1
+                self.cache[key] = compiled
+                if len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+            logger.info(
+                "Compiled %d-frame image, %d columns wide",
+                len(compiled.frames),
+                len(compiled.frames[0]),
+            )
+            on_ready(compiled, request)
+
+
+class ImagePlayer:
+    """The frame source showing the current image, scrolled and animated."""
+
+    def __init__(self) -> None:
+        """Initialise the player with no image."""
+        self.image: Optional[CompiledImage] = None
+        self.request: Optional[ImageRequest] = None
+        self.started = 0.0
+        self.until = 0.0
+        self.lock = threading.Lock()
+
+    def show(self, image: CompiledImage, request: ImageRequest, start: float) -> None:
+        """
+        Show an image from `start` for the request's duration.
+
+        Args:
+            image (CompiledImage): The compiled image.
+            request (ImageRequest): Where and how to show it, with a duration.
+            start (float): The current `time.monotonic()` value.
+        """
+        with self.lock:
+            self.image = image
+            self.request = request
+            self.started = start
+            self.until = start + (request.duration or 0.0)
+
+    def stop(self) -> None:
+        """Stop showing the image."""
+        with self.lock:
+            self.image = None
+
+    def poll(self, now: float) -> Optional[bytes]:
+        """
+        Return the frame that should be on the display at `now`.
+
+        Args:
+            now (float): The current `time.monotonic()` value.
+
+        Returns:
+            Optional[bytes]: The current frame, or None if no image is showing.
+        """
+        with self.lock:
+            image, request = self.image, self.request
+            if image is None or request is None:
+                return None
+            if now > self.until:
+                self.image = None
+                return None
+            elapsed = now - self.started
+        frames = image.frames
+        index = 0
+        if len(frames) > 1:
+            # Find the animation frame, looping over the total duration
+            remaining = elapsed % sum(image.durations)
+            while index < len(frames) - 1 and remaining >= image.durations[index]:
+                remaining -= image.durations[index]
+                index += 1
+        columns = frames[index]
+        start = request.x + int(elapsed * request.scroll)
+        if request.scroll:
+            start %= len(columns) + PANEL_WIDTH
+            # Scroll in from the right edge and out past the left
+            start -= PANEL_WIDTH
+        if start < 0:
+            window = (bytes(min(-start, PANEL_WIDTH)) + columns)[:PANEL_WIDTH]
+        else:
+            window = columns[start : start + PANEL_WIDTH]
+        return window.ljust(PANEL_WIDTH, b"\0")
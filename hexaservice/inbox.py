@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Coalescing and rate limiting for messages arriving faster than they can be shown.
+
+An automation that misfires can flood the message topic with hundreds of publishes
+a second. Showing each one restarts the message, measures it and builds a
+transition, on the MQTT thread, so the display thrashes and the frame loop stalls.
+
+`MessageInbox` sits between the MQTT thread and the display. The MQTT thread only
+offers messages, which is cheap; the display loop takes at most one per frame, and
+no more than `rate` a second. In the "latest" mode a message waiting to be shown is
+replaced by a newer one (merged); in the "queue" mode messages wait in order, up
+to `depth` of them, and further ones are dropped. A message identical to the one
+waiting, or to the one shown within the last `window` seconds, is ignored.
+
+The inbox counts messages received, applied, merged, dropped and ignored as
+duplicates, which the service logs with its frame interval report.
+"""
+
+import collections
+import threading
+from typing import Deque, Dict, Optional
+
+MODES = ("latest", "queue")
+DEFAULT_RATE = 2.0
+DEFAULT_DEPTH = 8
+
+
+class MessageInbox:
+    """Messages waiting to be shown, coalesced and rate limited."""
+
+    def __init__(
+        self,
+        mode: str = "latest",
+        rate: float = DEFAULT_RATE,
+        depth: int = DEFAULT_DEPTH,
+        window: float = 30.0,
+    ) -> None:
+        """
+        Initialise the inbox.
+
+        Args:
+            mode (str, optional): "latest" to keep only the newest waiting message,
+                or "queue" to keep them in order. Defaults to "latest".
+            rate (float, optional): Most messages shown per second, 0 for no limit.
+            depth (int, optional): Most messages waiting in the "queue" mode.
+            window (float, optional): Seconds after showing a message during which
+                the same message again is ignored.
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown message mode '{mode}'")
+        self.mode = mode
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.depth = depth
+        self.window = window
+        self.pending: Deque[str] = collections.deque()
+        self.shown: Optional[str] = None
+        self.shown_at = float("-inf")
+        self.next_take = 0.0
+        self.lock = threading.Lock()
+        self.counters: Dict[str, int] = dict.fromkeys(
+            ("received", "applied", "merged", "dropped", "duplicates"), 0
+        )
+
+    def offer(self, message: str, now: float) -> None:
+        """
+        Accept a message. Called from the MQTT thread.
+
+        Args:
+            message (str): The message.
+            now (float): The current `time.monotonic()` value.
+        """
+        counters = self.counters
+        with self.lock:
+            counters["received"] += 1
+            pending = self.pending
+            if (pending and pending[-1] == message) or (
+                not pending
+                and message == self.shown
+                and now - self.shown_at < self.window
+            ):
+                counters["duplicates"] += 1
+            elif self.mode == "latest" and pending:
+                pending[0] = message
+                counters["merged"] += 1
+            elif len(pending) >= self.depth:
+                counters["dropped"] += 1
+            else:
+                pending.append(message)
+
+    def take(self, now: float) -> Optional[str]:
+        """
+        Return the next message to show, if one is waiting and the rate allows it.
+        Called once per frame from the display loop.
+
+        Args:
+            now (float): The current `time.monotonic()` value.
+        """
+        if not self.pending or now < self.next_take:
+            return None
+        with self.lock:
+            if not self.pending:
+                return None
+            message = self.pending.popleft()
+            self.counters["applied"] += 1
+        self.shown = message
+        self.shown_at = now
+        self.next_take = now + self.interval
+        return message
+
+    def format(self) -> str:
+        """Format the counters for a log line."""
+        return " ".join(f"{name}={value}" for name, value in self.counters.items())
@@ -1,26 +1,337 @@
 #!/usr/bin/python3
+"""
+A local control socket for the hexascroller service.
+
+Clients connect over TCP to 127.0.0.1:HEXAPORT and send newline-delimited JSON.
+Each line is either a single command object, a JSON array of commands, or an
+object of the form `{"batch": [...]}`. A batch is validated in full before any of it
+is applied, and is then applied atomically under the service state lock, so the
+display never shows half of a batch. Every line gets exactly one JSON reply line,
+`{"ok": true}` or `{"ok": false, "error": "..."}`. If a request carries an `"id"`,
+the reply echoes it.
+
+Commands:
+
+- `{"cmd": "message", "text": "Hello"}`: show a text message. The text can contain
+  live fields such as `{time}` (see template.py).
+- `{"cmd": "field", "name": "temp", "value": "21.5"}`: set the value shown by
+  `{temp}` fields in messages.
+- `{"cmd": "image", "png": "<base64>", "x": 0, "y": 0, "duration": 10}`:
+  show an image (any format Pillow reads), cropped at x, y.
+- `{"cmd": "power", "on": true}`: switch the display on or off.
+- `{"cmd": "invert", "on": true}`: invert the display.
+- `{"cmd": "frame", "data": "<base64>", "duration": 10}`: show a precompiled
+  frame of 120 bytes (all panels) or 360 bytes (one 120-byte bitmap per panel).
+- `{"cmd": "stream", "fps": 30}`: switch the connection into streaming mode.
+
+In streaming mode every line is a frame, either `{"data": "<base64>"}` or just the
+base64 text, and `{"cmd": "end"}` leaves streaming mode. Frames go into a short
+queue that the display loop drains at the requested rate, and each reply carries
+pacing feedback: the queue depth, the number of frames dropped because the queue
+was full, and `wait`, the number of seconds the client should wait before pushing
+the next frame to keep the queue at its target depth.
+"""
+
+import base64
+import binascii
+import collections
+import io
+import json
+import logging
 import socket
 import threading
-import logging
+import time
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from led_panel import compile_image, PANEL_WIDTH
 
 HEXAPORT = 1214  # it's the Kazaa port! :)
+MAX_LINE = 1 << 20  # generous enough for a base64 image
+FRAME_SIZES = (PANEL_WIDTH, 3 * PANEL_WIDTH)
+
+logger = logging.getLogger(__name__)
+
+
+class CommandError(ValueError):
+    """Raised when a client sends a command that cannot be applied."""
+
+
+def decode_frame(data: str) -> bytes:
+    """
+    Decode a base64 precompiled frame and check its size.
+
+    Args:
+        data (str): Base64 of 120 or 360 column bytes.
+
+    Returns:
+        bytes: The decoded frame.
+    """
+    try:
+        frame = base64.b64decode(data, validate=True)
+    except (binascii.Error, TypeError) as error:
+        raise CommandError(f"Invalid base64 frame: {error}") from error
+    if len(frame) not in FRAME_SIZES:
+        raise CommandError(
+            f"Frame must be {PANEL_WIDTH} or {3 * PANEL_WIDTH} bytes, got {len(frame)}"
+        )
+    return frame
+
+
+def _flag(command: Dict[str, Any]) -> bool:
+    value = command.get("on")
+    if not isinstance(value, bool):
+        raise CommandError(f"'{command['cmd']}' needs a boolean 'on'")
+    return value
+
+
+def _duration(command: Dict[str, Any]) -> Optional[float]:
+    duration = command.get("duration")
+    if duration is not None and (
+        not isinstance(duration, (int, float)) or duration <= 0
+    ):
+        raise CommandError("'duration' must be a positive number")
+    return duration
+
+
+def parse_command(command: Any) -> Dict[str, Any]:
+    """
+    Validate one client command and convert it to the form the service applies.
+
+    Images are decoded and compiled here, on the connection's thread, so that the
+    display loop only ever sees precompiled frames.
+
+    Args:
+        command: A decoded JSON value.
+
+    Returns:
+        dict: The normalised command.
+    """
+    if not isinstance(command, dict) or not isinstance(command.get("cmd"), str):
+        raise CommandError("A command must be an object with a 'cmd' string")
+    name = command["cmd"]
+    if name == "message":
+        if not isinstance(command.get("text"), str):
+            raise CommandError("'message' needs a 'text' string")
+        return {"cmd": name, "text": command["text"]}
+    if name == "field":
+        if not isinstance(command.get("name"), str) or not isinstance(
+            command.get("value"), str
+        ):
+            raise CommandError("'field' needs 'name' and 'value' strings")
+        return {"cmd": name, "name": command["name"], "value": command["value"]}
+    if name in ("power", "invert"):
+        return {"cmd": name, "on": _flag(command)}
+    if name == "frame":
+        return {
+            "cmd": name,
+            "frame": decode_frame(command.get("data")),
+            "duration": _duration(command),
+        }
+    if name == "image":
+        try:
+            img = Image.open(io.BytesIO(base64.b64decode(command.get("png"))))
+            img = img.convert("1")
+        except (binascii.Error, TypeError, OSError) as error:
+            raise CommandError(f"Could not decode image: {error}") from error
+        x_pos, y_pos = command.get("x", 0), command.get("y", 0)
+        if not isinstance(x_pos, int) or not isinstance(y_pos, int):
+            raise CommandError("'x' and 'y' must be integers")
+        bitmap = compile_image(img, x_pos, y_pos)
+        bitmap = bitmap.ljust(PANEL_WIDTH, b"\0")
+        return {"cmd": "frame", "frame": bitmap, "duration": _duration(command)}
+    raise CommandError(f"Unknown command '{name}'")
+
+
+class FrameStream:
+    """
+    A short queue of streamed frames, drained by the display loop at a fixed rate.
+
+    The stream is active while frames keep arriving. Once the queue is empty and no
+    frame has been pushed for `timeout` seconds, `poll` returns None and the display
+    falls back to its other content.
+    """
+
+    def __init__(self, depth: int = 8, target: int = 2, timeout: float = 1.0):
+        """
+        Initialise the frame stream.
+
+        Args:
+            depth (int, optional): Maximum queued frames. The oldest frame is
+                dropped when a frame is pushed onto a full queue.
+            target (int, optional): Queue depth the pacing feedback aims for.
+            timeout (float, optional): Seconds without frames before the stream
+                hands control back.
+        """
+        self.frames: Deque[bytes] = collections.deque(maxlen=depth)
+        self.target = target
+        self.timeout = timeout
+        self.interval = 1.0 / 30
+        self.next_due = 0.0
+        self.last_push = 0.0
+        self.current: Optional[bytes] = None
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def set_rate(self, fps: float) -> None:
+        """Set the playout rate in frames per second."""
+        self.interval = 1.0 / fps
+
+    def push(self, frame: bytes) -> Dict[str, Any]:
+        """
+        Queue a frame for display.
+
+        Args:
+            frame (bytes): A 120- or 360-byte precompiled frame.
+
+        Returns:
+            dict: Pacing feedback for the client.
+        """
+        now = time.monotonic()
+        with self.lock:
+            if len(self.frames) == self.frames.maxlen:
+                self.dropped += 1
+            self.frames.append(frame)
+            self.last_push = now
+            queued = len(self.frames)
+            wait = (
+                max(0.0, self.next_due - now) + (queued - self.target) * self.interval
+            )
+            return {"queued": queued, "dropped": self.dropped, "wait": max(0.0, wait)}
+
+    def poll(self, now: float) -> Optional[bytes]:
+        """
+        Return the frame that should be on the display at `now`.
+
+        Args:
+            now (float): The current `time.monotonic()` value.
+
+        Returns:
+            Optional[bytes]: The current frame, or None if the stream is inactive.
+        """
+        with self.lock:
+            if self.frames and now >= self.next_due:
+                self.current = self.frames.popleft()
+                # Don't try to catch up on frames we were too slow to show
+                self.next_due = max(self.next_due + self.interval, now)
+            elif not self.frames and now - self.last_push > self.timeout:
+                self.current = None
+            return self.current
 
 
 class Listener(threading.Thread):
-    def __init__(self):
-        threading.Thread.__init__(self)
+    """Accepts local control connections and serves each from its own thread."""
+
+    def __init__(
+        self,
+        apply_commands: Callable[[List[Dict[str, Any]]], None],
+        stream: FrameStream,
+        port: int = HEXAPORT,
+    ):
+        """
+        Initialise the listener and bind the socket.
+
+        Args:
+            apply_commands: Called with a list of parsed commands, which it must
+                apply atomically.
+            stream (FrameStream): Where streamed frames are queued.
+            port (int, optional): The TCP port to listen on.
+        """
+        threading.Thread.__init__(self, name="jsonsock", daemon=True)
+        self.apply_commands = apply_commands
+        self.stream = stream
         self.sock = socket.socket(socket.AF_INET)
-        self.sock.bind(("127.0.0.1", HEXAPORT))
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", port))
         self.sock.listen(5)
 
     def run(self):
         while True:
-            (conn, addr) = self.sock.accept()
-            logging.info("Connection from {0}".format(addr))
-            # print(conn,addr)
+            conn, addr = self.sock.accept()
+            logger.info("Connection from %s", addr)
+            threading.Thread(
+                target=self.serve,
+                args=(conn, addr),
+                name=f"jsonsock-{addr[1]}",
+                daemon=True,
+            ).start()
+
+    def serve(self, conn: socket.socket, addr: Tuple[str, int]) -> None:
+        """Serve one client connection until it closes."""
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        streaming = False
+        with conn, conn.makefile("rb") as reader:
+            while True:
+                line = reader.readline(MAX_LINE)
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                if streaming:
+                    reply, streaming = self.handle_stream_line(line)
+                else:
+                    reply, streaming = self.handle_line(line)
+                try:
+                    conn.sendall(json.dumps(reply).encode() + b"\n")
+                except OSError:
+                    break
+        logger.info("Connection from %s closed", addr)
+
+    def handle_line(self, line: bytes) -> Tuple[Dict[str, Any], bool]:
+        """
+        Parse and apply one request line.
+
+        Returns:
+            Tuple[dict, bool]: The reply, and whether the connection is now streaming.
+        """
+        reply: Dict[str, Any] = {"ok": True}
+        try:
+            request = json.loads(line)
+            if isinstance(request, dict) and "id" in request:
+                reply["id"] = request["id"]
+            if isinstance(request, dict) and request.get("cmd") == "stream":
+                fps = request.get("fps", 30)
+                if not isinstance(fps, (int, float)) or not 0 < fps <= 100:
+                    raise CommandError("'fps' must be a number between 0 and 100")
+                self.stream.set_rate(fps)
+                return reply, True
+            if isinstance(request, dict) and "batch" in request:
+                request = request["batch"]
+            batch = request if isinstance(request, list) else [request]
+            self.apply_commands([parse_command(command) for command in batch])
+        except (ValueError, CommandError) as error:
+            reply.update(ok=False, error=str(error))
+        return reply, False
+
+    def handle_stream_line(self, line: bytes) -> Tuple[Dict[str, Any], bool]:
+        """
+        Queue one streamed frame.
+
+        Returns:
+            Tuple[dict, bool]: The reply, and whether the connection is still streaming.
+        """
+        line = line.strip()
+        try:
+            if line[:1] in (b"{", b'"'):
+                request = json.loads(line)
+            else:
+                request = line.decode("ascii")
+            if isinstance(request, dict):
+                if request.get("cmd") == "end":
+                    return {"ok": True}, False
+                request = request.get("data")
+            reply = self.stream.push(decode_frame(request))
+            reply["ok"] = True
+        except (ValueError, CommandError) as error:
+            reply = {"ok": False, "error": str(error)}
+        return reply, True
 
 
 if __name__ == "__main__":
-    logging.basicConfig(filename="hexa.log", level=logging.INFO)
-    l = Listener()
-    l.start()
+    logging.basicConfig(level=logging.INFO)
+    listener = Listener(
+        lambda commands: logger.info("Commands: %s", commands), FrameStream()
+    )
+    listener.start()
+    listener.join()
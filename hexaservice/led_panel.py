@@ -12,8 +12,11 @@ It provides the following functionality:
 The main components of this module are:
 
 - CommandCode: An enumeration of command codes used to interact with the LED panel.
+- Frame: A bitmap in the panels' column layout, with shifts, composites and
+  windows that work on the whole buffer at once.
 - compile_image: A function to compile an image into a byte sequence for the LED panel.
-- init_panel: A function to initialize the LED panel.
+- init_panel: A function to initialize the LED panel, over one of the byte
+  transports in the `transport` module.
 - shutdown_panel: A function to shut down the LED panel.
 - Panel: A class representing an LED panel. It provides methods to open/close a
   connection, send commands, and manipulate the content displayed on the panel
@@ -27,15 +30,24 @@ The Raspberry Pi is also connected to a 5V power supply via a micro USB cable.
 
 """
 
+import collections
 import glob
-import socket
 import struct
-import sys
 import logging
 from enum import Enum
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional, Union
 from PIL import Image
-import serial
+
+from capture import CaptureWriter, INCOMING, OUTGOING
+from frametrace import tracer
+from transport import (
+    NullTransport,
+    PtyTransport,
+    RawSerialTransport,
+    SerialTransport,
+    Transport,
+    UdpTransport,
+)
 
 
 # Constants
@@ -55,17 +67,281 @@ class CommandCode(Enum):
     WRITE_UART = 0xA5  # 165
     RELAY = 0xA6  # 166
     FLIP_BUFFERS = 0xB2
+    ECHO = 0xA7  # 167
     BITMAP_BACK_HALF_ONE = 0xB3
     BITMAP_BACK_HALF_TWO = 0xB4
 
 
+RSP_OK = 0
+RSP_ERROR = 1
+
+# Commands that change state each time they run, so a command that may have run
+# but whose ack was lost must not be sent again
+NOT_RETRYABLE = (CommandCode.FLIP_BUFFERS, CommandCode.WRITE_UART)
+
+# The firmware's response buffer holds a status, a length and six payload bytes, so
+# a longer length means the stream is out of step
+MAX_RESPONSE_PAYLOAD = 6
+
+# Bytes of stale input read while looking for a resync marker before giving up
+RESYNC_LIMIT = 256
+
+
 PANEL_HEIGHT = 7
 PANEL_WIDTH = 120
+PANEL_COUNT = 3
+
+# The most data one WRITE_UART command carries, the firmware's command payload size
+UART_MAX_PAYLOAD = 120
+
+# Debug panels send to consecutive UDP ports, starting with panel 0 on this one
+DEBUG_PORT = 9990
+
+# The transports init_panel can use; "udp" sends to debug.py
+TRANSPORTS = ("serial", "raw", "udp", "pty", "null")
 
 # Configuring logging
 logger = logging.getLogger(__name__)
 
 
+# Row r of a column is bit (7 - r); bit 0 is not shown
+COLUMN_BITS = 0xFE
+
+
+def _column_mask(pattern: int, width: int) -> int:
+    """Return a whole-buffer integer mask with `pattern` in every column byte."""
+    return int.from_bytes(bytes([pattern]) * width, "big")
+
+
+class Frame:
+    """
+    A bitmap in the panels' column layout: one byte per column, row r in bit 7 - r.
+
+    Frames can be wider than a panel, to hold a ticker or a wide image to window
+    into. Shifts and composites work on the whole buffer as one Python integer, so
+    they cost a few big-integer operations rather than a loop over columns or a trip
+    through PIL. Operators return new frames; `blit` and `window` are the ways to
+    copy columns in and out.
+
+    Tall images are handled as a list of seven-row bands (see `bands_from_image`),
+    and `scroll_bands` shifts two neighbouring bands together to show any row range.
+    """
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: Optional[bytes] = None, width: int = PANEL_WIDTH) -> None:
+        """Initialise the frame.
+
+        :param data: The column bytes to copy. Defaults to a blank frame.
+        :param width: The width of a blank frame, if no data is given.
+        """
+        self.data = bytearray(data) if data is not None else bytearray(width)
+
+    @classmethod
+    def from_image(
+        cls,
+        img: Image.Image,
+        x_pos: int = 0,
+        y_pos: int = 0,
+        width: Optional[int] = None,
+    ) -> "Frame":
+        """Compile seven rows of an image, starting at x_pos, y_pos.
+
+        Pixels are lit if they are non-zero. "1", "L" and "P" images are compiled
+        with one crop and transpose in PIL; other modes fall back to reading pixels.
+
+        :param img: The image to compile.
+        :param x_pos: The first image column.
+        :param y_pos: The first image row.
+        :param width: The number of columns. Defaults to the rest of the image, up
+            to the panel width.
+        :return: The compiled frame.
+        """
+        if width is None:
+            width = min(img.size[0] - x_pos, PANEL_WIDTH)
+        width = max(width, 0)
+        if img.mode not in ("1", "L", "P"):
+            frame = cls(width=width)
+            height = min(PANEL_HEIGHT, img.size[1] - y_pos)
+            for column in range(width):
+                raw_bitmap = 0
+                for row in range(height):
+                    if img.getpixel((column + x_pos, row + y_pos)):
+                        raw_bitmap |= 1 << (PANEL_HEIGHT - row)
+                frame.data[column] = raw_bitmap
+            return frame
+        rows = img.crop((x_pos, y_pos, x_pos + width, y_pos + PANEL_HEIGHT))
+        if rows.mode != "1":
+            # Light any non-zero pixel value or palette index, as getpixel would
+            rows = Image.frombytes("L", rows.size, rows.tobytes()).point(
+                lambda value: 255 if value else 0, "1"
+            )
+        # Eight rows, the last blank, so each transposed row packs into one byte
+        tall = Image.new("1", (width, PANEL_HEIGHT + 1))
+        tall.paste(rows, (0, 0))
+        return cls(tall.transpose(Image.Transpose.TRANSPOSE).tobytes())
+
+    @classmethod
+    def bands_from_image(cls, img: Image.Image) -> List["Frame"]:
+        """Compile a whole image as seven-row bands, top to bottom, for scroll_bands.
+
+        :param img: The image to compile.
+        :return: One full-width frame per seven rows, plus a blank band at the end.
+        """
+        width = img.size[0]
+        bands = [
+            cls.from_image(img, 0, y_pos, width)
+            for y_pos in range(0, img.size[1], PANEL_HEIGHT)
+        ]
+        bands.append(cls(width=width))
+        return bands
+
+    @staticmethod
+    def scroll_bands(bands: List["Frame"], y_pos: int) -> "Frame":
+        """Show seven rows of a banded image, starting at row y_pos.
+
+        :param bands: The image's bands, from bands_from_image.
+        :param y_pos: The first row to show.
+        :return: The frame showing rows y_pos to y_pos + 6.
+        """
+        band, row = divmod(y_pos, PANEL_HEIGHT)
+        upper = bands[min(band, len(bands) - 1)]
+        if row == 0:
+            return Frame(upper.data)
+        lower = bands[min(band + 1, len(bands) - 1)]
+        return upper.shift_y(-row) | lower.shift_y(PANEL_HEIGHT - row)
+
+    def to_image(self) -> Image.Image:
+        """Convert the frame to a 1-bit image, PANEL_HEIGHT rows high."""
+        if not self.data:
+            return Image.new("1", (0, PANEL_HEIGHT))
+        img = Image.frombytes("1", (8, len(self.data)), bytes(self.data))
+        img = img.transpose(Image.Transpose.TRANSPOSE)
+        return img.crop((0, 0, len(self.data), PANEL_HEIGHT))
+
+    @property
+    def width(self) -> int:
+        """The number of columns in the frame."""
+        return len(self.data)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __bytes__(self) -> bytes:
+        return bytes(self.data)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Frame):
+            return self.data == other.data
+        if isinstance(other, (bytes, bytearray)):
+            return self.data == other
+        return NotImplemented
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f"Frame({bytes(self.data)!r})"
+
+    def _int(self) -> int:
+        return int.from_bytes(self.data, "big")
+
+    def _from_int(self, value: int) -> "Frame":
+        return Frame(value.to_bytes(len(self.data), "big"))
+
+    def _operand(self, other: "Frame") -> int:
+        if len(other.data) != len(self.data):
+            raise ValueError(
+                f"Frames must be the same width, got {len(self.data)} and "
+                f"{len(other.data)}"
+            )
+        return int.from_bytes(other.data, "big")
+
+    def __or__(self, other: "Frame") -> "Frame":
+        return self._from_int(self._int() | self._operand(other))
+
+    def __and__(self, other: "Frame") -> "Frame":
+        return self._from_int(self._int() & self._operand(other))
+
+    def __xor__(self, other: "Frame") -> "Frame":
+        return self._from_int(self._int() ^ self._operand(other))
+
+    def __invert__(self) -> "Frame":
+        """Invert every bit, including the unshown bit 0, as the invert effect does."""
+        return Frame(self.data.translate(INVERT_TABLE))
+
+    def mask(self, mask: "Frame") -> "Frame":
+        """Clear the pixels that are not lit in `mask`.
+
+        :param mask: A frame of the same width; its lit pixels are kept.
+        :return: The masked frame.
+        """
+        return self & mask
+
+    def shift_x(self, columns: int) -> "Frame":
+        """Shift the frame right by `columns` (left if negative), filling with blank.
+
+        :param columns: The number of columns to shift by.
+        :return: The shifted frame, the same width.
+        """
+        width = len(self.data)
+        if columns >= 0:
+            return Frame(
+                bytes(min(columns, width)) + self.data[: max(width - columns, 0)]
+            )
+        return Frame(self.data[-columns:] + bytes(min(-columns, width)))
+
+    def shift_y(self, rows: int) -> "Frame":
+        """Shift the frame down by `rows` (up if negative), filling with blank.
+
+        Every column moves at once: the buffer is shifted as one integer, and a
+        per-column mask drops the bits that crossed into a neighbouring column.
+
+        :param rows: The number of rows to shift by.
+        :return: The shifted frame.
+        """
+        width = len(self.data)
+        if rows == 0:
+            return Frame(self.data)
+        if abs(rows) >= PANEL_HEIGHT:
+            return Frame(width=width)
+        value = self._int()
+        if rows > 0:
+            value >>= rows
+            keep = (COLUMN_BITS >> rows) & COLUMN_BITS
+        else:
+            value <<= -rows
+            keep = (COLUMN_BITS << -rows) & COLUMN_BITS
+        return self._from_int(value & _column_mask(keep, width))
+
+    def window(self, x_pos: int, width: int = PANEL_WIDTH) -> "Frame":
+        """Cut `width` columns out of the frame from x_pos, blank beyond its edges.
+
+        :param x_pos: The first column; negative to start left of the frame.
+        :param width: The width of the window.
+        :return: The window.
+        """
+        if x_pos < 0:
+            data = bytes(min(-x_pos, width)) + self.data[: max(width + x_pos, 0)]
+        else:
+            data = self.data[x_pos : x_pos + width]
+        return Frame(bytes(data).ljust(width, b"\0"))
+
+    def blit(self, source: "Frame", x_pos: int) -> None:
+        """Copy a frame's columns into this one at x_pos, clipped to this frame.
+
+        :param source: The frame to copy.
+        :param x_pos: The column to copy it to.
+        """
+        start = max(x_pos, 0)
+        end = min(x_pos + len(source.data), len(self.data))
+        if start < end:
+            self.data[start:end] = source.data[start - x_pos : end - x_pos]
+
+
+# Inverts every bit of a column byte
+INVERT_TABLE = bytes(~value & 0xFF for value in range(256))
+
+
 def compile_image(img: Image.Image, x_pos: int = 0, y_pos: int = 0) -> bytes:
     """Compile the given image into a byte sequence for the LED panel.
 
@@ -77,51 +353,87 @@ def compile_image(img: Image.Image, x_pos: int = 0, y_pos: int = 0) -> bytes:
     Returns:
         bytes: The compiled bitmap sequence representing the image.
     """
-    bitmap = b""
-    width = min(img.size[0] - x_pos, PANEL_WIDTH)
-    height = min(PANEL_HEIGHT, img.size[1] - y_pos)
+    return bytes(Frame.from_image(img, x_pos, y_pos))
 
-    for column in range(width):
-        raw_bitmap = 0
-        for row in range(height):  # vertical scanning? jerk
-            if img.getpixel((column + x_pos, row + y_pos)):
-                raw_bitmap |= 1 << (PANEL_HEIGHT - row)
-        bitmap = bitmap + struct.pack("B", raw_bitmap)
-    return bitmap
 
-
-def init_panel(debug_host: Optional[str] = None) -> bool:
-    """Initialize the LED panel.
+def discover_panels(
+    panel_ids: Iterable[int],
+    debug_host: Optional[str] = None,
+    transport: str = "serial",
+) -> Dict[int, "Panel"]:
+    """Open the panels with the given IDs.
 
     Args:
+        panel_ids (Iterable[int]): The IDs of the panels wanted, such as those of all
+            the signs the service drives.
         debug_host (str, optional): Host to send debug messages to. Defaults to None.
+            Implies the "udp" transport.
+        transport (str, optional): One of TRANSPORTS. "serial" and "raw" open the
+            /dev/ttyACM* devices, through pyserial or a raw file descriptor, and keep
+            those that answer with a wanted ID; "pty" and "null" stand in for the
+            hardware. Defaults to "serial".
 
     Returns:
-        bool: True if the panel is successfully initialized, False otherwise.
+        Dict[int, Panel]: The panels found, by ID. Wanted panels that weren't found
+        are missing.
     """
-    # pylint: disable=no-else-return
-    logger.debug("Initializing panel")
-    if debug_host:
+    wanted = set(panel_ids)
+    found: Dict[int, "Panel"] = {}
+    logger.debug("Initializing panels %s over %s", sorted(wanted), transport)
+    if debug_host or transport == "udp":
+        debug_host = debug_host or "localhost"
         logger.debug("Debug host is %s", debug_host)
         logging.basicConfig(level=logging.DEBUG)
-        panel = Panel(debug_host)
-        panel.open("debug")
-        panels[0] = panel
-        del panels[2]
-        del panels[1]
-        return True
+        for panel_id in sorted(wanted):
+            panel = Panel(UdpTransport(debug_host, DEBUG_PORT + panel_id), panel_id)
+            panel.open()
+            found[panel_id] = panel
+    elif transport in ("pty", "null"):
+        for panel_id in sorted(wanted):
+            if transport == "pty":
+                link: Transport = PtyTransport(panel_id)
+            else:
+                link = NullTransport(panel_id)
+            panel = Panel(link)
+            panel.open()
+            found[panel.get_id()] = panel
     else:
+        link_class = RawSerialTransport if transport == "raw" else SerialTransport
         for candidate in glob.glob("/dev/ttyACM*"):
-            panel = Panel()
+            panel = Panel(link_class(candidate))
             try:
                 logger.info("Opening candidate %s", candidate)
-                panel.open(candidate)
-                panels[panel.get_id()] = panel
-                logger.info("Candidate %s succeeded", candidate)
+                panel.open()
+                panel_id = panel.get_id()
             except Exception as exception:
                 logger.info("Candidate %s failed, got %s", candidate, exception)
                 panel.close()
-        return all(panel is not None for panel in panels)
+                continue
+            if panel_id in wanted:
+                found[panel_id] = panel
+                logger.info("Candidate %s succeeded as panel %d", candidate, panel_id)
+            else:
+                logger.info("Candidate %s is panel %d, not wanted", candidate, panel_id)
+                panel.close()
+    return found
+
+
+def init_panel(debug_host: Optional[str] = None, transport: str = "serial") -> bool:
+    """Initialize the LED panel.
+
+    Args:
+        debug_host (str, optional): Host to send debug messages to. Defaults to None.
+            Implies the "udp" transport.
+        transport (str, optional): One of TRANSPORTS, as for discover_panels.
+            Defaults to "serial".
+
+    Returns:
+        bool: True if the panel is successfully initialized, False otherwise.
+    """
+    found = discover_panels(range(PANEL_COUNT), debug_host, transport)
+    for panel_id, panel in found.items():
+        panels[panel_id] = panel
+    return len(found) == PANEL_COUNT
 
 
 def shutdown_panel():
@@ -138,46 +450,82 @@ class Panel:
     relay on or off. Hexascroller has 3 panels, so there are 3 instances of this class.
     """
 
-    def __init__(self, debug_host: Optional[str] = None) -> None:
-        """Initialize the Panel object."""
-        self.debug_host = debug_host
-        logger.info("Debug host is %s", debug_host)
-        if debug_host:
-            self.id = 0  # pylint: disable=invalid-name
-            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            self.port = 9990
-        else:
-            self.serial_port = serial.Serial()
-            self.id = -1
-
-    def open(self, port_name: str, baud: int = 57600) -> None:
-        """Open a connection to the LED panel.
+    def __init__(
+        self, transport: Optional[Transport] = None, panel_id: int = -1
+    ) -> None:
+        """Initialize the Panel object.
 
-        Args:
-            port_name (str): The port name to use for the connection.
-            baud (int, optional): The baud rate for the serial connection.
-                                  Defaults to 57600.
+        :param transport: The byte transport to the panel. Panels made without one are
+            placeholders until init_panel replaces them.
+        :param panel_id: The panel's ID, if known without asking it. Transports
+            without acks can't answer GET_ID, so they need it.
         """
-        if port_name == "debug":
+        self.transport = transport
+        self.capture: Optional[CaptureWriter] = None
+        self.id = panel_id  # pylint: disable=invalid-name
+        # Attempts after the first for commands that fail or time out
+        self.retries = 1
+        # Whether the firmware answers ECHO; older firmware rejects it instead
+        self.echo = False
+        self.sequence = 0
+        # Link problems: timeouts, malformed and error responses, resyncs, retries
+        # and dropped commands
+        self.errors: Dict[str, int] = collections.Counter()
+
+    def open(self) -> None:
+        """Open the connection to the LED panel, and align with its responses."""
+        logger.info("Opening panel transport %s", self.transport.name)
+        self.transport.open()
+        if self.transport.acks:
+            self.transport.reset_input()
+            self.sync()
             logger.info(
-                "Will use UDP socket to debug_host %s : %d", self.debug_host, self.port
+                "Panel on %s %s sequence-checked echo",
+                self.transport.name,
+                "supports" if self.echo else "does not support",
             )
 
-        else:
-            self.serial_port = serial.Serial(port_name, baud, timeout=0.5)
-            try:
-                self.serial_port.open()
-            except serial.serialutil.SerialException as serial_exception:
-                logger.warning(
-                    "Serial port autoopened, probably ok. %s", serial_exception
-                )
-            except serial.SerialException as serial_exception:
-                logger.error(
-                    "Could not open serial port %s: %s",
-                    port_name,
-                    serial_exception,
-                )
-                sys.exit(1)
+    def sync(self) -> bool:
+        """
+        Send an ECHO and discard input up to its response, re-aligning with the panel.
+
+        Firmware that supports ECHO returns the sequence number sent with it, so a
+        stale response can't be mistaken for it. Older firmware rejects ECHO with
+        a predictable error response, which still marks where the stream is. The
+        response also tells which kind of firmware the panel runs.
+
+        :return: True if the response was found.
+        """
+        self.sequence = (self.sequence + 1) & 0xFF
+        token = bytes([self.sequence])
+        code = CommandCode.ECHO.value
+        echoed = bytes([RSP_OK, 1]) + token
+        rejected = bytes([RSP_ERROR, 1, code])
+        self.transport.send(bytes([code, 1]), token)
+        data = b""
+        while len(data) < RESYNC_LIMIT:
+            chunk = self.transport.recv(1)
+            if not chunk:
+                return False
+            data += chunk
+            if data.endswith(echoed):
+                self.echo = True
+                return True
+            if data.endswith(rejected):
+                self.echo = False
+                return True
+        return False
+
+    def resync(self) -> None:
+        """Drop any input left over from a bad response and re-align with the panel."""
+        self.errors["resyncs"] += 1
+        self.transport.reset_input()
+        # The panel may still be waiting for the rest of a garbled command, and
+        # swallow the first ECHO as payload; it gives up on that and answers the next
+        for _ in range(2):
+            if self.sync():
+                return
+        logger.warning("Could not resync with panel %s", self.id)
 
     def command(self, command: CommandCode, payload: bytes, expected: int) -> bytes:
         """
@@ -185,56 +533,66 @@ class Panel:
 
         :param command: The command code to be sent.
         :param payload: The payload data associated with the command.
-        :param expected: The value expected in the response.
-        :return: The response payload as bytes.
+        :param expected: The value expected in the response, for error messages.
+        :return: The response payload as bytes, or b"" if the command failed.
+
+        A timeout or malformed response is followed by a resync, so leftover bytes
+        can't be read as the acks of later commands, and the command is retried up
+        to `retries` times unless running it twice would be wrong. Problems are
+        counted in `errors`.
         """
         payload_length = len(payload)
         logger.debug(
             "Sending command %s, payload length %i", command.value, payload_length
         )
-        packet = struct.pack("BB", command.value, payload_length)
-        if payload_length > 0:
-            packet = packet + payload
-        logger.debug(
-            "Sending UDP packet to %s: %s",
-            self.debug_host,
-            "".join("{:02x}".format(x) for x in packet),
-        )
-        if self.debug_host:
-            self.sock.sendto(packet, (self.debug_host, self.port))
-            return b""
-        logger.debug(
-            "Sending serial packet to %s: %s",
-            self.serial_port.name,
-            ("".join("{:02x}".format(x) for x in packet)),
-        )
-        self.serial_port.write(packet)
-        self.serial_port.flush()
-        rsp = self.serial_port.read(2)
-        if len(rsp) < 2 or rsp[0] != 0:
-            if len(rsp) == 2:
-                epl = rsp[1]
-                if epl > 0:
-                    rsp = rsp + self.serial_port.read(epl)
-            if rsp[0] != expected:
+        header = struct.pack("BB", command.value, payload_length)
+        transport = self.transport
+        attempts = 1 if command in NOT_RETRYABLE else 1 + self.retries
+        for attempt in range(attempts):
+            if attempt:
+                self.errors["retries"] += 1
+            if self.capture:
+                self.capture.record(self.id, OUTGOING, header + payload)
+            transport.send(header, payload)
+            if not transport.acks:
+                return b""
+            with tracer.span("ack", panel=self.id, command=command.value):
+                rsp = transport.recv(2)
+            if len(rsp) == 2 and rsp[1] <= MAX_RESPONSE_PAYLOAD:
+                rsp += transport.recv(rsp[1])
+            if self.capture:
+                self.capture.record(self.id, INCOMING, rsp)
+            if len(rsp) >= 2 and len(rsp) == 2 + rsp[1]:
+                if rsp[0] == RSP_OK:
+                    return rsp[2:]
+                self.errors["errors"] += 1
                 logger.error(
                     "Error on panel %s, command %s. Expected %s but got response: %s",
                     self.id,
                     command.value,
                     expected,
-                    rsp[0],
+                    rsp.hex(),
+                )
+                if rsp[0] == RSP_ERROR and rsp[2:] == header[:1]:
+                    # A well-formed rejection of this command; the link is aligned
+                    continue
+            else:
+                oversized = len(rsp) == 2 and rsp[1] > MAX_RESPONSE_PAYLOAD
+                self.errors["malformed" if oversized else "timeouts"] += 1
+                logger.warning(
+                    "Panel %s: incomplete response %s to command %s",
+                    self.id,
+                    rsp.hex(),
+                    command.value,
                 )
-            return b""
-        payload_length = rsp[1]
-        response_payload = self.serial_port.read(payload_length)
-        return response_payload
+            self.resync()
+        self.errors["dropped"] += 1
+        return b""
 
     def close(self):
         """Close the connection to the LED panel."""
-        if self.debug_host:
-            return
-        else:
-            self.serial_port.close()
+        if self.transport:
+            self.transport.close()
 
     # pylint: disable=invalid-name
     def set_relay(self, on: bool) -> None:
@@ -250,6 +608,26 @@ class Panel:
             logger.info("Relay on panel %s off", self.id)
             self.command(CommandCode.RELAY, struct.pack("B", 0), 0)
 
+    def write_uart(self, data: Union[bytes, bytearray, memoryview]) -> bool:
+        """
+        Write data to the panel's accessory UART, in one command.
+
+        The firmware blocks until the data fits in its UART transmit buffer, so
+        longer data should go through `accessory.AccessoryStream`, which paces it.
+        WRITE_UART is never retried, so data that wasn't acked is lost.
+
+        :param data: Up to UART_MAX_PAYLOAD bytes.
+        :return: True if the panel acked the data, or the transport has no acks.
+        """
+        if len(data) > UART_MAX_PAYLOAD:
+            raise ValueError(
+                f"UART data must be at most {UART_MAX_PAYLOAD} bytes, not {len(data)}"
+            )
+        # An OK ack has no payload, so success shows as no new dropped command
+        dropped = self.errors["dropped"]
+        self.command(CommandCode.WRITE_UART, bytes(data), 0)
+        return self.errors["dropped"] == dropped
+
     def set_message(self, message: str, x_pos: int = 0, y_pos: int = 0) -> None:
         """
         Set a text message to be displayed on the LED panel, using the built-in font.
@@ -286,24 +664,50 @@ class Panel:
 
         self.command(CommandCode.BITMAP, compile_image(img, x_pos, y_pos), 0)
 
-    def set_compiled_image(self, bitmap: bytes) -> None:
+    def set_compiled_image(self, bitmap: Union[bytes, bytearray, memoryview]) -> None:
         """
         Set a precompiled image bitmap to be displayed on the LED panel.
 
-        :param bitmap: The precompiled image bitmap.
+        :param bitmap: The precompiled image bitmap, as bytes or any bytes-like
+            object, such as a memoryview of a larger frame.
         """
-        if not isinstance(bitmap, bytes):
+        if not isinstance(bitmap, (bytes, bytearray, memoryview)):
             raise ValueError(
-                f"Bitmap must be a bytes object. instead got: {type(bitmap)}"
+                f"Bitmap must be a bytes-like object. instead got: {type(bitmap)}"
             )
         if len(bitmap) != PANEL_WIDTH:
             raise ValueError(
                 f"Bitmap length must be equal to number of panel width ({PANEL_WIDTH} bytes). Instead got {len(bitmap)} bytes."
             )
 
+        self.load_compiled_image(bitmap)
+        self.flip()
+
+    def load_compiled_image(self, bitmap: Union[bytes, bytearray, memoryview]) -> None:
+        """
+        Load a precompiled image bitmap into the back buffer, without showing it.
+
+        :param bitmap: The precompiled image bitmap, PANEL_WIDTH bytes long.
+        """
         self.command(CommandCode.BITMAP_BACK_HALF_ONE, bitmap[: PANEL_WIDTH // 2], 0)
         self.command(CommandCode.BITMAP_BACK_HALF_TWO, bitmap[PANEL_WIDTH // 2 :], 0)
-        self.command(CommandCode.FLIP_BUFFERS, b"", 0)
+
+    def flip(self) -> None:
+        """Show the back buffer, swapping it with the front buffer."""
+        with tracer.span("flip", panel=self.id):
+            self.command(CommandCode.FLIP_BUFFERS, b"", 0)
+
+    def set_id(self, panel_id: int) -> None:
+        """
+        Store a new ID in the panel's EEPROM.
+
+        :param panel_id: The new ID, 0 to 255.
+        """
+        if not 0 <= panel_id <= 255:
+            raise ValueError(f"Panel ID must be 0 to 255, not {panel_id}")
+        self.command(CommandCode.SET_ID, struct.pack("B", panel_id), 0)
+        self.id = panel_id
+        logger.info("Set panel ID to %d", panel_id)
 
     def get_id(self) -> int:
         """
@@ -311,13 +715,15 @@ class Panel:
 
         :return: The ID of the LED panel as an integer.
         """
-        if self.debug_host:
-            return 0
+        if not self.transport.acks:
+            return self.id
 
         id_value = self.command(CommandCode.GET_ID, b"", 1)
+        if not id_value:
+            raise IOError(f"Panel on {self.transport.name} did not report its ID")
         self.id = int(id_value[0])
         logger.info("ID'd panel %d", self.id)
         return self.id
 
 
-panels: List[Panel] = [Panel()] * 3
+panels: List[Panel] = [Panel()] * PANEL_COUNT
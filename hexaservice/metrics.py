@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Small timing statistics for the hexascroller service and its tools.
+
+`IntervalStats` records the time between successive ticks of a loop, such as the
+frame loop in `service.py`, into a fixed-size window and summarises it as
+percentiles. Ticking costs one `time.perf_counter` call and one `deque.append`.
+
+Example usage:
+
+```python
+from metrics import IntervalStats
+
+intervals = IntervalStats()
+while running:
+    intervals.tick()
+    ...
+print(intervals.format())  # "n=1000 p50=10.1ms p99=12.3ms max=25.0ms"
+```
+"""
+
+import collections
+import time
+from typing import Deque, Dict, Optional, Sequence
+
+DEFAULT_WINDOW = 10000
+
+
+def percentile(ordered: Sequence[float], fraction: float) -> float:
+    """
+    Return a percentile of already-sorted samples, by the nearest-rank method.
+
+    Args:
+        ordered (Sequence[float]): The samples, in ascending order.
+        fraction (float): The percentile as a fraction, e.g. 0.99.
+
+    Returns:
+        float: The sample at that rank, or 0.0 if there are no samples.
+    """
+    if not ordered:
+        return 0.0
+    rank = min(len(ordered) - 1, max(0, int(fraction * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+class IntervalStats:
+    """The intervals between successive calls to `tick`, in seconds."""
+
+    def __init__(self, window: int = DEFAULT_WINDOW) -> None:
+        """
+        Initialise the statistics.
+
+        Args:
+            window (int, optional): The number of most recent intervals kept.
+        """
+        self.intervals: Deque[float] = collections.deque(maxlen=window)
+        self.last: Optional[float] = None
+
+    def tick(self, now: Optional[float] = None) -> None:
+        """Record the interval since the previous tick, if there was one."""
+        if now is None:
+            now = time.perf_counter()
+        if self.last is not None:
+            self.intervals.append(now - self.last)
+        self.last = now
+
+    def add(self, interval: float) -> None:
+        """Record an interval measured elsewhere."""
+        self.intervals.append(interval)
+
+    def pause(self) -> None:
+        """Forget the previous tick, so a deliberate gap isn't counted."""
+        self.last = None
+
+    def reset(self) -> None:
+        """Discard all recorded intervals."""
+        self.intervals.clear()
+        self.last = None
+
+    def summary(self) -> Dict[str, float]:
+        """
+        Summarise the recorded intervals.
+
+        Returns:
+            Dict[str, float]: The sample count "n" and the "p50", "p99" and "max"
+            intervals in seconds.
+        """
+        ordered = sorted(self.intervals)
+        return {
+            "n": len(ordered),
+            "p50": percentile(ordered, 0.50),
+            "p99": percentile(ordered, 0.99),
+            "max": ordered[-1] if ordered else 0.0,
+        }
+
+    def format(self) -> str:
+        """Return the summary as a line of text, with intervals in milliseconds."""
+        summary = self.summary()
+        return (
+            f"n={summary['n']} p50={summary['p50'] * 1000:.1f}ms"
+            f" p99={summary['p99'] * 1000:.1f}ms max={summary['max'] * 1000:.1f}ms"
+        )
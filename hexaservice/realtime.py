@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Real-time scheduling and garbage collector pacing for the frame loop.
+
+Scroll jitter on the Pi Zero comes from two places: the MQTT and socket threads
+competing with the frame loop for the single core, and Python's cyclic garbage
+collector pausing whichever thread happens to allocate when a generation fills up.
+
+- `set_realtime` moves the calling thread to the SCHED_FIFO policy and optionally
+  pins it to a set of CPUs. Threads started afterwards inherit both, so the service
+  calls it after starting its other threads. It needs CAP_SYS_NICE, which the Home
+  Assistant add-on grants with `realtime: true`; without it a warning is logged and
+  the service carries on under the normal scheduler. Background work started from
+  the frame loop, such as a trace dump, calls `set_normal` to leave it.
+- `GcPacer` freezes everything allocated during startup out of the collector's
+  reach and turns off automatic collection. The frame loop then calls `idle()` in
+  the slack after each frame, which collects the young generation once it has
+  grown, and does a full collection at a fixed interval.
+- `FramePacer` spaces frames: by a fixed pause after each one, as the service
+  always did, or, given the frame interval from a link profile (see
+  calibrate.py), by starting each frame one interval after the last.
+"""
+
+import gc
+import logging
+import os
+import time
+from typing import Optional, Set
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PRIORITY = 10
+
+
+def parse_cpus(spec: str) -> Set[int]:
+    """
+    Parse a CPU list such as "0", "2,3" or "0-1,3".
+
+    Args:
+        spec (str): The CPU list, in the format used by taskset.
+
+    Returns:
+        Set[int]: The CPU numbers.
+    """
+    cpus: Set[int] = set()
+    for part in spec.split(","):
+        first, _, last = part.strip().partition("-")
+        cpus.update(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def set_realtime(
+    priority: int = DEFAULT_PRIORITY, cpus: Optional[Set[int]] = None
+) -> bool:
+    """
+    Run the calling thread under SCHED_FIFO, optionally pinned to some CPUs.
+
+    Args:
+        priority (int, optional): The SCHED_FIFO priority, 1 to 99. Defaults to 10.
+        cpus (Set[int], optional): The CPUs to run on. Defaults to all of them.
+
+    Returns:
+        bool: True if the real-time policy was applied.
+    """
+    if cpus:
+        try:
+            os.sched_setaffinity(0, cpus)
+            logger.info("Pinned frame loop to CPUs %s", sorted(cpus))
+        except (OSError, AttributeError) as error:
+            logger.warning("Could not set CPU affinity %s: %s", sorted(cpus), error)
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+    except (OSError, AttributeError) as error:
+        logger.warning("Could not switch to SCHED_FIFO %d: %s", priority, error)
+        return False
+    logger.info("Frame loop running under SCHED_FIFO priority %d", priority)
+    return True
+
+
+def set_normal() -> None:
+    """
+    Run the calling thread under the normal scheduler, for background threads
+    that inherited SCHED_FIFO from the frame loop and must not compete with it.
+    """
+    try:
+        os.sched_setscheduler(0, os.SCHED_OTHER, os.sched_param(0))
+    except (OSError, AttributeError) as error:
+        logger.debug("Could not switch to SCHED_OTHER: %s", error)
+
+
+class GcPacer:
+    """Runs garbage collection in the frame loop's idle time instead of mid-frame."""
+
+    def __init__(self, young_limit: int = 2000, full_interval: float = 60.0) -> None:
+        """
+        Initialise the pacer. Call `start` once the service has finished starting.
+
+        Args:
+            young_limit (int, optional): Allocations in the young generation before
+                `idle` collects it. Defaults to 2000.
+            full_interval (float, optional): Seconds between full collections.
+                Defaults to 60.
+        """
+        self.young_limit = young_limit
+        self.full_interval = full_interval
+        self.next_full = 0.0
+        self.collections = 0
+        self.active = False
+
+    def start(self) -> None:
+        """Freeze the startup heap and turn off automatic collection."""
+        gc.collect()
+        gc.freeze()
+        gc.disable()
+        self.active = True
+        self.next_full = time.monotonic() + self.full_interval
+        logger.info("Froze %d objects; collecting in idle time", gc.get_freeze_count())
+
+    def stop(self) -> None:
+        """Give collection back to the interpreter."""
+        self.active = False
+        gc.unfreeze()
+        gc.enable()
+
+    def idle(self) -> None:
+        """Collect garbage if it is due. Call between frames."""
+        if not self.active:
+            return
+        now = time.monotonic()
+        if now >= self.next_full:
+            gc.collect()
+            self.next_full = now + self.full_interval
+            self.collections += 1
+        elif gc.get_count()[0] > self.young_limit:
+            gc.collect(1)
+            self.collections += 1
+
+
+class FramePacer:
+    """Waits between frames, by a fixed pause or to keep a frame interval."""
+
+    def __init__(self, interval: Optional[float] = None, pause: float = 0.01) -> None:
+        """
+        Initialise the pacer.
+
+        Args:
+            interval (float, optional): Seconds from the start of one frame to the
+                next. Defaults to pausing instead.
+            pause (float, optional): Seconds to sleep after each frame when there
+                is no interval. Defaults to 0.01.
+        """
+        self.interval = interval
+        self.pause = pause
+        self.next_frame = 0.0
+
+    def wait(self) -> None:
+        """Sleep until the next frame is due. Call after each frame."""
+        if not self.interval:
+            time.sleep(self.pause)
+            return
+        now = time.monotonic()
+        # Keep the cadence, but don't try to catch up after a stall
+        self.next_frame = max(self.next_frame + self.interval, now)
+        time.sleep(self.next_frame - now)
@@ -0,0 +1,310 @@
+#!/usr/bin/python3
+"""
+A render node: the content side of hexascroller signs, run on a faster machine.
+
+The Pi Zero W spends most of its time rendering. In split mode the render node
+runs the content logic of one or more signs (messages, templates, zones, images,
+transitions and effects) and sends the compiled 120- or 360-byte frames, with
+timestamps, to each sign's thin client, which is the service run with --thin. The
+thin client only paces the frames through its jitter buffer and writes them to the
+panels; if the frames stop, it shows the clock by itself (see sign.py).
+
+Frames are sent as udpframes datagrams, either over UDP to the sign (--udp-target,
+or frame_target in the configuration file) or on the PREFIX/frame MQTT topic. A
+frame is sent when it changes, and resent every --keepalive seconds while it
+doesn't, so the thin client knows the render node is still there.
+
+The render node subscribes to each sign's message, field, image and invert topics
+in place of the thin client, which keeps the power and availability topics.
+
+Example usage:
+
+```bash
+# On the sign
+python3 service.py --thin --udp-port 1215
+# On the render node
+python3 rendernode.py --udp-target signpi.lan:1215
+```
+"""
+
+import argparse
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import paho.mqtt.client as mqtt
+
+from compositor import parse_zone
+from imageworker import ImageWorker
+from jsonsock import HEXAPORT, Listener
+from sign import (
+    ROLE_RENDER,
+    TOPIC_FRAME,
+    Sign,
+    SignConfig,
+    default_config,
+    load_config,
+)
+from transitions import DEFAULT_DURATION, TRANSITIONS
+from udpframes import FRAME_PORT, pack_frame
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FPS = 50.0
+DEFAULT_KEEPALIVE = 0.5
+
+
+def parse_address(spec: str) -> Tuple[str, int]:
+    """
+    Parse a thin client's address, HOST or HOST:PORT.
+
+    Raises:
+        ValueError: If the port is not a number.
+    """
+    host, _, port = spec.rpartition(":")
+    if not host:
+        return spec, FRAME_PORT
+    return host, int(port)
+
+
+class FrameSender:
+    """Sends a sign's frames to its thin client, over UDP or MQTT."""
+
+    def __init__(
+        self,
+        client: mqtt.Client,
+        topic: str,
+        target: Optional[Tuple[str, int]] = None,
+        keepalive: float = DEFAULT_KEEPALIVE,
+    ) -> None:
+        """
+        Initialise the sender.
+
+        Args:
+            client (mqtt.Client): The MQTT client, for frames sent without a target.
+            topic (str): The sign's frame topic.
+            target (Tuple[str, int], optional): The thin client's UDP address.
+                Defaults to sending frames over MQTT.
+            keepalive (float, optional): Seconds after which an unchanged frame is
+                sent again.
+        """
+        self.client = client
+        self.topic = topic
+        self.target = target
+        self.keepalive = keepalive
+        self.sock: Optional[socket.socket] = None
+        if target:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sequence = 0
+        self.last: Optional[bytes] = None
+        self.next_send = 0.0
+        self.sent = 0
+
+    def send(self, frame: bytes, now: float) -> None:
+        """
+        Send a frame if it changed or the keepalive is due.
+
+        Args:
+            frame (bytes): The compiled frame.
+            now (float): The current `time.monotonic()` value, sent as the
+                frame's timestamp.
+        """
+        if frame == self.last and now < self.next_send:
+            return
+        self.last = frame
+        self.next_send = now + self.keepalive
+        self.sequence += 1
+        packet = pack_frame(self.sequence, int(now * 1e6), frame)
+        if self.sock and self.target:
+            try:
+                self.sock.sendto(packet, self.target)
+            except OSError as error:
+                logger.debug("Could not send frame to %s: %s", self.target, error)
+                return
+        else:
+            self.client.publish(self.topic, packet, qos=0)
+        self.sent += 1
+
+
+def main():
+    """Main function."""
+    parser = argparse.ArgumentParser(description="Hexascroller render node")
+    parser.add_argument("--debug", action="store_true", help="Enable debug logging")
+    parser.add_argument(
+        "--config",
+        type=str,
+        metavar="FILE",
+        help="JSON file describing the signs to render for (see sign.py)",
+    )
+    parser.add_argument(
+        "--udp-target",
+        type=str,
+        default="",
+        metavar="HOST[:PORT]",
+        help="Send the frames to the thin client over UDP, instead of on the"
+        f" PREFIX/frame topic (default port: {FRAME_PORT})",
+    )
+    parser.add_argument(
+        "--fps",
+        type=float,
+        default=DEFAULT_FPS,
+        help=f"Frames rendered per second (default: {DEFAULT_FPS})",
+    )
+    parser.add_argument(
+        "--keepalive",
+        type=float,
+        default=DEFAULT_KEEPALIVE,
+        help="Seconds after which an unchanged frame is sent again"
+        f" (default: {DEFAULT_KEEPALIVE})",
+    )
+    parser.add_argument(
+        "--mqtt-host",
+        type=str,
+        default=os.environ.get("MQTT_BROKER", "mqttbroker.lan"),
+        help="MQTT host address (default: mqttbroker.lan)",
+    )
+    parser.add_argument(
+        "--mqtt-user",
+        type=str,
+        default=os.environ.get("MQTT_USER"),
+        help="MQTT user (default: None)",
+    )
+    parser.add_argument(
+        "--mqtt-password",
+        type=str,
+        default=os.environ.get("MQTT_PASS"),
+        help="MQTT password (default: None)",
+    )
+    parser.add_argument(
+        "--json-port",
+        type=int,
+        default=HEXAPORT,
+        help=f"Local JSON control socket port, 0 to disable (default: {HEXAPORT})",
+    )
+    parser.add_argument(
+        "--zone",
+        type=parse_zone,
+        action="append",
+        metavar="START+WIDTH[@FPS]:CONTENT",
+        help="Show CONTENT in a zone of the panel, as for service.py",
+    )
+    parser.add_argument(
+        "--transition",
+        choices=["none", *TRANSITIONS],
+        default="slide",
+        help="Transition between the clock and messages (default: slide)",
+    )
+    parser.add_argument(
+        "--transition-time",
+        type=float,
+        default=DEFAULT_DURATION,
+        help=f"Seconds each transition takes (default: {DEFAULT_DURATION})",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.debug else logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+        datefmt="%Y-%m-%dT%H:%M:%S",
+    )
+
+    defaults = default_config(
+        zones=args.zone or [],
+        transition=args.transition,
+        transition_time=args.transition_time,
+        json_port=args.json_port,
+        frame_target=args.udp_target,
+    )
+    configs: List[SignConfig] = [defaults]
+    if args.config:
+        try:
+            configs = load_config(args.config, defaults)
+        except (OSError, ValueError) as error:
+            parser.error(f"Bad configuration {args.config}: {error}")
+
+    client = mqtt.Client()
+    image_worker = ImageWorker(lambda image, request: None)
+    signs: List[Sign] = []
+    senders: List[FrameSender] = []
+    for config in configs:
+        try:
+            sign = Sign(config, [], client, image_worker, role=ROLE_RENDER)
+            target = parse_address(config.frame_target) if config.frame_target else None
+        except ValueError as error:
+            parser.error(f"Sign {config.name}: {error}")
+        signs.append(sign)
+        senders.append(
+            FrameSender(client, sign.topic(TOPIC_FRAME), target, args.keepalive)
+        )
+        logger.info(
+            "Rendering %s for %s",
+            sign.name,
+            "%s:%d" % target if target else sign.topic(TOPIC_FRAME),
+        )
+        if config.json_port:
+            try:
+                listener = Listener(sign.apply_commands, sign.stream, config.json_port)
+            except OSError as error:
+                logger.warning(
+                    "No JSON control socket for %s on port %d: %s",
+                    sign.name,
+                    config.json_port,
+                    error,
+                )
+            else:
+                listener.start()
+                logger.info(
+                    "JSON control socket for %s listening on port %d",
+                    sign.name,
+                    config.json_port,
+                )
+    image_worker.start()
+
+    def on_connect(client: mqtt.Client, userdata, flags, resultcode):
+        # pylint: disable=unused-argument
+        logger.info("MQTT client connected, result code %s", resultcode)
+        for sign in signs:
+            sign.on_connect(client)
+
+    def on_message(client: mqtt.Client, userdata, msg: mqtt.MQTTMessage):
+        # pylint: disable=unused-argument
+        logger.debug("MQTT message received: %s", msg.topic)
+        for sign in signs:
+            if msg.topic.startswith(f"{sign.prefix}/"):
+                sign.on_message(msg.topic[len(sign.prefix) + 1 :], msg.payload)
+                break
+
+    client.enable_logger(logger=logger)
+    client.on_connect = on_connect
+    client.on_message = on_message
+    if args.mqtt_user:
+        client.username_pw_set(args.mqtt_user, args.mqtt_password)
+    client.connect_async(args.mqtt_host, 1883, 60)
+    client.loop_start()
+
+    running = threading.Event()
+    running.set()
+    signal.signal(signal.SIGINT, lambda *_: running.clear())
+    signal.signal(signal.SIGTERM, lambda *_: running.clear())
+
+    print("Running hexascroller render node. Press Ctrl-C to exit.")
+    interval = 1.0 / args.fps
+    next_frame = time.monotonic()
+    while running.is_set():
+        now = time.monotonic()
+        for sign, sender in zip(signs, senders):
+            sender.send(sign.render_frame(), now)
+        # Keep the frame cadence, but don't try to catch up after a stall
+        next_frame = max(next_frame + interval, now)
+        time.sleep(max(0.0, next_frame - time.monotonic()))
+    logger.info("Sent %s frames", ", ".join(str(s.sent) for s in senders))
+    client.loop_stop()
+    client.disconnect()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Replay a capture recorded with `service.py --capture` to panels or the simulator.
+
+The commands in the capture are sent again, each to the panel with the ID it was
+recorded for, either with their original timing or as fast as the link allows. The
+panels are found by the IDs in the capture, so captures of several signs replay to
+all their panels; commands for panels that aren't found are skipped and counted.
+Responses in the capture are skipped; the panels answer for themselves. At the end
+the tool prints the achieved command and frame rates, so a capture of a busy
+scroll doubles as a reproducible throughput test.
+
+Example usage:
+
+```bash
+python3 service.py --capture scroll.hxcap      # record, then stop the service
+python3 replay.py scroll.hxcap --max-speed     # replay to the real panels
+python3 replay.py scroll.hxcap --debug-host localhost   # replay to debug.py
+python3 replay.py scroll.hxcap --max-speed --transport pty   # no hardware
+```
+"""
+
+import argparse
+import collections
+import logging
+import sys
+import time
+
+from capture import OUTGOING, read_capture
+from led_panel import CommandCode, TRANSPORTS, discover_panels
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    """Main function."""
+    parser = argparse.ArgumentParser(description="Replay a hexascroller capture")
+    parser.add_argument("capture", help="Capture file written by service.py --capture")
+    parser.add_argument(
+        "--debug-host",
+        type=str,
+        help="Send to the debug.py simulator on this host instead of serial panels",
+    )
+    parser.add_argument(
+        "--transport",
+        choices=TRANSPORTS,
+        default="serial",
+        help="How to talk to the panels (default: serial)",
+    )
+    parser.add_argument(
+        "--max-speed",
+        action="store_true",
+        help="Send commands back to back instead of with their original timing",
+    )
+    parser.add_argument(
+        "--loops", type=int, default=1, help="Number of times to replay the capture"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+        datefmt="%Y-%m-%dT%H:%M:%S",
+    )
+
+    records = [r for r in read_capture(args.capture) if r.direction == OUTGOING]
+    if not records:
+        print("No commands in capture.")
+        sys.exit(1)
+    wanted = sorted({record.panel_id for record in records})
+    panels = discover_panels(wanted, args.debug_host, args.transport)
+    if not panels:
+        print(f"Could not find any of the panels {wanted}; aborting.")
+        sys.exit(1)
+    missing = [panel_id for panel_id in wanted if panel_id not in panels]
+    if missing:
+        print(f"Panels {missing} not found; skipping their commands.")
+
+    commands = collections.Counter()
+    payload_bytes = 0
+    skipped = collections.Counter()
+    start = time.perf_counter()
+    for _ in range(args.loops):
+        loop_start = time.perf_counter()
+        for record in records:
+            if not args.max_speed:
+                delay = loop_start + record.timestamp - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            try:
+                command = CommandCode(record.data[0])
+            except ValueError:
+                skipped["unknown codes"] += 1
+                continue
+            if record.panel_id not in panels:
+                skipped[f"panel {record.panel_id}"] += 1
+                continue
+            panels[record.panel_id].command(command, record.data[2:], 0)
+            commands[command] += 1
+            payload_bytes += len(record.data)
+    elapsed = time.perf_counter() - start
+    for panel in panels.values():
+        panel.close()
+
+    original = (records[-1].timestamp - records[0].timestamp) * args.loops
+    total = sum(commands.values())
+    print(f"Replayed {total} commands ({payload_bytes} bytes) in {elapsed:.3f}s")
+    print(f"Original duration {original:.3f}s, {total / elapsed:.1f} commands/s")
+    print(f"{commands[CommandCode.FLIP_BUFFERS] / elapsed:.1f} flips/s")
+    for command, count in sorted(commands.items(), key=lambda item: item[0].value):
+        print(f"  {command.name}: {count}")
+    for reason, count in sorted(skipped.items()):
+        print(f"Skipped {count} commands for {reason}")
+
+
+if __name__ == "__main__":
+    main()
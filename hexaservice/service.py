@@ -13,7 +13,22 @@ The mqtt topics this service subscribes to are as follows:
 - hexascroller/invert/set: set the invert state of the display.
   The payload should be "ON" or OFF"
 - hexascroller/message: set the message to display.
-  The payload should be a string of text to display.
+  The payload should be a string of text to display. It can contain live fields
+  such as {time}, {beats} or {countdown:18:30}, which the service keeps up to date
+  (see template.py).
+- hexascroller/image: show an image. The payload should be a PNG or GIF, or a JSON
+  object with the base64 image and offset, scroll and duration parameters (see
+  imageworker.py). Images are decoded in the background and cached.
+- hexascroller/field/NAME: set the value shown by {NAME} fields in messages, e.g. a
+  sensor reading. The payload should be the text to show.
+- hexascroller/accessory: send the payload to the accessory UART of the first
+  panel, or of the sign's panel N (counting from 0) with hexascroller/accessory/N.
+  The payload is raw bytes of any length, queued and sent a chunk per frame at the
+  pace of the 9600 baud accessory link (see accessory.py).
+- hexascroller/trace/set: start or stop recording per-frame trace spans.
+  The payload should be "ON" or OFF"
+- hexascroller/trace/dump: write the recorded trace spans to a Chrome trace-event
+  JSON file in the trace directory. The payload is ignored.
 
 The mqtt topics this service publishes to are as follows:
 
@@ -27,30 +42,67 @@ The service also publishes an availability topic:
 - hexascroller/available: the availability of the service.
     The payload will be "online" or "offline"
 
+Other features, by topic (see --help for the options):
+
+- Signs: one process can drive several signs, each with its own panels, topic
+  prefix in place of hexascroller, and content, listed with --config (see sign.py).
+- Display: --zone splits the panel into zones (see compositor.py), --transition
+  animates the switch between clock and message (see transitions.py), messages
+  arriving in a burst are coalesced per --message-mode and --message-rate (see
+  inbox.py), and the clock flips on the second (see clockalign.py).
+- Local frame sources, which override the clock and messages while active: the
+  JSON control socket with --json-port (see jsonsock.py), UDP frames with
+  --udp-port (see udpframes.py) and a shared framebuffer with --shm (see
+  shmframes.py).
+- Render node: with --thin the service only writes the frames a render node sends
+  and shows the clock when they stop (see rendernode.py).
+- Panel links: --link-profile, saved by calibrate.py, sets the frame interval and
+  response timeout, and --capture records the panel traffic for replay.py.
+- Timing: every --jitter-interval seconds the service logs frame interval
+  percentiles and link errors, and --realtime runs the frame loop under SCHED_FIFO
+  with garbage collection between frames (see realtime.py).
+- Tracing: --trace, the trace topics and SIGUSR1 record and dump per-frame spans
+  (see frametrace.py).
+- Soak testing: --soak HOURS replays synthetic traffic headless, sped up, and
+  reports frame rate, CPU, memory and GC drift (see soak.py).
+
 """
 
-import dataclasses
 import logging
 import sys
 import time
 import signal
 import argparse
 import os
+import threading
 
-from typing import Optional
+from typing import List, Optional
 
 import paho.mqtt.client as mqtt
-from PIL import Image
-
-from led_panel import (
-    panels,
-    compile_image,
-    PANEL_WIDTH,
-    PANEL_HEIGHT,
-    init_panel,
-    shutdown_panel,
-)
+
+from led_panel import TRANSPORTS, discover_panels
+from calibrate import DEFAULT_PROFILE, load_profile
+from capture import CaptureWriter
+from compositor import parse_zone
 from fontutil import base_font
+from frametrace import tracer
+from imageworker import ImageWorker
+from inbox import DEFAULT_DEPTH, DEFAULT_RATE, MODES, MessageInbox
+from jsonsock import HEXAPORT, Listener
+from metrics import IntervalStats
+from soak import DEFAULT_SPEED, SoakMonitor, SoakWorkload
+from sign import (
+    MSG_DURATION,
+    ROLE_LOCAL,
+    ROLE_THIN,
+    Sign,
+    SignConfig,
+    default_config,
+    load_config,
+)
+from transitions import DEFAULT_DURATION, TRANSITIONS
+from realtime import DEFAULT_PRIORITY, FramePacer, GcPacer, parse_cpus, set_realtime
+from udpframes import FrameReceiver
 
 default_mqtt_host = os.environ.get("MQTT_BROKER", "mqttbroker.lan")
 default_mqtt_user = os.environ.get("MQTT_USER")
@@ -58,12 +110,32 @@ default_mqtt_pass = os.environ.get("MQTT_PASS")
 
 parser = argparse.ArgumentParser(description="Hexascroller LED panel display service")
 parser.add_argument("--debug", action="store_true", help="Enable debug mode")
+parser.add_argument(
+    "--config",
+    type=str,
+    metavar="FILE",
+    help="JSON file describing the signs to drive, each with its own panels and"
+    " topic prefix (default: one sign on panels 0-2, see sign.py)",
+)
 parser.add_argument(
     "--debug-host",
     type=str,
     default="localhost",
     help="Debug host address (default: localhost)",
 )
+parser.add_argument(
+    "--transport",
+    choices=TRANSPORTS,
+    default="serial",
+    help="How to talk to the panels: pyserial, a raw tty, UDP to debug.py, an"
+    " emulator on a pty, or nothing at all (default: serial; --debug implies udp)",
+)
+parser.add_argument(
+    "--thin",
+    action="store_true",
+    help="Only drive the panels with frames from a render node, received with"
+    " --udp-port or on the PREFIX/frame topic, showing the clock when they stop",
+)
 parser.add_argument(
     "--mqtt-host",
     type=str,
@@ -83,236 +155,274 @@ parser.add_argument(
     help="MQTT password (default: None)",
 )
 
+parser.add_argument(
+    "--trace",
+    type=int,
+    default=0,
+    metavar="SPANS",
+    help="Record per-frame trace spans into a ring buffer of this size (default: off)",
+)
+parser.add_argument(
+    "--trace-dir",
+    type=str,
+    default=".",
+    help="Directory for trace dumps (default: current directory)",
+)
+parser.add_argument(
+    "--json-port",
+    type=int,
+    default=0,
+    help=f"Local JSON control socket port, usually {HEXAPORT} (default: 0, off)",
+)
+parser.add_argument(
+    "--udp-port",
+    type=int,
+    default=0,
+    help="Accept sequence-numbered frames over UDP on this port (default: off)",
+)
+parser.add_argument(
+    "--udp-delay",
+    type=float,
+    default=0.05,
+    help="Jitter buffer playout delay for UDP frames in seconds (default: 0.05)",
+)
+parser.add_argument(
+    "--shm",
+    type=str,
+    default="",
+    metavar="PATH",
+    help="Create a shared framebuffer file, e.g. /dev/shm/hexascroller, that programs"
+    " of the service's user or group can draw frames into (see shmframes.py)",
+)
+parser.add_argument(
+    "--capture",
+    type=str,
+    metavar="FILE",
+    help="Record all panel traffic to a binary capture file for replay.py",
+)
+parser.add_argument(
+    "--replacement-char",
+    type=str,
+    default="?",
+    help="Character shown for characters the font can't represent (default: ?)",
+)
+
+parser.add_argument(
+    "--realtime",
+    action="store_true",
+    help="Run the frame loop under SCHED_FIFO and collect garbage between frames",
+)
+parser.add_argument(
+    "--rt-priority",
+    type=int,
+    default=DEFAULT_PRIORITY,
+    help=f"SCHED_FIFO priority for --realtime (default: {DEFAULT_PRIORITY})",
+)
+parser.add_argument(
+    "--cpus",
+    type=parse_cpus,
+    metavar="LIST",
+    help="Pin the frame loop to these CPUs with --realtime, e.g. 0 or 1-3",
+)
+parser.add_argument(
+    "--jitter-interval",
+    type=float,
+    default=60.0,
+    help="Seconds between frame interval reports, 0 to disable (default: 60)",
+)
+
+parser.add_argument(
+    "--zone",
+    type=parse_zone,
+    action="append",
+    metavar="START+WIDTH[@FPS]:CONTENT",
+    help="Show CONTENT ('message' or a template such as {time}) in a zone of the"
+    " panel, updated FPS times a second. Repeat for each zone (see compositor.py)",
+)
+
+parser.add_argument(
+    "--transition",
+    choices=["none", *TRANSITIONS],
+    default="slide",
+    help="Transition between the clock and messages (default: slide)",
+)
+parser.add_argument(
+    "--transition-time",
+    type=float,
+    default=DEFAULT_DURATION,
+    help=f"Seconds each transition takes (default: {DEFAULT_DURATION})",
+)
+
+parser.add_argument(
+    "--link-profile",
+    type=str,
+    default=DEFAULT_PROFILE,
+    help="Link profile from calibrate.py, which sets the frame interval and panel"
+    " timeouts if it exists (default: link-profile.json next to the service)",
+)
+parser.add_argument(
+    "--no-align-clock",
+    action="store_true",
+    help="Upload clock frames when the loop sees the time change, instead of"
+    " preloading them and flipping the panels on the second",
+)
+parser.add_argument(
+    "--message-mode",
+    choices=MODES,
+    default="latest",
+    help="For messages arriving faster than --message-rate: show only the latest,"
+    " or queue them (default: latest)",
+)
+parser.add_argument(
+    "--message-rate",
+    type=float,
+    default=DEFAULT_RATE,
+    help=f"Most MQTT messages shown per second, 0 for no limit"
+    f" (default: {DEFAULT_RATE})",
+)
+parser.add_argument(
+    "--message-queue",
+    type=int,
+    default=DEFAULT_DEPTH,
+    help=f"Most messages waiting with --message-mode queue (default: {DEFAULT_DEPTH})",
+)
+
+parser.add_argument(
+    "--soak",
+    type=float,
+    default=0.0,
+    metavar="HOURS",
+    help="Run headless on the null or pty transport, replaying HOURS of synthetic"
+    " MQTT traffic, and report performance over time (see soak.py)",
+)
+parser.add_argument(
+    "--soak-speed",
+    type=float,
+    default=DEFAULT_SPEED,
+    help=f"How many times faster than real time to replay the soak traffic"
+    f" (default: {DEFAULT_SPEED})",
+)
+parser.add_argument(
+    "--soak-report",
+    type=str,
+    help="Append each soak sample to this file as a line of JSON",
+)
+
 args = parser.parse_args()
+if args.soak and args.transport not in ("null", "pty"):
+    parser.error("--soak needs --transport null or pty")
 
 
 logger = logging.getLogger(__name__)
 
-MSG_DURATION: float = 30.0
-TOPIC_PREFIX: str = "hexascroller"
-TOPIC_POWER: str = f"{TOPIC_PREFIX}/power"
-TOPIC_POWER_SET: str = f"{TOPIC_POWER}/set"
-TOPIC_INVERT: str = f"{TOPIC_PREFIX}/invert"
-TOPIC_INVERT_SET: str = f"{TOPIC_INVERT}/set"
-TOPIC_MESSAGE: str = f"{TOPIC_PREFIX}/message"
-TOPIC_AVAILABILITY: str = f"{TOPIC_PREFIX}/available"
-
-
-@dataclasses.dataclass
-class State:
-    # pylint: disable=too-few-public-methods,too-many-instance-attributes
-    """
-    Represents the state of a hexascroller LED panel display service.
-
-    The service controls the panel display, rendering messages and time information,
-    and communicates with an MQTT broker to receive commands and updates.
-
-    This is a simple data class or struct class that only stores state. It has no methods.
-
-    Attributes:
-    -----------
-    running : bool
-        A boolean value indicating whether the service is running or not.
-    powered : bool
-        A boolean value indicating whether the LED panel display is powered on or not.
-    inverted : bool
-        A boolean value indicating whether the LED panel display is inverted or not.
-    msg_until : Optional[float]
-        The time (in seconds since epoch) until the current message should be displayed.
-        If the value is 0.0, the message should not be displayed.
-    msg_offset : float
-        Represents the horizontal offset for scrolling the displayed message, if applicable.
-        Set dynamically based on the message length, the scroll interval and the current time.
-    message : Optional[str]
-        A string representing the current message to be displayed.
-        Set through the MQTT message topic.
-    scroll_interval : float
-        Represents the time interval (in seconds) between successive horizontal scrolling steps.
-        Set dynamically based on the length of the message.
-    """
-
-    def __init__(self):
-        """Initialise the state of the service."""
-        self.bitmap: bytes = b"\0" * PANEL_WIDTH
-        self.running: bool = True  # If we're here we're running
-        self.powered: bool = False  # Initially off
-        self.inverted: bool = False  # Initially not inverted
-        self.msg_until: Optional[float] = None
-        self.msg_offset: float = 0.0
-        self.message: str = "Main screen turn on"
-        self.scroll_interval: float = 0.0
-        self.power_command: bool = True  # Power on by default
-        self.client: mqtt.Client = mqtt.Client()
-
-
-state = State()
-
-
-class SimpleCache:
-    """A simple cache for storing key-value pairs. This is used to cache rendered images.
-
-    This is a very simple cache implementation that only stores a single key-value pair.
-    It is used to cache rendered images, so that the same image is not rendered multiple
-    times. This is not a very efficient cache implementation, but it is sufficient for
-    the purposes of this application. Old images are simply overwritten by new ones, but
-    this is not a problem because the strings are typically only used once, or very rarely.
-    """
-
-    def __init__(self):
-        """Initialise the simple cache."""
-        self.key = None
-        self.value = None
-
-    def get(self, key):
-        """Retrieve a value from the cache by key."""
-        if self.key == key:
-            return self.value
-        return None
-
-    def set(self, key, value):
-        """Store a key-value pair in the cache."""
-        self.key = key
-        self.value = value
-
-
-render_cache = SimpleCache()
-
-
-def internet_time() -> float:
-    """Granular Swatch Internet Time based on Biel Meridian (UTC+1)."""
-    return (((time.time() + 3600) % 86400) * 1000) / 86400
-
-
-def render_time_bitmap() -> bytes:
-    """Render local time and Swatch beats into a 2-panel bitmap."""
-    beats = internet_time()
-    msg = time.strftime("%H:%M:%S")
-    bmsg = f"@{beats:06.2f}"
-    cached_result = render_cache.get(bmsg + msg)
-    if cached_result:
-        return cached_result
-    img = Image.new("1", (PANEL_WIDTH, PANEL_HEIGHT))
-    txtimg = base_font.string_image(msg)
-    img.paste(txtimg, (15, 0))
-    txtimg = base_font.string_image(f"{bmsg}")
-    img.paste(txtimg, (61, 0))
-    # Paste .beats separately to keep text in the same place
-    img.paste(base_font.string_image(".beats"), (94, 0))
-    bitmap = compile_image(img, 0, 0)
-    render_cache.set(bmsg + msg, bitmap)
-    return bitmap
-
-
-def render_text_bitmap(text: str, offset: int) -> bytes:
-    """Render the given text with offset into a 2-panel bitmap."""
-    cached_result = render_cache.get(text + str(offset))
-    if cached_result:
-        return cached_result
-    txtimg = base_font.string_image(text)
-    img = Image.new("1", (PANEL_WIDTH, PANEL_HEIGHT))
-    img.paste(txtimg, (offset, 0))
-    bitmap = compile_image(img, 0, 0)
-    render_cache.set(text + str(offset), bitmap)
-    return bitmap
+TOPIC_TRACE_SET: str = "trace/set"
+TOPIC_TRACE_DUMP: str = "trace/dump"
+
+running = threading.Event()
+client: mqtt.Client = mqtt.Client()
+signs: List[Sign] = []
+image_worker = ImageWorker(lambda image, request: None)
+
+frame_intervals = IntervalStats()
+gc_pacer = GcPacer()
+frame_pacer = FramePacer()
+soak_monitor: Optional[SoakMonitor] = None
 
 
 def on_mqtt_connect(client: mqtt.Client, userdata, flags, resultcode):
     """Callback function when the MQTT client connects to the broker."""
-    power_state = b"ON" if state.powered else b"OFF"
-    invert_state = b"ON" if state.inverted else b"OFF"
-
     logger.info(
         "MQTT client connected, flags %s, result code %s, user data %s",
         flags,
         resultcode,
         userdata,
     )
-    client.publish(TOPIC_AVAILABILITY, "online", retain=True)
-    client.publish(TOPIC_POWER, power_state, qos=0, retain=True)
-    client.publish(TOPIC_INVERT, invert_state, qos=0, retain=True)
-    client.subscribe(TOPIC_POWER_SET, qos=0)
-    client.subscribe(TOPIC_MESSAGE, qos=0)
-    client.subscribe(TOPIC_INVERT_SET, qos=0)
+    for sign in signs:
+        sign.on_connect(client)
+        client.subscribe(sign.topic(TOPIC_TRACE_SET), qos=0)
+        client.subscribe(sign.topic(TOPIC_TRACE_DUMP), qos=0)
 
 
 def on_mqtt_message(client: mqtt.Client, userdata, msg: mqtt.MQTTMessage):
     """Callback function when the MQTT client receives a message."""
-    logger.info("MQTT message received: %s, user data %s", msg.topic, userdata)
-    if msg.topic == TOPIC_MESSAGE:
-        state.msg_offset = 0
-        state.message = msg.payload.decode()
-        logger.info("Message received: %s", state.message)
-        state.msg_until = time.time() + MSG_DURATION
-
-        # Calculate scroll interval based on the width of the message
-        message_width = base_font.string_width(state.message)
-        if message_width > PANEL_WIDTH:
-            logger.info("Message width: %d", message_width)
-            scroll_duration = 0.9 * MSG_DURATION  # 90% of MSG_DURATION
-            logger.info("Scroll duration: %f", scroll_duration)
-            state.scroll_interval = scroll_duration / (message_width - PANEL_WIDTH)
-            logger.info("Scroll interval: %f", state.scroll_interval)
-        else:
-            state.scroll_interval = 0
-    elif msg.topic == TOPIC_POWER_SET:
-        if msg.payload in (b"ON", b"OFF"):
-            state.power_command = msg.payload == b"ON"
-            logger.info("Power command set to %s", state.powered)
-        else:
-            logger.warning("Invalid payload received for power state: %s", msg.payload)
-
-    elif msg.topic == TOPIC_INVERT_SET:
-        if msg.payload in (b"ON", b"OFF"):
-            state.inverted = msg.payload == b"ON"
-            logger.info("Invert set to %s", state.inverted)
-            client.publish(TOPIC_INVERT, msg.payload)
+    # pylint: disable=unused-argument
+    logger.debug("MQTT message received: %s, user data %s", msg.topic, userdata)
+    for sign in signs:
+        if msg.topic.startswith(f"{sign.prefix}/"):
+            break
+    else:
+        return
+    name = msg.topic[len(sign.prefix) + 1 :]
+    if name == TOPIC_TRACE_SET:
+        if msg.payload == b"ON":
+            tracer.enable(args.trace or None)
+        elif msg.payload == b"OFF":
+            tracer.disable()
         else:
-            logger.warning("Invalid payload received for invert state: %s", msg.payload)
+            logger.warning("Invalid payload received for trace state: %s", msg.payload)
+    elif name == TOPIC_TRACE_DUMP:
+        tracer.dump_async(args.trace_dir)
+    else:
+        sign.on_message(name, msg.payload)
 
 
 def panel_update():
-    """Updates the LED panel."""
-    if state.power_command != state.powered:
-        panels[0].set_relay(state.power_command)
-        state.powered = state.power_command
-        state.client.publish(TOPIC_POWER, b"ON" if state.powered else b"OFF")
-    if state.powered:
-        if state.msg_until is not None:
-            if base_font.string_width(state.message) > PANEL_WIDTH:
-                logger.debug("Scrolling message, offset %d", state.msg_offset)
-                new_bitmap = render_text_bitmap(state.message, int(-state.msg_offset))
-                state.msg_offset = (
-                    state.msg_offset + state.scroll_interval
-                ) % base_font.string_width(state.message)
-            else:
-                logger.debug(
-                    "String is shorter (%d) than panel width, no scrolling",
-                    base_font.string_width(state.message),
-                )
-                new_bitmap = render_text_bitmap(state.message, 0)
-            if time.time() > state.msg_until:
-                state.msg_until = None
-                logger.info("Message expired")
-        else:
-            # Render the time if no message is active
-            new_bitmap = render_time_bitmap()
-        # Invert the bitmap if the inversion state is true
-        if state.inverted:
-            new_bitmap = bytes(~b & 0xFF for b in new_bitmap)
-        # Update the panel only if the bitmap has changed
-        if state.bitmap != new_bitmap:
-            logger.debug("New bitmap: %s", new_bitmap)
-            for panel in panels:
-                # pylint: disable=no-value-for-parameter
-                panel.set_compiled_image(new_bitmap)
-            state.bitmap = new_bitmap
+    """Updates the LED panels of every sign."""
+    powered = False
+    for sign in signs:
+        powered = sign.update() or powered
+    if powered:
+        frame_intervals.tick()
+        if soak_monitor:
+            soak_monitor.frames += 1
+        gc_pacer.idle()
         # Sleep for a while
-        time.sleep(0.01)
+        frame_pacer.wait()
     else:
-        # If the panel is off, sleep for a longer while
+        # If the panels are off, sleep for a longer while
+        frame_intervals.pause()
+        # Automatic collection is off under --realtime, so keep collecting
+        gc_pacer.idle()
         time.sleep(0.2)
 
 
+def soak_deliver(topic: str, payload: bytes) -> None:
+    """Deliver soak traffic to the first sign, as if it came from the broker."""
+    msg = mqtt.MQTTMessage(topic=f"{signs[0].prefix}/{topic}".encode())
+    msg.payload = payload
+    on_mqtt_message(client, None, msg)
+
+
+def soak_sizes() -> dict:
+    """The sizes of the caches and queues the soak test watches for growth."""
+    return {
+        "image_cache": len(image_worker.cache),
+        "font_folds": len(base_font.folds),
+        "fields": sum(len(sign.state.fields) for sign in signs),
+        "inbox": sum(len(sign.inbox.pending) for sign in signs),
+        "trace_events": len(tracer.events),
+    }
+
+
+def load_signs() -> List[SignConfig]:
+    """Read the signs from --config, or describe the one sign the options give."""
+    defaults = default_config(
+        zones=args.zone or [],
+        transition=args.transition,
+        transition_time=args.transition_time,
+        json_port=args.json_port,
+        udp_port=args.udp_port,
+        shm=args.shm,
+    )
+    if not args.config:
+        return [defaults]
+    try:
+        return load_config(args.config, defaults)
+    except (OSError, ValueError) as error:
+        parser.error(f"Bad configuration {args.config}: {error}")
+    return []
+
+
 def main():
     """Main function."""
     logging.basicConfig(
@@ -321,26 +431,84 @@ def main():
         datefmt="%Y-%m-%dT%H:%M:%S",
     )
     logger.info("NAME %s", __name__)
+    if args.replacement_char in base_font.glyphs:
+        base_font.replacement = args.replacement_char
+    else:
+        logger.warning("Replacement %r is not in the font", args.replacement_char)
+
+    configs = load_signs()
+    # Open every sign's panels in one pass, as they share the USB ports
+    found = discover_panels(
+        [panel_id for config in configs for panel_id in config.panel_ids],
+        debug_host=args.debug_host if args.debug else None,
+        transport=args.transport,
+    )
+    for config in configs:
+        missing = [panel_id for panel_id in config.panel_ids if panel_id not in found]
+        if missing:
+            print(f"Could not find panels {missing} of sign {config.name}; aborting.")
+            for panel in found.values():
+                panel.close()
+            sys.exit(0)
+        try:
+            signs.append(
+                Sign(
+                    config,
+                    [found[panel_id] for panel_id in config.panel_ids],
+                    client,
+                    image_worker,
+                    args.udp_delay,
+                    ROLE_THIN if args.thin else ROLE_LOCAL,
+                    MessageInbox(
+                        args.message_mode,
+                        args.message_rate,
+                        args.message_queue,
+                        MSG_DURATION,
+                    ),
+                    not args.no_align_clock,
+                )
+            )
+        except (OSError, ValueError) as error:
+            parser.error(f"Sign {config.name}: {error}")
+    logger.info("Driving %d signs: %s", len(signs), ", ".join(s.name for s in signs))
 
     # Check if we are running in debug mode. Run as "python3 service.py --debug"
     if args.debug:
         logger.info("Debug mode enabled.")
         logger.info("Debug host: %s", args.debug_host)
+        state = signs[0].state
         state.inverted = True
         state.powered = True
-        state.message = "Hello, ~ Resistor! This is a very long message to debug."
+        signs[0].show_message(
+            "Hello, ~ Resistor! This is a very long message to debug."
+        )
         state.msg_until = time.time() + 12
         state.scroll_interval = 0.1
     else:
         logger.info("Debug mode not enabled.")
 
-    if not init_panel(debug_host=args.debug_host if args.debug else None):
-        print("Could not find all three panels; aborting.")
-        sys.exit(0)
-
-    # Turn on the panel
-    # pylint: disable=no-value-for-parameter
-    panels[0].set_relay(True)
+    profile = load_profile(args.link_profile, args.transport)
+    if profile:
+        frame_pacer.interval = profile["frame_interval"]
+        for panel in found.values():
+            panel.transport.set_timeout(profile["timeout"])
+        logger.info(
+            "Link profile %s: frame interval %.1f ms, timeout %.0f ms",
+            args.link_profile,
+            profile["frame_interval"] * 1000,
+            profile["timeout"] * 1000,
+        )
+
+    capture = None
+    if args.capture:
+        capture = CaptureWriter(args.capture)
+        for panel in found.values():
+            panel.capture = capture
+        logger.info("Capturing panel traffic to %s", args.capture)
+
+    # Turn on the panels
+    for sign in signs:
+        sign.set_relay(True)
 
     # Set up signal handlers to gracefully shut down the service
     def signal_handler(mysignal, frame):
@@ -348,10 +516,60 @@ def main():
         """Handle signals gracefully by stopping the main loop."""
         signal_name = signal.Signals(mysignal).name
         print(f"Caught {signal_name}; shutting down.")
-        state.running = False
+        running.clear()
 
+    running.set()
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
+    signal.signal(signal.SIGUSR1, lambda *_: tracer.dump_async(args.trace_dir))
+
+    if args.trace:
+        tracer.enable(args.trace)
+
+    for sign in signs:
+        if sign.config.json_port:
+            try:
+                listener = Listener(
+                    sign.apply_commands, sign.stream, sign.config.json_port
+                )
+            except OSError as error:
+                # Another instance, or a soak run, has the port: carry on without
+                logger.warning(
+                    "No JSON control socket for %s on port %d: %s",
+                    sign.name,
+                    sign.config.json_port,
+                    error,
+                )
+            else:
+                listener.start()
+                logger.info(
+                    "JSON control socket for %s listening on port %d",
+                    sign.name,
+                    sign.config.json_port,
+                )
+        if sign.config.udp_port:
+            FrameReceiver(sign.udp_frames, sign.config.udp_port).start()
+            logger.info(
+                "Accepting UDP frames for %s on port %d",
+                sign.name,
+                sign.config.udp_port,
+            )
+
+    image_worker.start()
+
+    workload = None
+    if args.soak:
+        # pylint: disable=global-statement
+        global soak_monitor
+        soak_monitor = SoakMonitor(soak_sizes, args.soak_speed, args.soak_report)
+        workload = SoakWorkload(soak_deliver, args.soak, args.soak_speed)
+        workload.start()
+        logger.info(
+            "Soak test: %.1f simulated hours at %.0fx, about %.0f s",
+            args.soak,
+            args.soak_speed,
+            args.soak * 3600 / args.soak_speed,
+        )
 
     # Parse the command line arguments
     host = args.mqtt_host
@@ -360,33 +578,79 @@ def main():
     logger.info("MQTT host: %s, MQTT user: %s", host, user)
 
     # Set up the MQTT client
-    client = state.client
     client.enable_logger(logger=logger)
     client.on_connect = on_mqtt_connect
     client.on_message = on_mqtt_message
     if user:
         logger.info("Logging into MQTT as %s", user)
         client.username_pw_set(user, password)
-    client.connect_async(host, 1883, 60)
-    # Start the MQTT loop in a separate thread
-    client.loop_start()
+    if not args.soak:
+        client.connect_async(host, 1883, 60)
+        # Start the MQTT loop in a separate thread
+        client.loop_start()
+
+    # Threads started from here on inherit the real-time policy, so start it last
+    if args.realtime:
+        set_realtime(args.rt_priority, args.cpus)
+        gc_pacer.start()
 
     print("Running hexaservice. Press Ctrl-C to exit.")
-    while state.running:
+    next_report = time.monotonic() + args.jitter_interval
+    while running.is_set():
         logger.debug("Panel update")
         panel_update()
+        if args.jitter_interval and time.monotonic() >= next_report:
+            logger.info("Frame interval %s", frame_intervals.format())
+            for panel in found.values():
+                if panel.errors:
+                    logger.info(
+                        "Panel %d link: %s",
+                        panel.id,
+                        " ".join(f"{k}={v}" for k, v in sorted(panel.errors.items())),
+                    )
+            for sign in signs:
+                if sign.clock is not None and sign.clock.errors.intervals:
+                    logger.info(
+                        "Clock flips for %s: %s", sign.name, sign.clock.format()
+                    )
+                    sign.clock.errors.reset()
+                if sign.inbox.counters["received"]:
+                    logger.info("Messages for %s: %s", sign.name, sign.inbox.format())
+                for stream in sign.accessories:
+                    if stream.counters["queued"] or stream.counters["dropped"]:
+                        logger.info(
+                            "Accessory UART of panel %d: %s",
+                            stream.panel.id,
+                            stream.format(),
+                        )
+            if soak_monitor:
+                soak_monitor.sample(frame_intervals)
+            frame_intervals.reset()
+            next_report += args.jitter_interval
+        if workload and not workload.is_alive():
+            running.clear()
+    gc_pacer.stop()
+    if workload:
+        workload.stop()
+        logger.info("Soak test finished: %s", soak_monitor.finish(frame_intervals))
     # When we get here, we are shutting down
-    # Turn off the panel
-    # pylint: disable=no-value-for-parameter
-    panels[0].set_relay(False)
-    shutdown_panel()
+    # Turn off the panels
+    for sign in signs:
+        sign.set_relay(False)
+    for panel in found.values():
+        panel.close()
+    if capture:
+        capture.close()
     # Wait for the panel thread to finish
     # panel_thread_instance.join()
 
+    if args.soak:
+        return
     # Shut down the MQTT connection
-    client.publish(TOPIC_POWER, b"OFF", qos=0)
-    client.publish(TOPIC_AVAILABILITY, "offline")
-    publish_result = client.publish(TOPIC_AVAILABILITY, "offline", retain=True)
+    for sign in signs:
+        client.publish(sign.topic("power"), b"OFF", qos=0)
+        client.publish(sign.topic("available"), "offline")
+        publish_result = client.publish(sign.topic("available"), "offline", retain=True)
     publish_result.wait_for_publish()
     client.loop_stop()
     client.disconnect()
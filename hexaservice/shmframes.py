@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+A memory-mapped framebuffer that local processes draw into directly.
+
+With --shm PATH the service creates a small file, usually in /dev/shm, that local
+processes can map and write frames into, with no sockets, serialisation or parsing
+in between. The file is created readable and writable by the service's user and
+group only (mode 0660, whatever the umask), so a producer runs as the same user or
+in the service's primary group; other users can't draw on the sign. The file is
+laid out as:
+
+    offset  size  field
+    0       4     magic, b"HXFB"
+    4       4     sequence number, unsigned little-endian
+    8       1     dirty flag, set by the producer after each frame
+    9       1     active flag, 1 while the framebuffer should be shown
+    10      6     reserved
+    16      360   the frame: 120 column bytes per panel, panel 0 first
+
+To draw a frame, a producer increments the sequence number (making it odd), writes
+the frame, increments it again (making it even) and sets the dirty flag. It sets
+the active flag to take over the display, and clears it to hand the display back
+to the clock and messages. `SharedFramebuffer.write` and `release` do this.
+
+A producer that crashes or is killed leaves the active flag set, so the service
+also releases the framebuffer, clearing the flag, once the sequence number hasn't
+changed for `timeout` seconds. A producer showing a still frame must write it
+again at least that often.
+
+The service checks the dirty flag once per frame. When it is set, it clears it and
+takes a snapshot of the frame, which it keeps using until the next one; a frame
+that was being written while the snapshot was taken (the sequence number was odd
+or changed) is taken again on the next frame. The snapshot is the only copy made
+before the frame is uploaded.
+
+Example usage:
+
+```python
+from shmframes import SharedFramebuffer
+
+framebuffer = SharedFramebuffer("/dev/shm/hexascroller")
+framebuffer.write(bytes([0x7F]) * 360)
+...
+framebuffer.release()
+```
+"""
+
+import logging
+import mmap
+import os
+import struct
+from typing import Optional
+
+from led_panel import PANEL_COUNT, PANEL_WIDTH
+
+logger = logging.getLogger(__name__)
+
+SHM_MAGIC = b"HXFB"
+SHM_SEQUENCE = struct.Struct("<I")
+SEQUENCE_OFFSET = 4
+DIRTY_OFFSET = 8
+ACTIVE_OFFSET = 9
+FRAME_OFFSET = 16
+FRAME_SIZE = PANEL_COUNT * PANEL_WIDTH
+SHM_SIZE = FRAME_OFFSET + FRAME_SIZE
+# The service's user and group only
+SHM_MODE = 0o660
+
+
+class SharedFramebuffer:
+    """The framebuffer file, for the service (`create`) or a producer."""
+
+    def __init__(self, path: str, create: bool = False, timeout: float = 5.0) -> None:
+        """
+        Map the framebuffer file.
+
+        Args:
+            path (str): The file, for example /dev/shm/hexascroller.
+            create (bool, optional): Create or reset the file, as the service does.
+                Producers leave this False.
+            timeout (float, optional): Seconds without a new frame before the
+                service releases the framebuffer.
+
+        Raises:
+            OSError: If the file can't be opened or mapped.
+            ValueError: If an existing file isn't a framebuffer.
+        """
+        self.path = path
+        flags = os.O_RDWR | (os.O_CREAT if create else 0)
+        fd = os.open(path, flags, SHM_MODE)
+        try:
+            if create:
+                # Not left to the umask, nor to the mode of a file already there
+                os.fchmod(fd, SHM_MODE)
+                os.ftruncate(fd, SHM_SIZE)
+            self.map = mmap.mmap(fd, SHM_SIZE)
+        finally:
+            os.close(fd)
+        if create:
+            self.map[:FRAME_OFFSET] = SHM_MAGIC + bytes(FRAME_OFFSET - len(SHM_MAGIC))
+        elif self.map[: len(SHM_MAGIC)] != SHM_MAGIC:
+            raise ValueError(f"{path} is not a hexascroller framebuffer")
+        self.current: Optional[bytes] = None
+        self.sequence: Optional[int] = None
+        self.timeout = timeout
+        # The sequence number last seen, and when it last changed
+        self.last_seen: Optional[int] = None
+        self.last_write = 0.0
+        self.frames = 0
+        self.torn = 0
+
+    def read_sequence(self) -> int:
+        """Return the sequence number."""
+        return SHM_SEQUENCE.unpack_from(self.map, SEQUENCE_OFFSET)[0]
+
+    def write(self, frame: bytes) -> None:
+        """
+        Write a frame and show the framebuffer. For producers.
+
+        Args:
+            frame (bytes): A 120-byte frame shown on every panel, or a 360-byte one.
+        """
+        if len(frame) == PANEL_WIDTH:
+            frame = bytes(frame) * PANEL_COUNT
+        if len(frame) != FRAME_SIZE:
+            raise ValueError(f"Frame must be {PANEL_WIDTH} or {FRAME_SIZE} bytes")
+        sequence = self.read_sequence()
+        SHM_SEQUENCE.pack_into(self.map, SEQUENCE_OFFSET, (sequence + 1) & 0xFFFFFFFF)
+        self.map[FRAME_OFFSET:SHM_SIZE] = frame
+        SHM_SEQUENCE.pack_into(self.map, SEQUENCE_OFFSET, (sequence + 2) & 0xFFFFFFFF)
+        self.map[DIRTY_OFFSET] = 1
+        self.map[ACTIVE_OFFSET] = 1
+
+    def release(self) -> None:
+        """Hand the display back to the clock and messages. For producers."""
+        self.map[ACTIVE_OFFSET] = 0
+
+    def poll(self, now: float) -> Optional[bytes]:
+        """
+        Return the frame that should be on the display, taking a new one if the
+        producer wrote one. For the service.
+
+        Args:
+            now (float): The current `time.monotonic()` value.
+
+        Returns:
+            Optional[bytes]: The frame, or None if the framebuffer isn't active.
+        """
+        shm = self.map
+        if not shm[ACTIVE_OFFSET]:
+            if self.current is not None:
+                logger.info("Shared framebuffer released after %d frames", self.frames)
+                self.current = None
+            return None
+        sequence = self.read_sequence()
+        if sequence != self.last_seen:
+            self.last_seen = sequence
+            self.last_write = now
+        elif now - self.last_write > self.timeout:
+            # The producer has gone without releasing it
+            logger.warning(
+                "Shared framebuffer not written for %.1f s, released after %d frames",
+                now - self.last_write,
+                self.frames,
+            )
+            shm[ACTIVE_OFFSET] = 0
+            self.current = None
+            return None
+        if shm[DIRTY_OFFSET]:
+            # Clear the flag first, so a frame written meanwhile sets it again
+            shm[DIRTY_OFFSET] = 0
+            sequence = self.read_sequence()
+            frame = shm[FRAME_OFFSET:SHM_SIZE]
+            if sequence & 1 or sequence != self.read_sequence():
+                self.torn += 1
+                shm[DIRTY_OFFSET] = 1
+            elif sequence != self.sequence:
+                self.sequence = sequence
+                self.current = frame
+                self.frames += 1
+        return self.current
+
+    def close(self) -> None:
+        """Unmap the file."""
+        self.map.close()
@@ -0,0 +1,715 @@
+#!/usr/bin/env python3
+"""
+One hexascroller sign: its panels, content state, frame sources and MQTT topics.
+
+The service can drive several signs from one process (see service.py). Each sign has
+its own panels, MQTT topic prefix, message, fields, zones and frame sources, while
+the font and its glyph cache, the clock bitmap cache and the image worker with its
+cache of compiled images are shared by all of them, so a second sign costs little
+more than its own frames.
+
+Signs are described in a JSON configuration file, given to the service with
+--config:
+
+    {
+        "signs": [
+            {"name": "hall", "prefix": "hexascroller", "panels": [0, 1, 2]},
+            {
+                "name": "shop",
+                "prefix": "shopsign",
+                "panels": [3, 4, 5],
+                "zones": ["0+34@2:{time:%H:%M}", "35+85@25:message"],
+                "transition": "wipe",
+                "json_port": 1215
+            }
+        ]
+    }
+
+- name: the sign's name in the logs. Defaults to the prefix.
+- prefix: the MQTT topic prefix, used in place of hexascroller. Must be unique.
+- panels: the IDs of the sign's panels, left to right, as set with scripts/id.py.
+  Every panel ID must belong to one sign only.
+- zones, transition, transition_time: as the service options of the same name.
+  They default to the service's options.
+- json_port, udp_port: the sign's JSON control socket and UDP frame ports, 0 for
+  none. The service's --json-port and --udp-port apply to the first sign only.
+- shm: a shared framebuffer file for local programs to draw into, such as
+  /dev/shm/shopsign (see shmframes.py). The service's --shm applies to the first
+  sign only.
+- frame_target: for a render node, the HOST:PORT of the sign's thin client to send
+  frames to over UDP. Without one, frames go to the PREFIX/frame topic.
+
+Without a configuration file the service drives a single sign, hexascroller, on
+panels 0, 1 and 2.
+
+A sign can also be split between a render node (see rendernode.py) and a thin
+client, the service run with --thin. The render node handles the content topics,
+renders and applies effects, and sends the compiled frames. The thin client only
+handles power and writes the frames it receives, over UDP or the PREFIX/frame
+topic, through its jitter buffer. When the frames stop it goes back to rendering
+the clock, or its zones, itself.
+"""
+
+import dataclasses
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import paho.mqtt.client as mqtt
+
+from led_panel import PANEL_COUNT, PANEL_WIDTH, Frame, Panel
+from accessory import AccessoryStream
+from clockalign import AlignedClock
+from compositor import Compositor, Zone, ZoneSpec, parse_zone
+from fontutil import base_font
+from frametrace import tracer
+from imageworker import CompiledImage, ImagePlayer, ImageRequest, ImageWorker
+from inbox import MessageInbox
+from jsonsock import FrameStream
+from shmframes import SharedFramebuffer
+from template import Template, internet_time
+from transitions import DEFAULT_DURATION, TRANSITIONS, TransitionPlayer
+from udpframes import JitterBuffer
+
+logger = logging.getLogger(__name__)
+
+MSG_DURATION: float = 30.0
+DEFAULT_PREFIX: str = "hexascroller"
+
+# Topics for the content, which a render node handles in place of a thin client
+CONTENT_TOPICS = ("message", "field/+", "image", "invert/set")
+# Compiled frames from a render node, as udpframes datagrams
+TOPIC_FRAME = "frame"
+# Data for the accessory UART of the first panel, or of the Nth on accessory/N
+TOPIC_ACCESSORY = "accessory"
+
+ROLE_LOCAL = "local"
+ROLE_THIN = "thin"
+ROLE_RENDER = "render"
+
+
+class SignConfig(NamedTuple):
+    """A sign as described in the configuration file."""
+
+    name: str
+    prefix: str
+    panel_ids: List[int]
+    zones: List[ZoneSpec]
+    transition: str
+    transition_time: float
+    json_port: int
+    udp_port: int
+    frame_target: str
+    shm: str
+
+
+def parse_sign(entry: Dict[str, Any], defaults: SignConfig) -> SignConfig:
+    """
+    Parse one sign of the configuration file.
+
+    Args:
+        entry (Dict[str, Any]): The sign's JSON object.
+        defaults (SignConfig): The values of keys the entry leaves out.
+
+    Raises:
+        ValueError: If the entry is malformed.
+    """
+    if not isinstance(entry, dict):
+        raise ValueError("Each sign must be an object")
+    prefix = entry.get("prefix", defaults.prefix)
+    panel_ids = entry.get("panels", defaults.panel_ids)
+    if not isinstance(prefix, str) or not prefix.strip("/"):
+        raise ValueError("'prefix' must be a topic prefix")
+    if (
+        not isinstance(panel_ids, list)
+        or not panel_ids
+        or not all(isinstance(panel_id, int) for panel_id in panel_ids)
+    ):
+        raise ValueError(f"Sign {prefix}: 'panels' must be a list of panel IDs")
+    transition = entry.get("transition", defaults.transition)
+    if transition not in ("none", *TRANSITIONS):
+        raise ValueError(f"Sign {prefix}: unknown transition '{transition}'")
+    try:
+        zones = [parse_zone(zone) for zone in entry["zones"]]
+    except KeyError:
+        zones = defaults.zones
+    except TypeError as error:
+        raise ValueError(f"Sign {prefix}: 'zones' must be a list of zones") from error
+    try:
+        transition_time = float(entry.get("transition_time", defaults.transition_time))
+        json_port = int(entry.get("json_port", defaults.json_port))
+        udp_port = int(entry.get("udp_port", defaults.udp_port))
+        frame_target = str(entry.get("frame_target", defaults.frame_target))
+        shm = str(entry.get("shm", defaults.shm))
+    except (TypeError, ValueError) as error:
+        raise ValueError(f"Sign {prefix}: {error}") from error
+    return SignConfig(
+        str(entry.get("name", prefix)),
+        prefix.strip("/"),
+        panel_ids,
+        zones,
+        transition,
+        transition_time,
+        json_port,
+        udp_port,
+        frame_target,
+        shm,
+    )
+
+
+def load_config(path: str, defaults: SignConfig) -> List[SignConfig]:
+    """
+    Read the signs from a configuration file.
+
+    Args:
+        path (str): The JSON configuration file.
+        defaults (SignConfig): The first sign's values for keys a sign leaves out.
+            Later signs get no ports, frame target or framebuffer unless they give
+            them.
+
+    Returns:
+        List[SignConfig]: The signs, in the order given.
+
+    Raises:
+        OSError: If the file can't be read.
+        ValueError: If the file is malformed, or signs share a prefix or panel.
+    """
+    with open(path, encoding="utf-8") as config_file:
+        config = json.load(config_file)
+    if not isinstance(config, dict) or not isinstance(config.get("signs"), list):
+        raise ValueError("The configuration needs a list of 'signs'")
+    signs: List[SignConfig] = []
+    for entry in config["signs"]:
+        signs.append(parse_sign(entry, defaults))
+        defaults = defaults._replace(json_port=0, udp_port=0, frame_target="", shm="")
+    if not signs:
+        raise ValueError("The configuration has no signs")
+    prefixes = [sign.prefix for sign in signs]
+    if len(set(prefixes)) != len(prefixes):
+        raise ValueError("Signs must have different prefixes")
+    panel_ids = [panel_id for sign in signs for panel_id in sign.panel_ids]
+    if len(set(panel_ids)) != len(panel_ids):
+        raise ValueError("A panel can only belong to one sign")
+    return signs
+
+
+def default_config(**options: Any) -> SignConfig:
+    """The single sign driven without a configuration file, with the given options."""
+    config = SignConfig(
+        DEFAULT_PREFIX,
+        DEFAULT_PREFIX,
+        list(range(PANEL_COUNT)),
+        [],
+        "slide",
+        DEFAULT_DURATION,
+        0,
+        0,
+        "",
+        "",
+    )
+    return config._replace(**options)
+
+
+@dataclasses.dataclass
+class State:
+    # pylint: disable=too-few-public-methods,too-many-instance-attributes
+    """
+    Represents the state of a hexascroller LED panel display service.
+
+    The service controls the panel display, rendering messages and time information,
+    and communicates with an MQTT broker to receive commands and updates.
+
+    This is a simple data class or struct class that only stores state. It has no methods.
+
+    Attributes:
+    -----------
+    powered : bool
+        A boolean value indicating whether the LED panel display is powered on or not.
+    inverted : bool
+        A boolean value indicating whether the LED panel display is inverted or not.
+    msg_until : Optional[float]
+        The time (in seconds since epoch) until the current message should be displayed.
+        If the value is 0.0, the message should not be displayed.
+    msg_offset : float
+        Represents the horizontal offset for scrolling the displayed message, if applicable.
+        Set dynamically based on the message length, the scroll interval and the current time.
+    message : Optional[str]
+        A string representing the current message to be displayed.
+        Set through the MQTT message topic.
+    template : Template
+        The current message, parsed into static text and live fields and rendered
+        incrementally.
+    fields : Dict[str, str]
+        Values for the named fields in message templates.
+        Set through the MQTT field topics.
+    scroll_interval : float
+        Represents the time interval (in seconds) between successive horizontal scrolling steps.
+        Set dynamically based on the length of the message.
+    frame : Optional[bytes]
+        A precompiled 120- or 360-byte frame that overrides the message and clock.
+        Set through the local JSON socket.
+    frame_until : float
+        The time (in seconds since epoch) until the frame should be displayed.
+    rendered : bytes
+        The last frame rendered, before effects, which transitions start from.
+    compositor : Optional[Compositor]
+        The zone layout, if one was given, which replaces the clock.
+    message_zone : bool
+        True if the zone layout shows the message, so messages don't replace it.
+    lock : threading.RLock
+        Held while the state is changed or read to render a frame, so that a batch of
+        changes is applied atomically.
+    """
+
+    def __init__(self):
+        """Initialise the state of a sign."""
+        self.bitmap: bytes = b"\0" * PANEL_WIDTH
+        self.rendered: bytes = self.bitmap
+        self.powered: bool = False  # Initially off
+        self.inverted: bool = False  # Initially not inverted
+        self.msg_until: Optional[float] = None
+        self.msg_offset: float = 0.0
+        self.message: str = "Main screen turn on"
+        self.fields: Dict[str, str] = {}
+        self.template = Template(self.message, base_font, self.fields)
+        self.scroll_interval: float = 0.0
+        self.power_command: bool = True  # Power on by default
+        self.frame: Optional[bytes] = None
+        self.frame_until: float = 0.0
+        self.compositor: Optional[Compositor] = None
+        self.message_zone: bool = False
+        self.lock = threading.RLock()
+
+
+class SimpleCache:
+    """A simple cache for storing key-value pairs. This is used to cache rendered images.
+
+    This is a very simple cache implementation that only stores a single key-value pair.
+    It is used to cache rendered images, so that the same image is not rendered multiple
+    times. This is not a very efficient cache implementation, but it is sufficient for
+    the purposes of this application. Old images are simply overwritten by new ones, but
+    this is not a problem because the strings are typically only used once, or very rarely.
+    """
+
+    def __init__(self):
+        """Initialise the simple cache."""
+        self.key = None
+        self.value = None
+
+    def get(self, key):
+        """Retrieve a value from the cache by key."""
+        if self.key == key:
+            return self.value
+        return None
+
+    def set(self, key, value):
+        """Store a key-value pair in the cache."""
+        self.key = key
+        self.value = value
+
+
+# Shared by all signs, which show the same clock
+render_cache = SimpleCache()
+
+
+def render_time_bitmap(now: Optional[float] = None) -> bytes:
+    """Render local time and Swatch beats into a 2-panel bitmap, now or at `now`."""
+    if now is None:
+        now = time.time()
+    beats = internet_time(now)
+    msg = time.strftime("%H:%M:%S", time.localtime(now))
+    bmsg = f"@{beats:06.2f}"
+    cached_result = render_cache.get(bmsg + msg)
+    if cached_result:
+        return cached_result
+    with tracer.span("compile"):
+        frame = Frame()
+        frame.blit(Frame(base_font.string_columns(msg)), 15)
+        frame.blit(Frame(base_font.string_columns(bmsg)), 61)
+        # Paste .beats separately to keep text in the same place
+        frame.blit(Frame(base_font.string_columns(".beats")), 94)
+        bitmap = bytes(frame)
+    render_cache.set(bmsg + msg, bitmap)
+    return bitmap
+
+
+def render_text_bitmap(columns: bytes, start: int) -> bytes:
+    """Cut the panel-wide window starting at column `start` out of rendered text."""
+    return bytes(columns[start : start + PANEL_WIDTH]).ljust(PANEL_WIDTH, b"\0")
+
+
+def panel_bitmap(bitmap: bytes, index: int) -> memoryview:
+    """Return the part of a 120- or 360-byte frame shown by the panel at `index`."""
+    if len(bitmap) == PANEL_WIDTH:
+        return memoryview(bitmap)
+    return memoryview(bitmap)[index * PANEL_WIDTH : (index + 1) * PANEL_WIDTH]
+
+
+class Sign:
+    """A sign's panels and content, rendered and written by the service's frame loop."""
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(
+        self,
+        config: SignConfig,
+        panels: List[Panel],
+        client: mqtt.Client,
+        image_worker: ImageWorker,
+        udp_delay: float = 0.05,
+        role: str = ROLE_LOCAL,
+        inbox: Optional[MessageInbox] = None,
+        align_clock: bool = True,
+    ) -> None:
+        """
+        Initialise the sign.
+
+        Args:
+            config (SignConfig): The sign's configuration.
+            panels (List[Panel]): The sign's panels, left to right.
+            client (mqtt.Client): The MQTT client the sign publishes its state with.
+            image_worker (ImageWorker): The shared image worker.
+            udp_delay (float, optional): The UDP frame jitter buffer's playout delay.
+            role (str, optional): ROLE_LOCAL to render and drive the panels,
+                ROLE_THIN to drive them with frames from a render node, or
+                ROLE_RENDER to render frames for a thin client.
+            inbox (MessageInbox, optional): Where messages from MQTT wait to be
+                shown. Defaults to keeping the latest, two a second.
+            align_clock (bool, optional): Preload clock frames and flip them on the
+                second (see clockalign.py), rather than uploading them when the
+                frame loop notices the time changed.
+
+        Raises:
+            ValueError: If the zones don't fit the panel.
+            OSError: If the shared framebuffer can't be created.
+        """
+        self.name = config.name
+        self.prefix = config.prefix
+        self.config = config
+        self.role = role
+        self.panels = panels
+        self.client = client
+        self.image_worker = image_worker
+        self.state = State()
+        self.inbox = inbox or MessageInbox(window=MSG_DURATION)
+        self.stream = FrameStream()
+        self.udp_frames = JitterBuffer(delay=udp_delay)
+        # Frame sources that override the message and clock while active, in
+        # priority order
+        self.images = ImagePlayer()
+        self.transition = TransitionPlayer(config.transition, config.transition_time)
+        self.framebuffer: Optional[SharedFramebuffer] = None
+        self.frame_sources: List[Any] = [self.udp_frames, self.stream]
+        if config.shm:
+            self.framebuffer = SharedFramebuffer(config.shm, create=True)
+            self.frame_sources.append(self.framebuffer)
+        self.frame_sources += [self.images, self.transition]
+        self.accessories = [AccessoryStream(panel) for panel in panels]
+        self.showing_clock = False
+        self.clock: Optional[AlignedClock] = None
+        if align_clock and panels:
+            self.clock = AlignedClock(panels, self.render_clock, panel_bitmap)
+        if config.zones:
+            self.set_zones(config.zones)
+
+    def topic(self, name: str) -> str:
+        """Return the sign's MQTT topic called `name`, such as power/set."""
+        return f"{self.prefix}/{name}"
+
+    def set_zones(self, specs: List[ZoneSpec]) -> None:
+        """
+        Split the display into zones, which replace the clock.
+
+        Raises:
+            ValueError: If the zones extend past the panel or overlap.
+        """
+        state = self.state
+        zones = []
+        for spec in specs:
+            if spec.content == "message":
+                source = self.message_columns
+                state.message_zone = True
+            else:
+                source = Template(spec.content, base_font, state.fields).render
+            zones.append(Zone(spec.start, spec.width, source, spec.fps))
+        state.compositor = Compositor(zones, PANEL_WIDTH)
+        logger.info("Sign %s showing %d zones", self.name, len(zones))
+
+    def on_connect(self, client: mqtt.Client) -> None:
+        """Publish the sign's state and subscribe to its topics."""
+        state = self.state
+        if self.role != ROLE_RENDER:
+            client.publish(self.topic("available"), "online", retain=True)
+            client.publish(
+                self.topic("power"), b"ON" if state.powered else b"OFF", retain=True
+            )
+            client.subscribe(self.topic("power/set"), qos=0)
+            client.subscribe(self.topic(TOPIC_ACCESSORY), qos=0)
+            client.subscribe(self.topic(f"{TOPIC_ACCESSORY}/+"), qos=0)
+        if self.role == ROLE_THIN:
+            client.subscribe(self.topic(TOPIC_FRAME), qos=0)
+        else:
+            client.publish(
+                self.topic("invert"), b"ON" if state.inverted else b"OFF", retain=True
+            )
+            for name in CONTENT_TOPICS:
+                client.subscribe(self.topic(name), qos=0)
+
+    def on_message(self, name: str, payload: bytes) -> None:
+        """
+        Handle a message on one of the sign's topics.
+
+        Args:
+            name (str): The topic without the sign's prefix, such as message.
+            payload (bytes): The message payload.
+        """
+        if name == TOPIC_FRAME:
+            self.udp_frames.push(payload, time.monotonic())
+        elif name == "message":
+            # Shown by the frame loop, so a flood of messages can't stall it
+            self.inbox.offer(payload.decode(), time.monotonic())
+        elif name == "image":
+            try:
+                self.image_worker.submit(payload, self.show_image)
+            except ValueError as error:
+                logger.warning("Invalid payload received for image: %s", error)
+        elif name == TOPIC_ACCESSORY or name.startswith(f"{TOPIC_ACCESSORY}/"):
+            self.write_accessory(name[len(TOPIC_ACCESSORY) + 1 :] or "0", payload)
+        elif name.startswith("field/"):
+            self.set_field(name[len("field/") :], payload.decode())
+        elif name == "power/set":
+            if payload in (b"ON", b"OFF"):
+                self.set_power(payload == b"ON")
+            else:
+                logger.warning("Invalid payload received for power state: %s", payload)
+        elif name == "invert/set":
+            if payload in (b"ON", b"OFF"):
+                self.set_inverted(payload == b"ON")
+            else:
+                logger.warning("Invalid payload received for invert state: %s", payload)
+
+    def write_accessory(self, index: str, data: bytes) -> None:
+        """Queue data for the accessory UART of the panel at `index`."""
+        try:
+            stream = self.accessories[int(index)]
+        except (ValueError, IndexError):
+            logger.warning("No panel %s for accessory data on %s", index, self.name)
+            return
+        accepted = stream.write(data)
+        if accepted < len(data):
+            stream.drop(len(data) - accepted)
+            logger.warning(
+                "Accessory queue of panel %d full, dropped %d bytes",
+                stream.panel.id,
+                len(data) - accepted,
+            )
+
+    def show_message(self, message: str) -> None:
+        """Display the given message for MSG_DURATION seconds."""
+        state = self.state
+        # Fold and render the static text once here, so rendering only updates fields
+        template = Template(message, base_font, state.fields)
+        missing = template.missing
+        if missing:
+            logger.warning(
+                "Message has %d characters the font lacks: %s",
+                sum(missing.values()),
+                ", ".join(f"{char!r} x{count}" for char, count in missing.items()),
+            )
+        self.images.stop()
+        with state.lock:
+            state.msg_offset = 0
+            state.template = template
+            state.message = template.text
+            logger.info("Message received for %s: %s", self.name, state.message)
+            state.msg_until = time.time() + MSG_DURATION
+
+            # Calculate scroll interval based on the width of the message
+            message_width = len(template.render())
+            if message_width > PANEL_WIDTH:
+                logger.info("Message width: %d", message_width)
+                scroll_duration = 0.9 * MSG_DURATION  # 90% of MSG_DURATION
+                logger.info("Scroll duration: %f", scroll_duration)
+                state.scroll_interval = scroll_duration / (message_width - PANEL_WIDTH)
+                logger.info("Scroll interval: %f", state.scroll_interval)
+            else:
+                state.scroll_interval = 0
+
+            if not (state.compositor and state.message_zone):
+                self.transition.start(
+                    state.rendered,
+                    render_text_bitmap(template.render(), 0),
+                    time.monotonic(),
+                )
+
+    def set_power(self, on: bool) -> None:
+        """Request the display to be switched on or off on the next update."""
+        # pylint: disable=invalid-name
+        with self.state.lock:
+            self.state.power_command = on
+        logger.info("Power command for %s set to %s", self.name, on)
+
+    def set_inverted(self, on: bool) -> None:
+        """Set the invert state of the display and publish it."""
+        # pylint: disable=invalid-name
+        with self.state.lock:
+            self.state.inverted = on
+        logger.info("Invert for %s set to %s", self.name, on)
+        self.client.publish(self.topic("invert"), b"ON" if on else b"OFF")
+
+    def set_field(self, name: str, value: str) -> None:
+        """Set the value shown by {name} fields in message templates."""
+        with self.state.lock:
+            self.state.fields[name] = value
+        logger.debug("Field %s set to %r", name, value)
+
+    def show_image(self, image: CompiledImage, request: ImageRequest) -> None:
+        """Display a compiled image, called by the image worker once it is ready."""
+        self.images.show(
+            image,
+            request._replace(duration=request.duration or MSG_DURATION),
+            time.monotonic(),
+        )
+
+    def show_frame(self, frame: bytes, duration: Optional[float] = None) -> None:
+        """Display a precompiled 120- or 360-byte frame over the message or clock."""
+        self.images.stop()
+        with self.state.lock:
+            self.state.frame = frame
+            self.state.frame_until = time.time() + (duration or MSG_DURATION)
+
+    def apply_commands(self, commands: List[Dict[str, Any]]) -> None:
+        """Apply a batch of parsed JSON socket commands atomically."""
+        with self.state.lock:
+            for command in commands:
+                if command["cmd"] == "message":
+                    self.show_message(command["text"])
+                elif command["cmd"] == "field":
+                    self.set_field(command["name"], command["value"])
+                elif command["cmd"] == "power":
+                    self.set_power(command["on"])
+                elif command["cmd"] == "invert":
+                    self.set_inverted(command["on"])
+                elif command["cmd"] == "frame":
+                    self.show_frame(command["frame"], command["duration"])
+
+    def message_columns(self, wall: float) -> bytes:
+        """Render the current message's columns, for a message zone."""
+        return self.state.template.render(wall)
+
+    def render_idle_bitmap(self, now: float) -> bytes:
+        """Render what the display shows when there is no message: the zones or time."""
+        if self.state.compositor:
+            return self.state.compositor.compose(now, time.time())
+        return render_time_bitmap()
+
+    def render_bitmap(self) -> bytes:
+        """Render the frame to show now: a frame source's, the message or the time."""
+        now = time.monotonic()
+        self.showing_clock = False
+        for source in self.frame_sources:
+            frame = source.poll(now)
+            if frame is not None:
+                return frame
+        state = self.state
+        with state.lock:
+            if state.frame is not None:
+                if time.time() <= state.frame_until:
+                    return state.frame
+                state.frame = None
+                logger.info("Frame expired")
+            with tracer.span("render"):
+                if state.compositor and (state.msg_until is None or state.message_zone):
+                    if state.msg_until is not None and time.time() > state.msg_until:
+                        state.msg_until = None
+                    new_bitmap = self.render_idle_bitmap(now)
+                elif state.msg_until is not None:
+                    columns = state.template.render()
+                    if len(columns) > PANEL_WIDTH:
+                        logger.debug("Scrolling message, offset %d", state.msg_offset)
+                        new_bitmap = render_text_bitmap(columns, int(state.msg_offset))
+                        state.msg_offset = (
+                            state.msg_offset + state.scroll_interval
+                        ) % len(columns)
+                    else:
+                        logger.debug(
+                            "String is shorter (%d) than panel width, no scrolling",
+                            len(columns),
+                        )
+                        new_bitmap = render_text_bitmap(columns, 0)
+                    if time.time() > state.msg_until:
+                        state.msg_until = None
+                        logger.info("Message expired")
+                        self.transition.start(
+                            new_bitmap, self.render_idle_bitmap(now), now
+                        )
+                else:
+                    # Render the time if no message is active
+                    new_bitmap = self.render_idle_bitmap(now)
+                    self.showing_clock = state.compositor is None
+        return new_bitmap
+
+    def render_clock(self, wall: float) -> bytes:
+        """Render the clock at a Unix time, with effects applied, for the aligner."""
+        bitmap = render_time_bitmap(wall)
+        if self.state.inverted:
+            bitmap = bytes(~Frame(bitmap))
+        return bitmap
+
+    def render_frame(self) -> bytes:
+        """Render the frame to display now, with effects applied."""
+        message = self.inbox.take(time.monotonic())
+        if message is not None:
+            self.show_message(message)
+        new_bitmap = self.render_bitmap()
+        self.state.rendered = new_bitmap
+        # Invert the bitmap if the inversion state is true
+        if self.state.inverted:
+            with tracer.span("effects"):
+                new_bitmap = bytes(~Frame(new_bitmap))
+        return new_bitmap
+
+    def set_relay(self, on: bool) -> None:
+        """Switch the sign's power relay, which is on its first panel."""
+        # pylint: disable=invalid-name,no-value-for-parameter
+        self.panels[0].set_relay(on)
+
+    def update(self) -> bool:
+        """
+        Switch the power if it was asked to, then render and write a frame.
+
+        Returns:
+            bool: True if the sign is powered, so it wants frames at the full rate.
+        """
+        state = self.state
+        now = time.monotonic()
+        for stream in self.accessories:
+            # One chunk per panel and frame at most, so frames keep their place
+            if stream.pending:
+                with tracer.span("accessory", panel=stream.panel.id):
+                    stream.pump(now)
+        if state.power_command != state.powered:
+            self.set_relay(state.power_command)
+            state.powered = state.power_command
+            self.client.publish(self.topic("power"), b"ON" if state.powered else b"OFF")
+        if not state.powered:
+            return False
+        new_bitmap = self.render_frame()
+        if self.clock is not None:
+            if self.showing_clock:
+                shown = self.clock.update(new_bitmap, state.bitmap, state.inverted)
+                if shown is not None:
+                    state.bitmap = shown
+                return True
+            self.clock.reset()
+        # Update the panel only if the bitmap has changed
+        if state.bitmap != new_bitmap:
+            logger.debug("New bitmap for %s: %s", self.name, new_bitmap)
+            for index, panel in enumerate(self.panels):
+                with tracer.span("write", panel=panel.id):
+                    # pylint: disable=no-value-for-parameter
+                    panel.set_compiled_image(panel_bitmap(new_bitmap, index))
+            state.bitmap = new_bitmap
+        return True
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+A soak test for the service: hours of synthetic MQTT traffic, replayed fast.
+
+Slow leaks and drift only show after days of uptime, which microbenchmarks don't
+cover. With --soak HOURS the service runs headless, without connecting to the MQTT
+broker, on the null or pty transport, and `SoakWorkload` feeds it the traffic of a
+day at the sign, --soak-speed times faster than real time:
+
+- messages every few minutes, short and long, some with sprites and live fields,
+  some repeated and some new each time
+- sensor field updates every few seconds
+- images every quarter of an hour, from a handful that repeat
+- the invert state toggled now and then
+- a burst of messages from a misfiring automation every couple of hours
+- the power switched off at night and on in the morning
+
+Arrivals are random but seeded, so two runs replay the same traffic. Messages go
+through the same routing as real MQTT messages, from their own thread as paho's
+would. Only the traffic is sped up: messages, images and transitions are still
+shown for their real durations, so they overlap more than they would.
+
+`SoakMonitor` samples the service every report interval and logs frames per
+second, CPU time per frame, resident memory and its growth since the first
+sample, the sizes of the caches and queues, and garbage collection pauses, and
+can append each sample to a JSON lines file for plotting. At the end it logs a
+summary with the memory growth per simulated hour and how the median frame rate
+and CPU per frame moved between the first and last thirds of the run.
+"""
+
+import base64
+import gc
+import heapq
+import io
+import json
+import logging
+import os
+import random
+import resource
+import statistics
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from PIL import Image, ImageDraw
+
+from metrics import IntervalStats
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SPEED = 60.0
+DAY = 86400.0
+# The simulated day starts at 07:00; the sign is off from 01:00 to 07:00
+POWER_OFF_AT = 18 * 3600.0
+POWER_ON_AT = DAY
+
+# Mean simulated seconds between events of each kind
+EVENT_INTERVALS: Dict[str, float] = {
+    "message": 180.0,
+    "field": 10.0,
+    "image": 900.0,
+    "invert": 4 * 3600.0,
+    "burst": 2 * 3600.0,
+}
+BURST_SIZE = 100
+
+MESSAGES = (
+    "Doorbell :bell:",
+    "Front door :door: opened",
+    "Washing machine finished",
+    "Outside {temperature} :thermometer:",
+    "Rain expected at 16:00 :rain:",
+    "Now {time:%H:%M}, {power} in use",
+    "Crème brûlée timer done :check:",
+    "Reminder: the bins go out tonight, the recycling is collected first thing"
+    " in the morning :warning:",
+    "Launch in {countdown:18:30}",
+)
+FIELDS = ("temperature", "power", "humidity")
+
+
+def make_images() -> List[bytes]:
+    """Draw the workload's images, as PNG payloads: some fit, some scroll."""
+    images = []
+    for index, width in enumerate((16, 60, 120, 240, 360, 600)):
+        img = Image.new("1", (width, 7))
+        draw = ImageDraw.Draw(img)
+        for x_pos in range(0, width, 4 + index):
+            draw.line((x_pos, 0, x_pos + 6, 6), fill=1)
+        with io.BytesIO() as out:
+            img.save(out, "PNG")
+            payload = out.getvalue()
+        if width > 120:
+            payload = json.dumps(
+                {"data": base64.b64encode(payload).decode(), "scroll": 40}
+            ).encode()
+        images.append(payload)
+    return images
+
+
+class SoakWorkload(threading.Thread):
+    """Replays a day's traffic at the sign, sped up, through a delivery callback."""
+
+    def __init__(
+        self,
+        deliver: Callable[[str, bytes], None],
+        hours: float,
+        speed: float = DEFAULT_SPEED,
+        seed: int = 1,
+    ) -> None:
+        """
+        Initialise the workload. Call `start` to run it.
+
+        Args:
+            deliver (Callable[[str, bytes], None]): Delivers a payload on a topic,
+                given without the sign's prefix, such as message.
+            hours (float): Simulated hours to replay.
+            speed (float, optional): How many times faster than real time.
+            seed (int, optional): Seed for the arrivals, so runs are repeatable.
+        """
+        super().__init__(daemon=True, name="soak")
+        self.deliver = deliver
+        self.duration = hours * 3600.0
+        self.speed = speed
+        self.random = random.Random(seed)
+        self.images = make_images()
+        self.stopping = threading.Event()
+        self.simulated = 0.0
+        self.delivered = 0
+
+    def stop(self) -> None:
+        """Stop replaying."""
+        self.stopping.set()
+
+    def run(self) -> None:
+        """Deliver the events as their simulated times come round."""
+        events: List[Tuple[float, str]] = [
+            (self.random.expovariate(1 / mean), kind)
+            for kind, mean in EVENT_INTERVALS.items()
+        ]
+        day = 0.0
+        while day < self.duration:
+            events += [(day + POWER_OFF_AT, "off"), (day + POWER_ON_AT, "on")]
+            day += DAY
+        heapq.heapify(events)
+        start = time.monotonic()
+        while events and not self.stopping.is_set():
+            when, kind = heapq.heappop(events)
+            if when > self.duration:
+                break
+            if self.stopping.wait(
+                max(0.0, start + when / self.speed - time.monotonic())
+            ):
+                break
+            self.simulated = when
+            self.fire(kind)
+            if kind in EVENT_INTERVALS:
+                mean = EVENT_INTERVALS[kind]
+                heapq.heappush(events, (when + self.random.expovariate(1 / mean), kind))
+        logger.info(
+            "Soak workload done: %d events over %.1f simulated hours",
+            self.delivered,
+            self.simulated / 3600,
+        )
+
+    def fire(self, kind: str) -> None:
+        """Deliver one event."""
+        rand = self.random
+        if kind == "message":
+            message = rand.choice(MESSAGES)
+            if rand.random() < 0.3:
+                # A new text each time, like a notification with a counter in it
+                message = f"{message} #{self.delivered}"
+            self.send("message", message.encode())
+        elif kind == "field":
+            name = rand.choice(FIELDS)
+            self.send(f"field/{name}", f"{rand.uniform(-10, 40):.1f}".encode())
+        elif kind == "image":
+            self.send("image", rand.choice(self.images))
+        elif kind == "invert":
+            self.send("invert/set", rand.choice((b"ON", b"OFF")))
+        elif kind == "burst":
+            for count in range(BURST_SIZE):
+                self.send("message", f"Motion detected {count % 7}".encode())
+        elif kind == "off":
+            self.send("power/set", b"OFF")
+        elif kind == "on":
+            self.send("power/set", b"ON")
+
+    def send(self, topic: str, payload: bytes) -> None:
+        """Deliver a payload, counting it."""
+        self.deliver(topic, payload)
+        self.delivered += 1
+
+
+def resident_memory() -> int:
+    """Return the process's resident memory in bytes."""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # Not Linux: the peak, which still shows growth
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class SoakMonitor:
+    """Samples the service's frame rate, CPU, memory, caches and GC pauses."""
+
+    def __init__(
+        self,
+        sizes: Callable[[], Dict[str, int]],
+        speed: float = DEFAULT_SPEED,
+        report: Optional[str] = None,
+    ) -> None:
+        """
+        Initialise the monitor and start timing garbage collections.
+
+        Args:
+            sizes (Callable[[], Dict[str, int]]): Returns the sizes of the caches
+                and queues to watch, by name.
+            speed (float, optional): The workload's speed, to convert to
+                simulated hours.
+            report (str, optional): A file to append each sample to, as a line of
+                JSON.
+        """
+        self.sizes = sizes
+        self.speed = speed
+        self.report = report
+        self.frames = 0
+        self.samples: List[Dict[str, Any]] = []
+        self.gc_pauses = IntervalStats()
+        self.gc_started = 0.0
+        self.start = time.monotonic()
+        self.last = (self.start, time.process_time(), 0)
+        gc.callbacks.append(self.on_gc)
+
+    def on_gc(self, phase: str, info: Dict[str, int]) -> None:
+        """Time each garbage collection, from gc.callbacks."""
+        # pylint: disable=unused-argument
+        if phase == "start":
+            self.gc_started = time.perf_counter()
+        else:
+            self.gc_pauses.add(time.perf_counter() - self.gc_started)
+
+    def sample(self, frame_intervals: Optional[IntervalStats] = None) -> Dict[str, Any]:
+        """
+        Take a sample since the previous one, log it and save it to the report.
+
+        Args:
+            frame_intervals (IntervalStats, optional): The service's frame
+                intervals, for their p99.
+
+        Returns:
+            Dict[str, Any]: The sample.
+        """
+        now, cpu = time.monotonic(), time.process_time()
+        last_now, last_cpu, last_frames = self.last
+        frames = self.frames - last_frames
+        self.last = (now, cpu, self.frames)
+        pauses = self.gc_pauses.summary()
+        rss = resident_memory()
+        sample: Dict[str, Any] = {
+            "elapsed": now - self.start,
+            "simulated_hours": (now - self.start) * self.speed / 3600,
+            "fps": frames / (now - last_now),
+            "cpu_per_frame_ms": (cpu - last_cpu) * 1000 / frames if frames else 0.0,
+            "rss_mb": rss / 1e6,
+            "rss_growth_mb": (
+                (rss / 1e6 - self.samples[0]["rss_mb"]) if self.samples else 0.0
+            ),
+            "gc_pauses": pauses["n"],
+            "gc_p99_ms": pauses["p99"] * 1000,
+            "gc_max_ms": pauses["max"] * 1000,
+            "gc_objects": len(gc.get_objects()),
+        }
+        if frame_intervals is not None:
+            sample["frame_p99_ms"] = frame_intervals.summary()["p99"] * 1000
+        sample.update(self.sizes())
+        self.gc_pauses.reset()
+        self.samples.append(sample)
+        logger.info(
+            "Soak at %.1f simulated hours: %s",
+            sample["simulated_hours"],
+            " ".join(
+                f"{name}={value:.2f}" if isinstance(value, float) else f"{name}={value}"
+                for name, value in sample.items()
+                if name not in ("elapsed", "simulated_hours")
+            ),
+        )
+        if self.report:
+            with open(self.report, "a", encoding="utf-8") as report_file:
+                report_file.write(json.dumps(sample) + "\n")
+        return sample
+
+    def finish(self, frame_intervals: Optional[IntervalStats] = None) -> str:
+        """
+        Take a last sample, unless one was just taken, and stop timing garbage
+        collections.
+
+        Returns:
+            str: The summary of the run.
+        """
+        if time.monotonic() - self.last[0] >= 1.0:
+            self.sample(frame_intervals)
+        gc.callbacks.remove(self.on_gc)
+        return self.summary()
+
+    def summary(self) -> str:
+        """Summarise the run: memory growth per simulated hour and frame drift."""
+        samples = self.samples[1:]  # the first sample includes the warm-up
+        if len(samples) < 2:
+            return "not enough samples"
+        hours = [sample["simulated_hours"] for sample in samples]
+        rss = [sample["rss_mb"] for sample in samples]
+        mean_hours = sum(hours) / len(hours)
+        mean_rss = sum(rss) / len(rss)
+        spread = sum((hour - mean_hours) ** 2 for hour in hours)
+        slope = (
+            sum((hour - mean_hours) * (mb - mean_rss) for hour, mb in zip(hours, rss))
+            / spread
+            if spread
+            else 0.0
+        )
+        # Compare the first and last thirds of the run, leaving out the nights
+        # when the sign is off
+        lit = [sample for sample in samples if sample["fps"]] or samples
+        third = max(1, len(lit) // 3)
+        start, end = lit[:third], lit[-third:]
+
+        def median(part: List[Dict[str, Any]], name: str) -> float:
+            return statistics.median(sample[name] for sample in part)
+
+        return (
+            f"{hours[-1]:.1f} simulated hours,"
+            f" RSS {rss[0]:.1f} -> {rss[-1]:.1f} MB"
+            f" ({slope * 1000:+.0f} kB per simulated hour),"
+            f" fps {median(start, 'fps'):.1f} -> {median(end, 'fps'):.1f},"
+            f" CPU per frame {median(start, 'cpu_per_frame_ms'):.2f}"
+            f" -> {median(end, 'cpu_per_frame_ms'):.2f} ms,"
+            f" worst GC pause {max(s['gc_max_ms'] for s in self.samples):.1f} ms"
+        )
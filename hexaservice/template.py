@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Message templates with live fields, rendered incrementally.
+
+A message can contain fields in braces, which the service evaluates every frame:
+
+- `{time}` or `{time:FORMAT}`: the local time, formatted with `time.strftime`.
+  The default format is %H:%M:%S.
+- `{beats}` or `{beats:DIGITS}`: Swatch Internet Time, e.g. @512.34. DIGITS is the
+  number of decimals, 2 by default.
+- `{countdown:TARGET}`: the time left until TARGET, as M:SS, H:MM:SS or D:HH:MM:SS,
+  stopping at 0:00. TARGET is a local time of day (18:30 or 18:30:15, the next
+  occurrence), a local date and time (2026-12-31T23:59) or a Unix timestamp.
+- `{NAME}` for any other name: the latest value set for NAME, for example a sensor
+  reading published to the hexascroller/field/NAME topic. Empty until set.
+
+`{{` and `}}` stand for literal braces.
+
+The static text between fields is folded onto the font and rendered to packed
+columns once, when the message arrives. Each frame, only fields whose text changed
+are rendered again; a field that kept its width is written over its old columns in
+place, and otherwise the columns are joined again from the cached pieces.
+
+Example usage:
+
+```python
+from fontutil import base_font
+from template import Template
+
+template = Template("Launch in {countdown:18:30}", base_font)
+columns = template.render()  # packed columns, as Font.string_columns returns
+```
+"""
+
+import datetime
+import logging
+import re
+import time
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from fontutil import Font
+
+logger = logging.getLogger(__name__)
+
+FIELD_PATTERN = re.compile(r"\{\{|\}\}|\{(\w+)(?::([^{}]*))?\}")
+DEFAULT_TIME_FORMAT = "%H:%M:%S"
+
+
+def internet_time(now: Optional[float] = None) -> float:
+    """Granular Swatch Internet Time based on Biel Meridian (UTC+1)."""
+    if now is None:
+        now = time.time()
+    return (((now + 3600) % 86400) * 1000) / 86400
+
+
+def parse_target(spec: str) -> Callable[[float], float]:
+    """
+    Parse a countdown target.
+
+    Args:
+        spec (str): A time of day (18:30, 18:30:15), a local date and time in ISO
+            format (2026-12-31T23:59) or a Unix timestamp.
+
+    Returns:
+        Callable[[float], float]: A function from the current Unix time to the
+        target's Unix time.
+
+    Raises:
+        ValueError: If the target can't be parsed.
+    """
+    spec = spec.strip()
+    try:
+        timestamp = float(spec)
+        return lambda now: timestamp
+    except ValueError:
+        pass
+    if re.fullmatch(r"\d{1,2}:\d{2}(:\d{2})?", spec):
+        time_of_day = datetime.time(*(int(part) for part in spec.split(":")))
+
+        def next_occurrence(now: float) -> float:
+            today = datetime.datetime.fromtimestamp(now).date()
+            target = datetime.datetime.combine(today, time_of_day).timestamp()
+            return target if target >= now - 1 else target + 86400
+
+        return next_occurrence
+    timestamp = datetime.datetime.fromisoformat(spec).timestamp()
+    return lambda now: timestamp
+
+
+def format_remaining(seconds: float) -> str:
+    """Format a countdown as M:SS, H:MM:SS or D:HH:MM:SS."""
+    seconds = max(0, int(seconds + 0.999))
+    minutes, secs = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    days, hours = divmod(hours, 24)
+    if days:
+        return f"{days}:{hours:02}:{minutes:02}:{secs:02}"
+    if hours:
+        return f"{hours}:{minutes:02}:{secs:02}"
+    return f"{minutes}:{secs:02}"
+
+
+class Field:
+    """One live field in a template, with the text and columns last rendered."""
+
+    __slots__ = ("evaluate", "text", "columns", "start")
+
+    def __init__(self, evaluate: Callable[[float], str]) -> None:
+        """
+        Initialise the field.
+
+        Args:
+            evaluate (Callable[[float], str]): Returns the field's text at a given
+                Unix time.
+        """
+        self.evaluate = evaluate
+        self.text: Optional[str] = None
+        self.columns = b""
+        self.start = 0
+
+
+class Template:
+    """A message with live fields, rendered to packed columns."""
+
+    def __init__(
+        self, text: str, font: Font, values: Optional[Dict[str, str]] = None
+    ) -> None:
+        """
+        Parse a message and render its static text.
+
+        Args:
+            text (str): The message, possibly containing fields.
+            font (Font): The font to render in.
+            values (Dict[str, str], optional): Named field values, looked up every
+                frame, so later changes to the dictionary show up.
+        """
+        self.font = font
+        self.values = values if values is not None else {}
+        self.parts: List[Union[bytes, Field]] = []
+        self.fields: List[Field] = []
+        self.missing: Dict[str, int] = {}
+        preview = []
+        literal = []
+        position = 0
+        for match in FIELD_PATTERN.finditer(text):
+            literal.append(text[position : match.start()])
+            position = match.end()
+            if match.group(1) is None:
+                literal.append(match.group(0)[0])
+                continue
+            try:
+                field = Field(self.field_function(match.group(1), match.group(2)))
+            except ValueError as error:
+                logger.warning("Bad template field %s: %s", match.group(0), error)
+                literal.append(match.group(0))
+                continue
+            preview.append(self.add_static("".join(literal)))
+            preview.append(match.group(0))
+            literal = []
+            self.parts.append(field)
+            self.fields.append(field)
+        literal.append(text[position:])
+        preview.append(self.add_static("".join(literal)))
+        # The folded message with the fields left in, for logging
+        self.text = "".join(preview)
+        self.columns = bytearray()
+        self.join()
+
+    def add_static(self, text: str) -> str:
+        """Fold and render a piece of static text, returning the folded text."""
+        folded, missing = self.font.normalize(text)
+        for char, count in missing.items():
+            self.missing[char] = self.missing.get(char, 0) + count
+        if folded:
+            self.parts.append(self.font.string_columns(folded))
+        return folded
+
+    def field_function(self, name: str, arg: Optional[str]) -> Callable[[float], str]:
+        """
+        Return the function that evaluates a field.
+
+        Raises:
+            ValueError: If the field's argument is invalid.
+        """
+        if name == "time":
+            fmt = arg or DEFAULT_TIME_FORMAT
+            return lambda now: time.strftime(fmt, time.localtime(now))
+        if name == "beats":
+            digits = int(arg or 2)
+            width = digits + 4 if digits else 3
+            return lambda now: f"@{internet_time(now):0{width}.{digits}f}"
+        if name == "countdown":
+            if not arg:
+                raise ValueError("countdown needs a target")
+            target = parse_target(arg)
+            return lambda now: format_remaining(target(now) - now)
+        values = self.values
+        return lambda now: values.get(name, "")
+
+    @property
+    def static(self) -> bool:
+        """True if the template has no fields."""
+        return not self.fields
+
+    @property
+    def width(self) -> int:
+        """The width in columns of the last render."""
+        return len(self.columns)
+
+    def join(self) -> None:
+        """Rebuild the columns from the pieces, recording where each field starts."""
+        pieces: List[bytes] = []
+        start = 0
+        for part in self.parts:
+            columns = part if isinstance(part, bytes) else part.columns
+            if not columns:
+                continue
+            if pieces:
+                start += 1  # the blank column between characters
+            if not isinstance(part, bytes):
+                part.start = start
+            pieces.append(columns)
+            start += len(columns)
+        self.columns[:] = b"\0".join(pieces)
+
+    def render(self, now: Optional[float] = None) -> bytearray:
+        """
+        Bring the fields up to date and return the message's columns.
+
+        Args:
+            now (float, optional): The Unix time to evaluate the fields at.
+                Defaults to the current time.
+
+        Returns:
+            bytearray: The rendered message, one byte per column. It is updated in
+            place by later renders, so copy it to keep it.
+        """
+        if not self.fields:
+            return self.columns
+        if now is None:
+            now = time.time()
+        font = self.font
+        resized = False
+        spliced: List[Tuple[int, bytes]] = []
+        for field in self.fields:
+            text = field.evaluate(now)
+            if text == field.text:
+                continue
+            field.text = text
+            columns = font.string_columns(font.normalize(text)[0]) if text else b""
+            if len(columns) != len(field.columns) or not columns:
+                resized = True
+            else:
+                spliced.append((field.start, columns))
+            field.columns = columns
+        if resized:
+            self.join()
+        else:
+            for start, columns in spliced:
+                self.columns[start : start + len(columns)] = columns
+        return self.columns
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Precomputed transitions between two frames, such as the clock and a new message.
+
+When the display switches views the service builds the whole transition at once,
+from the outgoing and incoming frames' column bytes, using `led_panel.Frame`
+operations:
+
+- slide: the incoming frame pushes the outgoing one out to the left.
+- wipe: the incoming frame is revealed column by column, left to right.
+- dissolve: the incoming frame's pixels replace the outgoing ones in random order.
+- roll: the incoming frame rolls up from below, a row at a time.
+
+`TransitionPlayer` is the frame source that plays the batch back. Each frame is
+due at a fixed time from the start, so playback keeps pace with the display loop
+and never renders anything; it only picks the frame for the current time. When a
+transition finishes, its CPU cost (building plus playing) is logged.
+"""
+
+import logging
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from led_panel import PANEL_HEIGHT, PANEL_WIDTH, Frame
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DURATION = 0.5
+DEFAULT_FPS = 40.0
+
+
+def slide(outgoing: Frame, incoming: Frame, steps: int) -> List[bytes]:
+    """The incoming frame pushes the outgoing one out to the left."""
+    width = outgoing.width
+    frames = []
+    for step in range(1, steps + 1):
+        shift = width * step // steps
+        frames.append(bytes(outgoing.shift_x(-shift) | incoming.shift_x(width - shift)))
+    return frames
+
+
+def wipe(outgoing: Frame, incoming: Frame, steps: int) -> List[bytes]:
+    """The incoming frame is revealed column by column, left to right."""
+    width = outgoing.width
+    return [
+        bytes(incoming.data[:edge] + outgoing.data[edge:])
+        for edge in (width * step // steps for step in range(1, steps + 1))
+    ]
+
+
+def dissolve(outgoing: Frame, incoming: Frame, steps: int) -> List[bytes]:
+    """The incoming frame's pixels replace the outgoing ones in random order."""
+    width = outgoing.width
+    pixels = [(column, row) for column in range(width) for row in range(PANEL_HEIGHT)]
+    random.shuffle(pixels)
+    mask = Frame(width=width)
+    frames = []
+    revealed = 0
+    for step in range(1, steps + 1):
+        target = len(pixels) * step // steps
+        for column, row in pixels[revealed:target]:
+            mask.data[column] |= 1 << (7 - row)
+        revealed = target
+        frames.append(bytes(incoming & mask | outgoing & ~mask))
+    return frames
+
+
+def roll(outgoing: Frame, incoming: Frame, steps: int) -> List[bytes]:
+    """The incoming frame rolls up from below, a row at a time."""
+    # pylint: disable=unused-argument
+    return [
+        bytes(outgoing.shift_y(-row) | incoming.shift_y(PANEL_HEIGHT - row))
+        for row in range(1, PANEL_HEIGHT + 1)
+    ]
+
+
+TRANSITIONS: Dict[str, Callable[[Frame, Frame, int], List[bytes]]] = {
+    "slide": slide,
+    "wipe": wipe,
+    "dissolve": dissolve,
+    "roll": roll,
+}
+
+
+class TransitionPlayer:
+    """The frame source playing the current transition, if one is running."""
+
+    def __init__(
+        self,
+        name: str = "slide",
+        duration: float = DEFAULT_DURATION,
+        fps: float = DEFAULT_FPS,
+    ) -> None:
+        """
+        Initialise the player.
+
+        Args:
+            name (str, optional): The transition to use, one of TRANSITIONS, or
+                "none" for hard cuts. Defaults to "slide".
+            duration (float, optional): Seconds each transition takes.
+            fps (float, optional): Transition frames per second.
+        """
+        self.build = TRANSITIONS.get(name)
+        self.name = name
+        self.duration = duration
+        self.steps = max(1, int(duration * fps))
+        self.frames: List[bytes] = []
+        self.interval = 0.0
+        self.started = 0.0
+        self.cpu = 0.0
+        self.lock = threading.Lock()
+
+    def start(self, outgoing: bytes, incoming: bytes, now: float) -> None:
+        """
+        Build the transition between two panel-wide frames and start playing it.
+
+        Args:
+            outgoing (bytes): The frame on the display now.
+            incoming (bytes): The first frame of the new view.
+            now (float): The current `time.monotonic()` value.
+        """
+        if self.build is None:
+            return
+        cpu_start = time.thread_time()
+        frames = self.build(
+            Frame(outgoing[:PANEL_WIDTH]), Frame(incoming[:PANEL_WIDTH]), self.steps
+        )
+        cost = time.thread_time() - cpu_start
+        with self.lock:
+            self.frames = frames
+            self.interval = self.duration / len(frames)
+            self.started = now
+            self.cpu = cost
+
+    def poll(self, now: float) -> Optional[bytes]:
+        """
+        Return the transition frame due at `now`.
+
+        Args:
+            now (float): The current `time.monotonic()` value.
+
+        Returns:
+            Optional[bytes]: The frame, or None if no transition is playing.
+        """
+        if not self.frames:
+            return None
+        cpu_start = time.thread_time()
+        with self.lock:
+            index = int((now - self.started) / self.interval)
+            if index < len(self.frames):
+                frame = self.frames[index]
+                self.cpu += time.thread_time() - cpu_start
+                return frame
+            logger.info(
+                "Transition %s: %d frames, %.2f ms CPU",
+                self.name,
+                len(self.frames),
+                self.cpu * 1000,
+            )
+            self.frames = []
+        return None
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Byte transports between `led_panel.Panel` and the panels.
+
+A transport only moves bytes. Framing (the command code and length header) and ack
+handling live in `Panel.command`, so every backend behaves the same way:
+
+- SerialTransport: pyserial, as the service has always used.
+- RawSerialTransport: the tty file descriptor in raw, non-blocking mode. Commands
+  go out with a single `os.writev` of header and payload, and responses are read
+  with `os.read` and `select`, which skips pyserial's per-call overhead on the
+  Pi Zero.
+- UdpTransport: one datagram per command to the `debug.py` simulator. The
+  simulator doesn't answer, so this transport has no acks.
+- PtyTransport: a pseudo-terminal with an in-process firmware emulator on the
+  other end. It exercises the raw serial path, acks included, without hardware.
+- NullTransport: discards commands and acks them immediately, for measuring
+  rendering throughput on its own.
+"""
+
+import errno
+import fcntl
+import os
+import select
+import socket
+import termios
+import threading
+import tty
+from typing import Optional
+
+import serial
+
+DEFAULT_BAUD = 57600
+DEFAULT_TIMEOUT = 0.5
+
+# The protocol values the null transport needs; see led_panel.CommandCode
+GET_ID = 0xA4
+ECHO = 0xA7
+RSP_OK = 0
+
+
+class Transport:
+    """
+    The interface all transports implement.
+
+    `acks` tells `Panel.command` whether responses come back and should be read.
+    """
+
+    acks: bool = True
+    timeout: float = DEFAULT_TIMEOUT
+
+    def __init__(self, name: str) -> None:
+        """Initialise the transport. `name` identifies it in log messages."""
+        self.name = name
+
+    def open(self) -> None:
+        """Open the connection."""
+
+    def close(self) -> None:
+        """Close the connection."""
+
+    def set_timeout(self, timeout: float) -> None:
+        """Set how long `recv` waits for a response, in seconds."""
+        self.timeout = timeout
+
+    def send(self, header: bytes, payload: bytes) -> None:
+        """
+        Send one command.
+
+        Args:
+            header (bytes): The command code and payload length.
+            payload (bytes): The command payload, possibly empty.
+        """
+        raise NotImplementedError
+
+    def recv(self, size: int) -> bytes:
+        """
+        Read up to `size` response bytes, waiting at most the transport's timeout.
+
+        Returns:
+            bytes: The bytes read; fewer than `size` if the timeout expired.
+        """
+        raise NotImplementedError
+
+    def reset_input(self) -> None:
+        """Discard any response bytes that have arrived but not been read."""
+
+
+class SerialTransport(Transport):
+    """A serial port opened through pyserial."""
+
+    def __init__(
+        self, port_name: str, baud: int = DEFAULT_BAUD, timeout: float = DEFAULT_TIMEOUT
+    ) -> None:
+        """
+        Initialise the transport.
+
+        Args:
+            port_name (str): The serial device, e.g. /dev/ttyACM0.
+            baud (int, optional): The baud rate. Defaults to 57600.
+            timeout (float, optional): Read timeout in seconds. Defaults to 0.5.
+        """
+        super().__init__(port_name)
+        self.baud = baud
+        self.timeout = timeout
+        self.serial_port = serial.Serial()
+
+    def open(self) -> None:
+        self.serial_port = serial.Serial(self.name, self.baud, timeout=self.timeout)
+
+    def close(self) -> None:
+        self.serial_port.close()
+
+    def set_timeout(self, timeout: float) -> None:
+        self.timeout = timeout
+        self.serial_port.timeout = timeout
+
+    def send(self, header: bytes, payload: bytes) -> None:
+        self.serial_port.write(header + payload)
+        self.serial_port.flush()
+
+    def recv(self, size: int) -> bytes:
+        return self.serial_port.read(size)
+
+    def reset_input(self) -> None:
+        self.serial_port.reset_input_buffer()
+
+
+class RawSerialTransport(Transport):
+    """A tty file descriptor in raw, non-blocking mode, driven with os calls."""
+
+    def __init__(
+        self, port_name: str, baud: int = DEFAULT_BAUD, timeout: float = DEFAULT_TIMEOUT
+    ) -> None:
+        """
+        Initialise the transport.
+
+        Args:
+            port_name (str): The serial device, e.g. /dev/ttyACM0.
+            baud (int, optional): The baud rate. Defaults to 57600.
+            timeout (float, optional): Read timeout in seconds. Defaults to 0.5.
+        """
+        super().__init__(port_name)
+        self.baud = baud
+        self.timeout = timeout
+        self.fd: Optional[int] = None  # pylint: disable=invalid-name
+
+    def open(self) -> None:
+        self.fd = os.open(self.name, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        self.configure(self.fd)
+
+    def configure(self, fd: int) -> None:
+        # pylint: disable=invalid-name
+        """Put the tty in raw mode at the transport's baud rate."""
+        tty.setraw(fd)
+        attrs = termios.tcgetattr(fd)
+        speed = getattr(termios, f"B{self.baud}", termios.B57600)
+        attrs[2] |= termios.CLOCAL | termios.CREAD
+        attrs[4] = attrs[5] = speed
+        attrs[6][termios.VMIN] = 0
+        attrs[6][termios.VTIME] = 0
+        termios.tcsetattr(fd, termios.TCSANOW, attrs)
+
+    def close(self) -> None:
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def send(self, header: bytes, payload: bytes) -> None:
+        buffers = [header, payload] if payload else [header]
+        while buffers:
+            try:
+                written = os.writev(self.fd, buffers)
+            except BlockingIOError:
+                _, writable, _ = select.select([], [self.fd], [], self.timeout)
+                if not writable:
+                    raise TimeoutError(f"Write to {self.name} timed out") from None
+                continue
+            # Drop what was written; partial writes leave the rest for the next call
+            while buffers and written >= len(buffers[0]):
+                written -= len(buffers[0])
+                buffers.pop(0)
+            if buffers and written:
+                buffers[0] = buffers[0][written:]
+
+    def recv(self, size: int) -> bytes:
+        data = b""
+        wait = self.timeout
+        while len(data) < size:
+            try:
+                chunk = os.read(self.fd, size - len(data))
+            except BlockingIOError:
+                chunk = None
+            except OSError as error:
+                if error.errno == errno.EIO:  # the other end went away
+                    break
+                raise
+            if chunk:
+                data += chunk
+                continue
+            readable, _, _ = select.select([self.fd], [], [], wait)
+            if not readable:
+                break
+        return data
+
+    def reset_input(self) -> None:
+        termios.tcflush(self.fd, termios.TCIFLUSH)
+
+
+class UdpTransport(Transport):
+    """Datagrams to the `debug.py` simulator, which sends no responses."""
+
+    acks = False
+
+    def __init__(self, host: str, port: int) -> None:
+        """
+        Initialise the transport.
+
+        Args:
+            host (str): The host running debug.py.
+            port (int): The UDP port of the emulated panel.
+        """
+        super().__init__(f"{host}:{port}")
+        self.address = (host, port)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def close(self) -> None:
+        self.sock.close()
+
+    def send(self, header: bytes, payload: bytes) -> None:
+        self.sock.sendmsg([header, payload], [], 0, self.address)
+
+    def recv(self, size: int) -> bytes:
+        return b""
+
+
+class PtyTransport(RawSerialTransport):
+    """A pseudo-terminal with a firmware emulator thread on the far end."""
+
+    def __init__(self, panel_id: int, timeout: float = DEFAULT_TIMEOUT) -> None:
+        """
+        Initialise the transport.
+
+        Args:
+            panel_id (int): The ID the emulated panel reports.
+            timeout (float, optional): Read timeout in seconds. Defaults to 0.5.
+        """
+        # pylint: disable=import-outside-toplevel
+        # The emulator builds on led_panel, which imports this module
+        from emulator import PanelEmulator
+
+        super().__init__(f"pty{panel_id}", timeout=timeout)
+        self.emulator = PanelEmulator(panel_id)
+        self.master: Optional[int] = None
+
+    def open(self) -> None:
+        self.master, self.fd = os.openpty()
+        self.name = os.ttyname(self.fd)
+        self.configure(self.fd)
+        tty.setraw(self.master)
+        flags = fcntl.fcntl(self.fd, fcntl.F_GETFL)
+        fcntl.fcntl(self.fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+        threading.Thread(
+            target=self.serve, name=f"emulator-{self.emulator.id}", daemon=True
+        ).start()
+
+    def serve(self) -> None:
+        """Answer commands arriving on the pty, as the firmware would."""
+        master = self.master
+        while True:
+            try:
+                data = os.read(master, 4096)
+            except OSError:
+                return
+            if not data:
+                return
+            answer = self.emulator.feed(data)
+            if answer:
+                os.write(master, answer)
+
+    def close(self) -> None:
+        super().close()
+        if self.master is not None:
+            os.close(self.master)
+            self.master = None
+
+
+class NullTransport(Transport):
+    """Discards every command and acks it at once, as a panel with no latency."""
+
+    def __init__(self, panel_id: int) -> None:
+        """
+        Initialise the transport.
+
+        Args:
+            panel_id (int): The ID reported in response to GET_ID.
+        """
+        super().__init__(f"null{panel_id}")
+        self.panel_id = panel_id
+        self.pending = b""
+
+    def send(self, header: bytes, payload: bytes) -> None:
+        if header[0] == GET_ID:
+            self.pending += bytes([RSP_OK, 1, self.panel_id])
+        elif header[0] == ECHO:
+            self.pending += bytes([RSP_OK, len(payload)]) + payload
+        else:
+            self.pending += bytes([RSP_OK, 0])
+
+    def recv(self, size: int) -> bytes:
+        data, self.pending = self.pending[:size], self.pending[size:]
+        return data
+
+    def reset_input(self) -> None:
+        self.pending = b""
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+UDP ingest of precompiled frames, played out through a small jitter buffer.
+
+External renderers (visualisers, games, desktop apps) send one datagram per frame:
+
+    offset  size  field
+    0       4     magic, b"HXF1"
+    4       4     sequence number, unsigned big-endian, incremented per frame
+    8       8     timestamp in microseconds, unsigned big-endian, sender's clock
+    16      120   one bitmap shown on every panel, or
+            360   one 120-byte bitmap per panel
+
+The sender's clock only needs to be monotonic; its epoch does not matter. The
+receiver maps sender timestamps onto its own clock using the smallest observed
+transit offset, and plays each frame out `delay` seconds after that. Frames that
+arrive after their playout time, or whose sequence number is not newer than the
+last accepted one, are dropped and counted. A sequence number or timestamp far
+behind the last accepted one means the sender restarted, and starts a new stream.
+
+While frames keep arriving the stream overrides the clock and message. When no
+frame has arrived for `timeout` seconds the stream hands control back.
+"""
+
+import collections
+import logging
+import socket
+import struct
+import threading
+import time
+from typing import Deque, Dict, Optional, Tuple
+
+from led_panel import PANEL_WIDTH
+
+FRAME_MAGIC = b"HXF1"
+FRAME_HEADER = struct.Struct(">4sIQ")
+FRAME_SIZES = (PANEL_WIDTH, 3 * PANEL_WIDTH)
+FRAME_PORT = 1215
+
+# Consecutive late frames after which the clock mapping is re-estimated
+RESYNC_AFTER = 8
+# A sequence number this far behind the last one, or a timestamp this many
+# seconds behind, is a restarted sender rather than a reordered datagram
+RESTART_SEQ = 256
+RESTART_TIME = 1.0
+
+logger = logging.getLogger(__name__)
+
+
+def pack_frame(seq: int, timestamp_us: int, frame: bytes) -> bytes:
+    """
+    Build a frame datagram.
+
+    Args:
+        seq (int): The frame sequence number.
+        timestamp_us (int): The frame timestamp in microseconds.
+        frame (bytes): A 120- or 360-byte precompiled frame.
+
+    Returns:
+        bytes: The datagram payload.
+    """
+    return FRAME_HEADER.pack(FRAME_MAGIC, seq & 0xFFFFFFFF, timestamp_us) + frame
+
+
+class JitterBuffer:
+    # pylint: disable=too-many-instance-attributes
+    """
+    Buffers a few frames and plays them out at their timestamps.
+
+    `push` is called from the receiver thread and `poll` from the display loop.
+    """
+
+    def __init__(self, delay: float = 0.05, timeout: float = 2.0, depth: int = 16):
+        """
+        Initialise the jitter buffer.
+
+        Args:
+            delay (float, optional): Playout delay in seconds added to the
+                estimated transit time.
+            timeout (float, optional): Seconds without frames before the stream
+                hands control back.
+            depth (int, optional): Maximum number of buffered frames.
+        """
+        self.delay = delay
+        self.timeout = timeout
+        self.depth = depth
+        self.frames: Deque[Tuple[float, bytes]] = collections.deque()
+        self.lock = threading.Lock()
+        self.offset: Optional[float] = None
+        self.last_seq: Optional[int] = None
+        self.last_sent = 0.0
+        self.last_arrival = 0.0
+        self.late_run = 0
+        self.current: Optional[bytes] = None
+        self.counters: Dict[str, int] = dict.fromkeys(
+            (
+                "received",
+                "played",
+                "skipped",
+                "late",
+                "out_of_order",
+                "overflow",
+                "malformed",
+                "resyncs",
+                "restarts",
+            ),
+            0,
+        )
+
+    def push(self, packet: bytes, now: float) -> None:
+        """
+        Accept one datagram.
+
+        Args:
+            packet (bytes): The datagram payload.
+            now (float): The `time.monotonic()` arrival time.
+        """
+        counters = self.counters
+        if (
+            len(packet) - FRAME_HEADER.size not in FRAME_SIZES
+            or packet[:4] != FRAME_MAGIC
+        ):
+            counters["malformed"] += 1
+            return
+        _, seq, timestamp_us = FRAME_HEADER.unpack_from(packet)
+        sent = timestamp_us / 1e6
+        with self.lock:
+            counters["received"] += 1
+            if now - self.last_arrival > self.timeout:
+                # A new stream after a pause: forget the old mapping
+                self.offset = None
+                self.last_seq = None
+            elif self.last_seq is not None and (
+                RESTART_SEQ < (self.last_seq - seq) & 0xFFFFFFFF < 0x80000000
+                or sent < self.last_sent - RESTART_TIME
+            ):
+                # The sender restarted without a pause, from a lower sequence
+                # number or on a new clock
+                counters["restarts"] += 1
+                self.offset = None
+                self.last_seq = None
+            # Serial number arithmetic, so the sequence may wrap around
+            if self.last_seq is not None and (
+                seq == self.last_seq or (seq - self.last_seq) & 0x80000000
+            ):
+                counters["out_of_order"] += 1
+                return
+            self.last_seq = seq
+            self.last_sent = sent
+            self.last_arrival = now
+            if self.offset is None or now - sent < self.offset:
+                self.offset = now - sent
+            playout = sent + self.offset + self.delay
+            if playout < now:
+                counters["late"] += 1
+                self.late_run += 1
+                if self.late_run >= RESYNC_AFTER:
+                    # The sender's clock runs slow relative to ours; re-anchor
+                    counters["resyncs"] += 1
+                    self.offset = now - sent
+                    self.late_run = 0
+                return
+            self.late_run = 0
+            if len(self.frames) >= self.depth:
+                counters["overflow"] += 1
+                self.frames.popleft()
+            self.frames.append((playout, packet[FRAME_HEADER.size :]))
+
+    def poll(self, now: float) -> Optional[bytes]:
+        """
+        Return the frame that should be on the display at `now`.
+
+        Args:
+            now (float): The current `time.monotonic()` value.
+
+        Returns:
+            Optional[bytes]: The current frame, or None if no stream is active.
+        """
+        with self.lock:
+            frames = self.frames
+            due = None
+            while frames and frames[0][0] <= now:
+                if due is not None:
+                    self.counters["skipped"] += 1
+                due = frames.popleft()[1]
+            if due is not None:
+                self.counters["played"] += 1
+                self.current = due
+            elif (
+                self.current is not None
+                and not frames
+                and now - self.last_arrival > self.timeout
+            ):
+                self.current = None
+                logger.info("UDP frame stream ended: %s", self.counters)
+            return self.current
+
+
+class FrameReceiver(threading.Thread):
+    """Receives frame datagrams and feeds them into a jitter buffer."""
+
+    def __init__(self, buffer: JitterBuffer, port: int = FRAME_PORT, host: str = ""):
+        """
+        Initialise the receiver and bind the socket.
+
+        Args:
+            buffer (JitterBuffer): Where received frames go.
+            port (int, optional): The UDP port to listen on.
+            host (str, optional): The address to bind. Defaults to all interfaces.
+        """
+        threading.Thread.__init__(self, name="udpframes", daemon=True)
+        self.buffer = buffer
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+
+    def run(self):
+        recv = self.sock.recv
+        push = self.buffer.push
+        while True:
+            push(recv(2048), time.monotonic())